@@ -0,0 +1,150 @@
+"""Stock reports over NumPy columns mirrored from the item store.
+
+Prices (in cents) and quantities are kept as int64 arrays, one row per item,
+so a valuation, a low-stock list or a price-band breakdown is a handful of
+vectorized passes instead of a Python loop over every Item.
+"""
+from decimal import Decimal
+
+import numpy as np
+
+LOW_STOCK_THRESHOLD = 10 # default "running low" quantity for the low-stock report
+
+# Lower edges of the price bands, in dollars; the last band is open-ended
+PRICE_BANDS = [0, 1, 5, 10, 50, 100, 500, 1000]
+
+
+def cents_to_decimal(cents):
+    return Decimal(int(cents)) / 100
+
+
+class StockAnalytics:
+    """Price and quantity columns for an InventoryStore, kept in step with its changes.
+
+    The columns are built on the first report (or by prepare()); after that
+    the store tells us about every added, changed and removed item, so each
+    change costs one row write. Removed rows are zeroed and reused. A reload
+    or bulk add drops the columns and the next report builds them again.
+    """
+
+    def __init__(self, store):
+        self.store = store
+        self.codes = None # item code per row; None until the columns are built
+        self.cents = None
+        self.qty = None
+        self.live = None # False for rows freed by removed items
+        self.size = 0 # rows in use, live or freed
+        self.rows = {} # item code -> row
+        self.free_rows = []
+        store.watchers.append(self)
+
+    def prepare(self):
+        """Builds the columns from the store if they haven't been yet."""
+        with self.store.lock:
+            if self.codes is not None:
+                return
+            items = list(self.store.items.values())
+            count = len(items)
+            self.codes = np.fromiter((item.code for item in items), np.int64, count)
+            self.cents = np.fromiter((item.cents for item in items), np.int64, count)
+            self.qty = np.fromiter((item.qty for item in items), np.int64, count)
+            self.live = np.ones(count, bool)
+            self.size = count
+            self.rows = {item.code: row for row, item in enumerate(items)}
+            self.free_rows = []
+
+    def reset(self):
+        """Drops the columns after a load or a bulk change; the next report rebuilds them."""
+        self.codes = None
+        self.rows = {}
+        self.free_rows = []
+
+    def put(self, item):
+        """Adds or refreshes one item's row."""
+        if self.codes is None:
+            return # Not built yet, prepare() will read the store
+        row = self.rows.get(item.code)
+        if row is None:
+            row = self.free_rows.pop() if self.free_rows else self._new_row()
+            self.rows[item.code] = row
+        self.codes[row] = item.code
+        self.cents[row] = item.cents
+        self.qty[row] = item.qty
+        self.live[row] = True
+
+    def delete(self, code):
+        """Frees a removed item's row."""
+        if self.codes is None:
+            return
+        row = self.rows.pop(code, None)
+        if row is not None:
+            self.cents[row] = self.qty[row] = 0 # Zeroed rows add nothing to the sums
+            self.live[row] = False
+            self.free_rows.append(row)
+
+    def _new_row(self):
+        if self.size == len(self.codes): # Grow by half so appends stay amortized O(1)
+            capacity = max(16, self.size + self.size // 2)
+            for name in ("codes", "cents", "qty", "live"):
+                column = getattr(self, name)
+                grown = np.zeros(capacity, column.dtype)
+                grown[:self.size] = column[:self.size]
+                setattr(self, name, grown)
+        self.size += 1
+        return self.size - 1
+
+    def _columns(self):
+        """Returns (codes, cents, qty, live) for the rows in use. Call with the store lock held."""
+        self.prepare()
+        size = self.size
+        return self.codes[:size], self.cents[:size], self.qty[:size], self.live[:size]
+
+    def summary(self):
+        """Returns item count, units in stock, stock value and out-of-stock count."""
+        self.store.sync() # Other terminals' sales count too
+        with self.store.lock:
+            _, cents, qty, live = self._columns()
+            return {
+                "items": int(np.count_nonzero(live)),
+                "units": int(qty.sum()),
+                "value": cents_to_decimal((cents * qty).sum()),
+                "out_of_stock": int(np.count_nonzero(live & (qty == 0))),
+            }
+
+    def low_stock(self, threshold=None, limit=None):
+        """Returns the items with threshold (default LOW_STOCK_THRESHOLD) or fewer in stock, lowest first."""
+        threshold = LOW_STOCK_THRESHOLD if threshold is None else threshold
+        self.store.sync()
+        with self.store.lock:
+            codes, _, qty, live = self._columns()
+            rows = np.flatnonzero(live & (qty <= threshold))
+            rows = rows[np.lexsort((codes[rows], qty[rows]))][:limit]
+            return [self.store.items[int(code)] for code in codes[rows]]
+
+    def top_value(self, count=20):
+        """Returns (item, stock value) for the count items with the most money tied up in stock."""
+        self.store.sync()
+        with self.store.lock:
+            codes, cents, qty, live = self._columns()
+            values = cents * qty
+            rows = np.flatnonzero(live)
+            if count < len(rows):
+                rows = rows[np.argpartition(-values[rows], count)[:count]]
+            rows = rows[np.lexsort((codes[rows], -values[rows]))]
+            return [(self.store.items[int(codes[row])], cents_to_decimal(values[row])) for row in rows]
+
+    def price_bands(self, bands=None):
+        """Returns (low, high, items, units, value) per price band (default PRICE_BANDS); high is None for the last."""
+        bands = bands or PRICE_BANDS
+        self.store.sync()
+        with self.store.lock:
+            _, cents, qty, live = self._columns()
+            edges = np.array([round(low * 100) for low in bands], np.int64)
+            band = np.searchsorted(edges, cents[live], side="right") - 1
+            qty, values = qty[live], cents[live] * qty[live]
+            counts = np.bincount(band, minlength=len(edges))
+            # float64 sums of whole numbers are exact below 2**53, i.e. up to $90 trillion per band
+            units = np.bincount(band, weights=qty, minlength=len(edges))
+            value = np.bincount(band, weights=values, minlength=len(edges))
+            return [(low, bands[i + 1] if i + 1 < len(bands) else None, int(counts[i]), int(units[i]),
+                     cents_to_decimal(value[i])) for i, low in enumerate(bands)]
@@ -0,0 +1,345 @@
+"""Headless benchmarks for the inventory data paths.
+
+Run: python benchmark.py [sizes...] [--save] [--extra]
+
+For each catalog size (default 1,000 to 1,000,000 items; 10,000,000 works
+with enough memory) the suite times the data path behind each GUI action on a
+synthetic DATA.txt and customerData.txt: loading, saving, code lookup,
+price-range search, billing and customer removal. Each path reports
+throughput, p50/p95/p99 latency and peak memory, and its median is compared
+with the saved baseline: a path more than REGRESSION_TOLERANCE times slower
+is flagged and the exit code is 1. --save stores this run as the new
+baseline. --extra adds the older side-by-side comparisons (row scan vs
+index, string rows vs records, name search, NumPy reports, reorder
+forecast and the memory-mapped loader).
+"""
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import date, timedelta
+from decimal import Decimal
+
+from analytics import StockAnalytics
+from bill_store import Bill, BillStore
+from customer_registry import CustomerRegistry
+from forecast import SALES_WINDOW_DAYS, ReorderForecast
+from inventory_store import InventoryStore, Item, cents_bound
+from mapped_items import MappedItemFile
+from storage import FlatFileBackend, format_price
+
+BASELINE_FILE = "benchmark_baseline.json"
+
+# A path is flagged when its median latency grows past this multiple of the baseline
+REGRESSION_TOLERANCE = 1.5
+
+NAMES = ["Notebook", "Pencil", "Sharpener", "Scale", "Marker", "Glue", "Scissors",
+         "Highlighter", "Stapler", "Folder", "File", "Calculator", "Sketchbook", "SmartPhone"]
+
+
+def iter_rows(count, seed=1):
+    """Yields count synthetic [code, name, price, qty] rows of strings."""
+    rng = random.Random(seed)
+    for code in range(1, count + 1):
+        yield [str(code), f"{rng.choice(NAMES)} {code}", format_price(round(rng.uniform(1, 50000), 2)),
+               str(rng.randint(0, 500))]
+
+
+def generate_rows(count, seed=1):
+    """Generates count synthetic [code, name, price, qty] rows of strings."""
+    return list(iter_rows(count, seed))
+
+
+def generate_customers(count, seed=1):
+    """Generates count synthetic customerData.txt lines."""
+    rng = random.Random(seed)
+    return [f"Customer {number} ---- reg on: {rng.randint(1, 12):02d}/{rng.randint(1, 28):02d}/2024, "
+            f"{rng.randint(0, 23):02d}:{rng.randint(0, 59):02d}:00" for number in range(1, count + 1)]
+
+
+def build_store(rows, directory):
+    """Writes rows to a DATA.txt in directory and loads a store from it."""
+    backend = FlatFileBackend(os.path.join(directory, "DATA.txt"), os.path.join(directory, "customerData.txt"))
+    backend.save_items(rows)
+    return InventoryStore(backend=backend).load()
+
+
+def time_call(func, repeat):
+    """Returns the best time of repeat calls to func, in seconds."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def scan_price_range(rows, start_price, end_price):
+    """The full scan search_by_price_range used to do over load_items() rows."""
+    results = []
+    for item in rows:
+        try:
+            if start_price <= float(item[2]) <= end_price:
+                results.append(item)
+        except ValueError:
+            continue
+    return results
+
+
+def latency_stats(latencies, units=1):
+    """Summarizes per-call latencies (seconds): throughput in units per second and percentiles in ms."""
+    ordered = sorted(latencies)
+
+    def percentile(fraction):
+        return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))] * 1000
+
+    return {"throughput": units * len(ordered) / sum(ordered), "p50_ms": percentile(0.5),
+            "p95_ms": percentile(0.95), "p99_ms": percentile(0.99)}
+
+
+def time_each(func, calls):
+    """Calls func(*args) for each args in calls and returns the latency of each call, in seconds."""
+    latencies = []
+    for args in calls:
+        start = time.perf_counter()
+        func(*args)
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def peak_memory(func):
+    """Returns the most memory func() had allocated at once, in bytes."""
+    tracemalloc.start()
+    try:
+        func()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def bench_suite(count, directory, seed=1):
+    """Times the data path behind each GUI action on a catalog of count items. Returns {path: stats}."""
+    backend = FlatFileBackend(os.path.join(directory, "DATA.txt"), os.path.join(directory, "customerData.txt"),
+                              os.path.join(directory, "bills.jsonl"), os.path.join(directory, "stock_movements.jsonl"))
+    backend.save_items(iter_rows(count, seed)) # Streamed, so 10**7 rows never sit in memory as strings
+    backend.save_customers(generate_customers(max(1000, count // 10), seed))
+    journal_path = os.path.join(directory, "DATA.journal")
+    rng = random.Random(seed)
+    repeat = 3 if count <= 10 ** 6 else 1
+    results = {}
+
+    def load():
+        return InventoryStore(journal_path=journal_path, backend=backend).load()
+
+    store = None
+    latencies = []
+    for _ in range(repeat):
+        store = None # Let the previous copy go before timing the next load
+        start = time.perf_counter()
+        store = load()
+        latencies.append(time.perf_counter() - start)
+    results["load"] = dict(latency_stats(latencies, count), unit="items/s")
+    if count <= 10 ** 6: # Tracing a bigger load takes minutes and twice the memory
+        store = None
+        results["load"]["peak_mb"] = peak_memory(load) / 2 ** 20
+        store = load()
+
+    results["save"] = dict(latency_stats(time_each(store.save, [()] * repeat), count), unit="items/s",
+                           peak_mb=peak_memory(store.save) / 2 ** 20)
+
+    # A lookup takes well under a microsecond, so time them 100 at a time and divide
+    batches = [([rng.randint(1, count) for _ in range(100)],) for _ in range(500)]
+    lookup = lambda codes: [store.get(code) for code in codes]
+    results["lookup"] = dict(latency_stats([latency / 100 for latency in time_each(lookup, batches)]), unit="ops/s",
+                             peak_mb=peak_memory(lambda: lookup(*batches[0])) / 2 ** 20)
+
+    ranges = [(start, start + 500) for start in (rng.uniform(1, 49500) for _ in range(200))] # 1% of the price span
+    results["price search"] = dict(latency_stats(time_each(store.search_by_price, ranges)), unit="ops/s",
+                                   peak_mb=peak_memory(lambda: store.search_by_price(*ranges[0])) / 2 ** 20)
+
+    # Bills of three lines each, from items with plenty of stock, written through the journal like the GUI
+    stocked = [item.code for item in store.iter_items() if item.qty >= 100][:10000]
+    bills = [({code: 1 for code in rng.sample(stocked, 3)},) for _ in range(500)]
+    results["bill"] = dict(latency_stats(time_each(store.decrement_stock, bills)), unit="bills/s",
+                           peak_mb=peak_memory(lambda: store.decrement_stock(*bills[0])) / 2 ** 20)
+    store.close()
+    store = None
+
+    customers = CustomerRegistry(journal_path=os.path.join(directory, "customerData.journal"), backend=backend).load()
+    names = [(customer.name,) for customer in rng.sample(list(customers), 501)]
+    results["customer remove"] = dict(latency_stats(time_each(customers.remove, names[1:])), unit="ops/s",
+                                      peak_mb=peak_memory(lambda: customers.remove(*names[0])) / 2 ** 20)
+    customers.close()
+    return results
+
+
+def load_baseline(path=BASELINE_FILE):
+    """Returns the saved {size: {path: stats}} baseline, or {} if there is none."""
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+def save_baseline(baseline, path=BASELINE_FILE):
+    with open(path + ".tmp", "w") as f:
+        json.dump(baseline, f, indent=1, sort_keys=True)
+    os.replace(path + ".tmp", path)
+
+
+def report_suite(count, results, baseline):
+    """Prints one line per path with its change against the baseline. Returns the paths that regressed."""
+    regressions = []
+    for path, stats in results.items():
+        line = (f"{path:<16}n={count:>11,}  {stats['throughput']:>13,.0f} {stats['unit']:<9}  "
+                f"p50={stats['p50_ms']:10.4f} ms  p95={stats['p95_ms']:10.4f} ms  p99={stats['p99_ms']:10.4f} ms")
+        if "peak_mb" in stats:
+            line += f"  peak={stats['peak_mb']:8.1f} MB"
+        before = baseline.get(path)
+        if before:
+            ratio = stats["p50_ms"] / before["p50_ms"] if before["p50_ms"] else 1.0
+            line += f"  vs baseline x{ratio:.2f}"
+            if ratio > REGRESSION_TOLERANCE:
+                line += "  REGRESSION"
+                regressions.append(f"{path} at n={count:,}")
+        print(line)
+    return regressions
+
+
+def bench_price_search(count, repeat=5):
+    """Compares the old row scan with the store's price index for a 1% wide price range."""
+    rows = generate_rows(count)
+    with tempfile.TemporaryDirectory() as directory:
+        store = build_store(rows, directory)
+        start_price, end_price = 1000.0, 1500.0
+        scan = time_call(lambda: scan_price_range(rows, start_price, end_price), repeat)
+        indexed = time_call(lambda: store.search_by_price(start_price, end_price), repeat)
+        matches = len(store.search_by_price(start_price, end_price))
+    print(f"price search  n={count:>9,}  matches={matches:>7,}  "
+          f"scan={scan * 1000:9.2f} ms  index={indexed * 1000:8.3f} ms  speedup={scan / indexed:7.1f}x")
+
+
+def bench_name_search(count, repeat=5):
+    """Times prefix, substring and fuzzy name searches for a short query."""
+    rows = generate_rows(count)
+    with tempfile.TemporaryDirectory() as directory:
+        store = build_store(rows, directory)
+        timings = []
+        for mode in ("prefix", "contains", "fuzzy"):
+            elapsed = time_call(lambda: store.search_by_name("calc", mode, limit=50), repeat)
+            timings.append(f"{mode}={elapsed * 1000:8.3f} ms")
+    print(f"name search   n={count:>9,}  query='calc' limit=50  " + "  ".join(timings))
+
+
+def bench_reports(count, repeat=5):
+    """Compares a Python loop valuing the stock with the NumPy report columns."""
+    rows = generate_rows(count)
+    with tempfile.TemporaryDirectory() as directory:
+        store = build_store(rows, directory)
+        analytics = StockAnalytics(store)
+        build = time_call(analytics.prepare, 1)
+        loop = time_call(lambda: sum(item.cents * item.qty for item in store), repeat)
+        timings = [f"{name}={time_call(report, repeat) * 1000:7.2f} ms" for name, report in (
+            ("value", analytics.summary), ("low", analytics.low_stock),
+            ("top", analytics.top_value), ("bands", analytics.price_bands))]
+    print(f"reports       n={count:>9,}  columns={build * 1000:8.1f} ms  loop value={loop * 1000:8.2f} ms  "
+          + "  ".join(timings))
+
+
+def bench_forecast(count, repeat=5, lines_per_bill=4):
+    """Times building the reorder forecast from a window of bills, ranking the suggestions and adding a bill."""
+    rows = generate_rows(count)
+    rng = random.Random(2)
+    today = date.today()
+    with tempfile.TemporaryDirectory() as directory:
+        store = build_store(rows, directory)
+        analytics = StockAnalytics(store)
+        analytics.prepare()
+        bills = BillStore(store.backend)
+        for bill_id in range(1, count // 2 + 1): # About a sale per item over the window
+            day = today - timedelta(days=rng.randrange(SALES_WINDOW_DAYS))
+            lines = [(rng.randint(1, count), "", 1.0, rng.randint(1, 4)) for _ in range(lines_per_bill)]
+            bills._index(Bill(bill_id, "", day.isoformat() + "T12:00:00", lines, Decimal("0.00")))
+        forecast = ReorderForecast(analytics, bills)
+        build = time_call(forecast.prepare, 1)
+        rank = time_call(lambda: forecast.suggestions(200), repeat)
+        new_bills = [Bill(bills.next_id + i, "", today.isoformat() + "T13:00:00",
+                          [(rng.randint(1, count), "", 1.0, 1)] * lines_per_bill, Decimal("0.00")) for i in range(1000)]
+        add = time_call(lambda: [forecast.add_bill(bill) for bill in new_bills], 1) / len(new_bills)
+    print(f"forecast      n={count:>9,}  build={build * 1000:8.1f} ms  rank={rank * 1000:8.2f} ms  "
+          f"add bill={add * 1e6:7.2f} us")
+
+
+def bench_mapped_load(count, repeat=3, lookups=1000):
+    """Compares reading DATA.txt into a list of rows with mapping it: open time, memory and random row reads."""
+    with tempfile.TemporaryDirectory() as directory:
+        backend = FlatFileBackend(os.path.join(directory, "DATA.txt"))
+        backend.save_items(iter_rows(count))
+        # read_items, as load_items would map a file over MAPPED_LOAD_BYTES too
+        load = time_call(backend.read_items, 1)
+        _, rows_size = measure_memory(backend.read_items)
+        mapped_open = time_call(lambda: MappedItemFile(backend.items_file).close(), repeat)
+        with MappedItemFile(backend.items_file) as mapped:
+            rng = random.Random(3)
+            latencies = time_each(mapped.__getitem__, [(rng.randrange(len(mapped)),) for _ in range(lookups)])
+            index_size = mapped.index_bytes
+    row_read = latency_stats(latencies)
+    print(f"mapped load   n={count:>9,}  list load={load * 1000:8.1f} ms  list={rows_size / 2 ** 20:8.1f} MB  "
+          f"map open={mapped_open * 1000:8.1f} ms  index={index_size / 2 ** 20:7.1f} MB  "
+          f"row p50={row_read['p50_ms'] * 1000:6.1f} us")
+
+
+def measure_memory(build):
+    """Returns (result of build(), bytes allocated while building it)."""
+    tracemalloc.start()
+    try:
+        result = build()
+        size = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+    return result, size
+
+
+def bench_records(count, repeat=3):
+    """Compares [code, name, price, qty] string rows with typed Item records: memory and a full price scan."""
+    lines = ["#".join(row) for row in generate_rows(count)] # As read from DATA.txt
+    text_rows, rows_size = measure_memory(lambda: [line.split("#") for line in lines])
+    items, items_size = measure_memory(lambda: [Item.from_row(line.split("#")) for line in lines])
+    start_cents, end_cents = cents_bound(1000.0, upper=False), cents_bound(1500.0, upper=True)
+    rows_scan = time_call(lambda: scan_price_range(text_rows, 1000.0, 1500.0), repeat)
+    items_scan = time_call(lambda: [item for item in items if start_cents <= item.cents <= end_cents], repeat)
+    print(f"records       n={count:>9,}  rows={rows_size / 2 ** 20:8.1f} MB  items={items_size / 2 ** 20:8.1f} MB  "
+          f"scan rows={rows_scan * 1000:9.2f} ms  scan items={items_scan * 1000:9.2f} ms")
+
+
+def main():
+    """Command line entry point: python benchmark.py [sizes...] [--save] [--extra]"""
+    flags = {arg for arg in sys.argv[1:] if arg.startswith("--")}
+    sizes = [int(float(arg)) for arg in sys.argv[1:] if not arg.startswith("--")] or [10 ** 3, 10 ** 4, 10 ** 5, 10 ** 6]
+    baseline = load_baseline()
+    regressions = []
+    for count in sizes:
+        with tempfile.TemporaryDirectory() as directory:
+            results = bench_suite(count, directory)
+        regressions += report_suite(count, results, {} if "--save" in flags else baseline.get(str(count), {}))
+        baseline[str(count)] = results
+        if "--extra" in flags:
+            bench_records(count)
+            bench_price_search(count)
+            bench_name_search(count)
+            bench_reports(count)
+            bench_forecast(count)
+            bench_mapped_load(count)
+    if "--save" in flags:
+        save_baseline(baseline)
+        print(f"Saved the baseline to {BASELINE_FILE}")
+    elif regressions:
+        print(f"Slower than the baseline by more than x{REGRESSION_TOLERANCE}: " + ", ".join(regressions))
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
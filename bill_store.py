@@ -0,0 +1,196 @@
+import threading
+from bisect import insort
+from datetime import datetime
+from decimal import Decimal
+
+from inventory_store import to_cents
+from storage import get_backend, normalize_name
+
+
+def line_total(price, qty):
+    """Exact total of a bill line, as a Decimal with two places."""
+    return Decimal(to_cents(price) * qty) / 100
+
+
+class Bill:
+    """A committed bill: who bought what, when, and the total."""
+
+    def __init__(self, bill_id, customer, created, lines, total):
+        self.bill_id = bill_id
+        self.customer = customer
+        self.created = created # ISO timestamp, e.g. "2025-07-14T14:10:56"
+        self.lines = lines # list of (code, name, price, qty) as sold
+        self.total = total # Decimal
+
+    @property
+    def day(self):
+        """The bill's date as "YYYY-MM-DD"."""
+        return self.created[:10]
+
+    @classmethod
+    def from_record(cls, record):
+        lines = [(int(code), name, float(price), int(qty)) for code, name, price, qty in record["lines"]]
+        total = Decimal(str(record["total"])).quantize(Decimal("0.01"))
+        return cls(int(record["id"]), record["customer"], record["created"], lines, total)
+
+    def to_record(self):
+        return {"id": self.bill_id, "customer": self.customer, "created": self.created,
+                "total": float(self.total), "lines": [list(line) for line in self.lines]}
+
+
+class BillStore:
+    """Keeps all bills in memory, indexed by id, customer and day, and appends new ones to storage."""
+
+    def __init__(self, backend=None):
+        self.backend = backend or get_backend()
+        self.bills = {} # bill id -> Bill, oldest first
+        self.by_customer = {} # normalized customer name -> list of bill ids
+        self.by_day = {} # "YYYY-MM-DD" -> list of bill ids
+        self.day_totals = {} # "YYYY-MM-DD" -> [bill count, sales total as a Decimal]
+        self.next_id = 1
+        self.watchers = [] # objects told about every new bill, e.g. the reorder forecast
+        self.lock = threading.RLock()
+
+    def load(self):
+        """Loads every stored bill and rebuilds the indexes."""
+        with self.lock:
+            self.bills = {}
+            self.by_customer = {}
+            self.by_day = {}
+            self.day_totals = {}
+            self.next_id = 1
+            for record in self.backend.load_bills():
+                try:
+                    self._index(Bill.from_record(record))
+                except (KeyError, ValueError, TypeError):
+                    continue # Skip damaged records
+            for watcher in self.watchers:
+                watcher.reset()
+        return self
+
+    def sync(self):
+        """Picks up the bills other tills added or voided since we last looked."""
+        with self.lock:
+            records = self.backend.read_new_bills()
+            if records is None:
+                self.load() # Too far behind to catch up change by change
+                return
+            for record in records:
+                if "void" in record:
+                    bill = self.bills.get(record["void"])
+                    if bill is not None:
+                        self._unindex(bill)
+                        for watcher in self.watchers:
+                            watcher.remove_bill(bill)
+                    continue
+                try:
+                    bill = Bill.from_record(record)
+                except (KeyError, ValueError, TypeError):
+                    continue # Skip damaged records
+                if bill.bill_id not in self.bills: # Our own bills come back too with SQLite
+                    self._index(bill)
+                    for watcher in self.watchers:
+                        watcher.add_bill(bill)
+
+    def close(self):
+        pass # Every bill is written as it is made; the backend is closed by its owner
+
+    def _index(self, bill):
+        self.bills[bill.bill_id] = bill
+        for bill_ids in (self.by_customer.setdefault(normalize_name(bill.customer), []),
+                         self.by_day.setdefault(bill.day, [])):
+            if bill_ids and bill_ids[-1] > bill.bill_id:
+                insort(bill_ids, bill.bill_id) # A restored bill; keep id order, which is time order
+            else:
+                bill_ids.append(bill.bill_id)
+        totals = self.day_totals.setdefault(bill.day, [0, Decimal("0.00")])
+        totals[0] += 1
+        totals[1] += bill.total
+        self.next_id = max(self.next_id, bill.bill_id + 1)
+
+    def _unindex(self, bill):
+        del self.bills[bill.bill_id]
+        self.by_customer[normalize_name(bill.customer)].remove(bill.bill_id)
+        self.by_day[bill.day].remove(bill.bill_id)
+        totals = self.day_totals[bill.day]
+        totals[0] -= 1
+        totals[1] -= bill.total
+
+    def __len__(self):
+        return len(self.bills)
+
+    def add(self, customer, lines, created=None):
+        """Records a new bill from (code, name, price, qty) lines and saves it. Returns the Bill."""
+        created = created or datetime.now().isoformat(timespec="seconds")
+        total = sum((line_total(price, qty) for _, _, price, qty in lines), Decimal("0.00"))
+        with self.lock:
+            bill = Bill(None, customer, created, list(lines), total)
+            # The backend picks the id under its lock, after what other tills have added
+            bill.bill_id = self.backend.append_new_bill(bill.to_record())
+            self._index(bill)
+            for watcher in self.watchers:
+                watcher.add_bill(bill)
+        return bill
+
+    def commit(self, store, customer, lines, created=None):
+        """Takes the lines out of store's stock and records the bill. Returns the Bill.
+
+        If the bill can't be written, the stock is put back, so a failure never
+        leaves items sold without a bill.
+        """
+        quantities = {}
+        for code, _, _, qty in lines:
+            quantities[code] = quantities.get(code, 0) + qty
+        store.decrement_stock(quantities)
+        try:
+            return self.add(customer, lines, created)
+        except Exception:
+            store.restock(quantities)
+            raise
+
+    def remove(self, bill_id):
+        """Voids a bill: it is dropped from the indexes and from storage. Returns the Bill, or None."""
+        with self.lock:
+            bill = self.bills.get(bill_id)
+            if bill is None:
+                return None
+            self.backend.remove_bill(bill_id)
+            self._unindex(bill)
+            for watcher in self.watchers:
+                watcher.remove_bill(bill)
+        return bill
+
+    def restore(self, bill):
+        """Puts a voided bill back under its own id. Raises KeyError if that id is in use."""
+        with self.lock:
+            if bill.bill_id in self.bills:
+                raise KeyError(bill.bill_id)
+            self.backend.append_bill(bill.to_record())
+            self._index(bill)
+            for watcher in self.watchers:
+                watcher.add_bill(bill)
+        return bill
+
+    def get(self, bill_id):
+        """Returns the bill with the given id, or None."""
+        return self.bills.get(bill_id)
+
+    def for_customer(self, name):
+        """Returns a customer's bills, oldest first. Case and extra spaces in the name are ignored."""
+        with self.lock:
+            return [self.bills[bill_id] for bill_id in self.by_customer.get(normalize_name(name), [])]
+
+    def for_day(self, day):
+        """Returns the bills of one day ("YYYY-MM-DD"), oldest first."""
+        with self.lock:
+            return [self.bills[bill_id] for bill_id in self.by_day.get(day, [])]
+
+    def daily_total(self, day):
+        """Returns (bill count, sales total) for one day ("YYYY-MM-DD")."""
+        count, total = self.day_totals.get(day, (0, Decimal("0.00")))
+        return count, total
+
+    def daily_totals(self):
+        """Returns {day: (bill count, sales total)} for every day with sales, in date order."""
+        with self.lock:
+            return {day: tuple(self.day_totals[day]) for day in sorted(self.day_totals)}
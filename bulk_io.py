@@ -0,0 +1,181 @@
+"""Bulk item import and export as CSV or JSONL.
+
+Run: python bulk_io.py import FILE | python bulk_io.py export FILE
+
+Files are processed as a stream: rows are parsed, validated and de-duplicated
+one at a time by generators, and only the items that pass are collected for
+the single batch write at the end. CSV files have the columns code, name,
+price, qty, with or without a header row. JSONL files have one object per
+line with those keys (or a [code, name, price, qty] array).
+"""
+import csv
+import json
+import os
+import sys
+
+from inventory_store import JOURNAL_FILE, InventoryStore, validate_item
+from stock_ledger import StockLedger
+from storage import format_price
+
+# Only this many rejected rows are described in an import report; the rest are just counted
+MAX_REPORTED_ERRORS = 100
+
+FIELDS = ["code", "name", "price", "qty"]
+FIELD_ALIASES = {"quantity": "qty", "item code": "code", "item name": "name", "item price": "price"}
+
+
+def file_format(path):
+    """Returns "csv" or "jsonl" from the file extension."""
+    extension = os.path.splitext(path)[1].lower()
+    if extension in (".jsonl", ".ndjson", ".json"):
+        return "jsonl"
+    if extension == ".csv":
+        return "csv"
+    raise ValueError(f"Unsupported file type '{extension}'. Use .csv or .jsonl.")
+
+
+def read_csv(path):
+    """Yields (line number, [code, name, price, qty]) from a CSV file, honouring a header row if present."""
+    with open(path, "r", newline="", encoding="utf-8-sig") as f:
+        reader = csv.reader(f)
+        columns = None
+        for line_number, row in enumerate(reader, start=1):
+            if not row:
+                continue
+            if line_number == 1:
+                header = [FIELD_ALIASES.get(cell.strip().lower(), cell.strip().lower()) for cell in row]
+                if set(FIELDS) <= set(header):
+                    columns = [header.index(field) for field in FIELDS]
+                    continue
+            if columns is None:
+                yield line_number, row[:4]
+            else:
+                yield line_number, [row[column] if column < len(row) else "" for column in columns]
+
+
+def read_jsonl(path):
+    """Yields (line number, [code, name, price, qty]) from a JSONL file."""
+    with open(path, "r", encoding="utf-8") as f:
+        for line_number, line in enumerate(f, start=1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                yield line_number, None
+                continue
+            if isinstance(record, dict):
+                record = {FIELD_ALIASES.get(key.lower(), key.lower()): value for key, value in record.items()}
+                yield line_number, [record.get(field, "") for field in FIELDS]
+            else:
+                yield line_number, record
+
+
+def read_rows(path):
+    """Yields (line number, raw row) from a CSV or JSONL file."""
+    if file_format(path) == "jsonl":
+        return read_jsonl(path)
+    return read_csv(path)
+
+
+class ImportReport:
+    """What an import did: counts, and the first MAX_REPORTED_ERRORS rejected rows."""
+
+    def __init__(self):
+        self.imported = 0
+        self.added = [] # (code, name, price, qty) of the items imported
+        self.undoable = True # False when UndoLog didn't record the import, as too large
+        self.duplicates = 0
+        self.invalid = 0
+        self.errors = [] # (line number, reason)
+
+    def reject(self, line_number, reason):
+        self.invalid += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append((line_number, reason))
+
+    def summary(self):
+        text = f"Imported {self.imported:,} items, skipped {self.duplicates:,} duplicates and {self.invalid:,} invalid rows."
+        if self.errors:
+            text += "\n" + "\n".join(f"Line {line_number}: {reason}" for line_number, reason in self.errors[:10])
+            if self.invalid > 10:
+                text += f"\n... and {self.invalid - 10:,} more"
+        return text
+
+
+def validate_rows(rows, existing_codes, report):
+    """Yields valid, new (code, name, price, qty) items from (line number, row) pairs.
+
+    Rows are checked like the Add Item dialog does. Codes already in
+    existing_codes, or earlier in the file, count as duplicates.
+    """
+    seen = set()
+    for line_number, row in rows:
+        if not isinstance(row, list) or len(row) < 4:
+            report.reject(line_number, "Expected code, name, price and quantity.")
+            continue
+        try:
+            item = validate_item(*row[:4])
+        except (ValueError, TypeError) as e:
+            report.reject(line_number, str(e))
+            continue
+        if item[0] in existing_codes or item[0] in seen:
+            report.duplicates += 1
+            continue
+        seen.add(item[0])
+        yield item
+
+
+def import_items(store, path):
+    """Streams a CSV/JSONL file into the store with one batch write. Returns an ImportReport."""
+    report = ImportReport()
+    existing_codes = {item.code for item in store.iter_items()}
+    items = list(validate_rows(read_rows(path), existing_codes, report))
+    duplicates = set(store.add_many(items)) # Codes another terminal added meanwhile come back here
+    report.duplicates += len(duplicates)
+    report.added = [item for item in items if item[0] not in duplicates]
+    report.imported = len(report.added)
+    return report
+
+
+def export_items(store, path):
+    """Streams every item to a CSV/JSONL file, written atomically. Returns the number of items."""
+    fmt = file_format(path)
+    count = 0
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", newline="", encoding="utf-8") as f:
+        if fmt == "csv":
+            writer = csv.writer(f)
+            writer.writerow(FIELDS)
+            for item in store.iter_items():
+                writer.writerow([item.code, item.name, format_price(item.price), item.qty])
+                count += 1
+        else:
+            for item in store.iter_items():
+                f.write(json.dumps({"code": item.code, "name": item.name, "price": item.price, "qty": item.qty}) + "\n")
+                count += 1
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    return count
+
+
+def main():
+    """Command line entry point: python bulk_io.py import|export FILE"""
+    if len(sys.argv) != 3 or sys.argv[1] not in ("import", "export"):
+        print("Usage: python bulk_io.py import|export FILE")
+        return 1
+    command, path = sys.argv[1], sys.argv[2]
+    # Imported stock is recorded as movements, like the GUI's; the ledger only appends here, so it isn't loaded
+    store = InventoryStore(journal_path=JOURNAL_FILE, ledger=StockLedger()).load()
+    try:
+        if command == "import":
+            print(import_items(store, path).summary())
+        else:
+            print(f"Exported {export_items(store, path):,} items to {path}")
+    finally:
+        store.close()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
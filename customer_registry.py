@@ -0,0 +1,168 @@
+import sys
+import threading
+from contextlib import nullcontext
+from datetime import datetime
+
+from journal import FileLock, Journal, JournaledStore
+from storage import CUSTOMER_SEPARATOR, get_backend, normalize_name, split_customer_line
+
+CUSTOMER_JOURNAL_FILE = "customerData.journal"
+
+# Fold the journal into a fresh customerData.txt once it grows past this many bytes
+CUSTOMER_JOURNAL_COMPACT_THRESHOLD = 256 * 1024
+
+
+class Customer:
+    """A registered customer."""
+
+    def __init__(self, name, registered):
+        self.name = name
+        self.registered = registered # "MM/DD/YYYY, HH:MM:SS", as in customerData.txt
+
+    @property
+    def key(self):
+        """Normalized name used for lookups: case and extra spaces are ignored."""
+        return normalize_name(self.name)
+
+    def to_line(self):
+        return f"{self.name}{CUSTOMER_SEPARATOR}{self.registered}"
+
+
+class CustomerRegistry(JournaledStore):
+    """Keeps customers in memory, one per normalized name, and persists changes incrementally.
+
+    Duplicate registrations found on load are merged into the first one. With
+    the flat-file backend each change is appended to a journal that is compacted
+    into customerData.txt in the background, like the item store, and terminals
+    sharing the journal see each other's registrations.
+    """
+
+    def __init__(self, journal_path=None, compact_threshold=CUSTOMER_JOURNAL_COMPACT_THRESHOLD, backend=None):
+        self.backend = backend or get_backend()
+        self.customers = {} # normalized name -> Customer, in registration order
+        self.merged = 0 # duplicate registrations merged by the last load
+        use_journal = journal_path and not self.backend.supports_row_updates
+        self.journal = Journal(journal_path, put_fields=2) if use_journal else None
+        self.shared_lock = FileLock(journal_path + ".lock") if use_journal else nullcontext()
+        self.compact_threshold = compact_threshold
+        self.lock = threading.RLock()
+        self.compaction = None
+
+    def load(self):
+        """Parses the customer data once, merging duplicates, and replays the journal."""
+        with self.shared_lock, self.lock:
+            self.customers = {}
+            self.merged = 0
+            for line in self.backend.load_customers():
+                customer = Customer(*split_customer_line(line))
+                if not customer.key:
+                    continue
+                if customer.key in self.customers:
+                    self.merged += 1 # Keep the first registration
+                else:
+                    self.customers[customer.key] = customer
+            if self.journal:
+                for op, fields in self.journal.replay():
+                    self._apply_record(op, fields)
+        return self
+
+    def _apply_record(self, op, fields):
+        """Applies one journal record: ("P", [registered, name]) or ("D", [key])."""
+        if op == "P":
+            customer = Customer(fields[1], fields[0])
+            self.customers[customer.key] = customer
+        else:
+            self.customers.pop(fields[0], None)
+
+    def __len__(self):
+        return len(self.customers)
+
+    def __contains__(self, name):
+        return normalize_name(name) in self.customers
+
+    def __iter__(self):
+        return iter(list(self.customers.values()))
+
+    def get(self, name):
+        """Returns the customer registered under name, or None."""
+        return self.customers.get(normalize_name(name))
+
+    def register(self, name, registered=None):
+        """Registers a customer unless the name is already registered.
+
+        Returns (customer, created); an existing registration is returned unchanged.
+        """
+        name = " ".join(name.split())
+        if not name:
+            raise ValueError("Customer name cannot be empty.")
+        with self.shared_lock, self.lock:
+            self.sync() # Another terminal may have registered them meanwhile
+            existing = self.customers.get(normalize_name(name))
+            if existing is not None:
+                return existing, False
+            customer = Customer(name, registered or datetime.now().strftime("%m/%d/%Y, %H:%M:%S"))
+            self.customers[customer.key] = customer
+            taken = self._persist(changed=[customer])
+            if taken:
+                # Without a journal there is nothing to sync: the database tells us another terminal was first
+                existing = Customer(*taken[0])
+                self.customers[existing.key] = existing
+                return existing, False
+        return customer, True
+
+    def remove(self, name):
+        """Removes and returns the customer registered under name, or None."""
+        with self.shared_lock, self.lock:
+            self.sync()
+            customer = self.customers.pop(normalize_name(name), None)
+            if customer is not None:
+                self._persist(removed=[customer.key])
+        return customer
+
+    def save(self):
+        """Writes all customers back to storage, dropping any duplicates still in the file."""
+        with self.shared_lock, self.lock:
+            self._write_snapshot(self._snapshot_rows())
+
+    def _persist(self, changed=(), removed=()):
+        """Makes changes durable: row updates, a journal append, or failing both a full save.
+
+        Returns the (name, registered) rows other terminals already stored for changed customers.
+        """
+        if self.backend.supports_row_updates:
+            return self.backend.apply_customer_changes([(c.name, c.registered) for c in changed], removed)
+        if not self.journal:
+            self.save()
+            return
+        records = [["P", c.registered, c.name] for c in changed] + [["D", key] for key in removed]
+        self._append_journal(records)
+
+    def _snapshot_rows(self):
+        return [customer.to_line() for customer in self.customers.values()]
+
+    def _write_snapshot(self, rows):
+        self.backend.save_customers(rows)
+
+
+def migrate():
+    """Merges duplicate registrations in the configured customer storage. Returns the number merged."""
+    registry = CustomerRegistry(CUSTOMER_JOURNAL_FILE)
+    with registry.shared_lock: # Keep other terminals out until the journal is folded in
+        registry.load()
+        registry.save()
+        if registry.journal:
+            registry.journal.rotate() # Everything in the journal is now in the snapshot
+            registry.journal.discard_old()
+    return registry.merged
+
+
+def main():
+    """Command line entry point: python customer_registry.py migrate"""
+    if len(sys.argv) < 2 or sys.argv[1] != "migrate":
+        print("Usage: python customer_registry.py migrate")
+        return 1
+    print(f"Merged {migrate()} duplicate customer registrations.")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,182 @@
+"""Reorder points and order quantities from the recent sales on the bills.
+
+An item's velocity is its mean units sold per day over the last
+SALES_WINDOW_DAYS days (days without sales count as zero) and its spread the
+standard deviation of those daily figures. The reorder point covers the
+supplier's lead time at that rate plus safety stock for a bad run of days:
+
+    reorder point = velocity * lead time + service factor * spread * sqrt(lead time)
+
+and the suggested order tops the stock up to cover the review period as well.
+"""
+import threading
+from datetime import date, timedelta
+from itertools import repeat
+
+import numpy as np
+
+SALES_WINDOW_DAYS = 28 # days of bills behind each velocity
+LEAD_TIME_DAYS = 7 # days from placing an order to the stock arriving
+REVIEW_DAYS = 14 # days an order should last beyond the lead time
+SERVICE_FACTOR = 1.65 # standard deviations of safety stock, about a 95% chance of not running out
+
+
+class ReorderForecast:
+    """Rolling per-item sales sums over the bills, kept in step as bills are added.
+
+    For every item sold in the window we keep the units sold and the sum of
+    the squared daily units, which is all the mean and the spread need. A new
+    bill adds to its lines' sums, and when the window moves on, the days that
+    drop out are subtracted, so nothing is recomputed from the bills after
+    the first build. The rankings are vectorized over those sums and the
+    analytics quantity column.
+    """
+
+    def __init__(self, analytics, bills, window_days=SALES_WINDOW_DAYS):
+        self.analytics = analytics
+        self.store = analytics.store
+        self.bills = bills
+        self.window_days = window_days
+        self.today = None # last day of the window
+        self.daily = {} # "YYYY-MM-DD" -> {item code: units sold that day}, for the days in the window
+        self.codes = None # item code per slot; None until the sums are built
+        self.units = None # units sold in the window
+        self.squares = None # sum of the squared daily units in the window
+        self.size = 0 # slots in use
+        self.slots = {} # item code -> slot
+        self.lock = threading.Lock()
+        bills.watchers.append(self)
+
+    def prepare(self, today=None):
+        """Builds the sums from the bills if they haven't been yet, and moves the window on to today."""
+        today = today or date.today()
+        with self.bills.lock, self.lock:
+            if self.codes is None:
+                self._build(today)
+            elif today > self.today:
+                self._advance(today)
+
+    def _build(self, today):
+        """Reads the window's bill lines and sums them per item and day in a few vectorized passes."""
+        start = today - timedelta(days=self.window_days - 1)
+        days, codes, units = [], [], []
+        for offset in range(self.window_days):
+            for bill in self.bills.for_day((start + timedelta(days=offset)).isoformat()):
+                days.extend(repeat(offset, len(bill.lines)))
+                codes.extend(line[0] for line in bill.lines)
+                units.extend(line[3] for line in bill.lines)
+        item_codes, item_slot = np.unique(np.array(codes, np.int64), return_inverse=True)
+        count = len(item_codes)
+        # One entry per (item, day) with its units sold, then per-item sums of those and their squares
+        pairs, pair_index = np.unique(item_slot * self.window_days + np.array(days, np.int64), return_inverse=True)
+        day_units = np.bincount(pair_index, weights=np.array(units, np.float64)).astype(np.int64)
+        pair_slot = pairs // self.window_days
+        self.codes = item_codes
+        self.units = np.bincount(pair_slot, weights=day_units, minlength=count).astype(np.int64)
+        self.squares = np.bincount(pair_slot, weights=day_units * day_units, minlength=count).astype(np.int64)
+        self.size = count
+        self.slots = {code: slot for slot, code in enumerate(item_codes.tolist())}
+        day_sales = [{} for _ in range(self.window_days)]
+        for code, offset, sold in zip(item_codes[pair_slot].tolist(), (pairs % self.window_days).tolist(),
+                                      day_units.tolist()):
+            day_sales[offset][code] = sold
+        self.daily = {(start + timedelta(days=offset)).isoformat(): sales
+                      for offset, sales in enumerate(day_sales) if sales}
+        self.today = today
+
+    def _advance(self, today):
+        """Moves the window's last day to today, subtracting the days that fall out of it."""
+        start = (today - timedelta(days=self.window_days - 1)).isoformat()
+        for day in [day for day in self.daily if day < start]:
+            for code, sold in self.daily.pop(day).items():
+                slot = self.slots[code]
+                self.units[slot] -= sold
+                self.squares[slot] -= sold * sold
+        self.today = today
+
+    def reset(self):
+        """Drops the sums after the bills are reloaded; the next ranking rebuilds them."""
+        with self.lock:
+            self.codes = None
+            self.slots = {}
+            self.daily = {}
+
+    def add_bill(self, bill):
+        """Adds a new bill's lines to the sums. The bill store calls this with its lock held."""
+        with self.lock:
+            if self.codes is None:
+                return # Not built yet; the build reads the bills under the same lock
+            day = date.fromisoformat(bill.day)
+            if day > self.today:
+                self._advance(day)
+            elif day <= self.today - timedelta(days=self.window_days):
+                return # Back-dated past the window
+            sales = self.daily.setdefault(bill.day, {})
+            for code, _, _, qty in bill.lines:
+                before = sales.get(code, 0)
+                sales[code] = before + qty
+                slot = self.slots.get(code)
+                if slot is None:
+                    slot = self.slots[code] = self._new_slot(code)
+                self.units[slot] += qty
+                self.squares[slot] += (before + qty) ** 2 - before * before
+
+    def remove_bill(self, bill):
+        """Takes a voided bill's lines out of the sums."""
+        with self.lock:
+            sales = None if self.codes is None else self.daily.get(bill.day)
+            if sales is None:
+                return # Not built yet, or outside the window
+            for code, _, _, qty in bill.lines:
+                before = sales[code]
+                sales[code] = before - qty
+                slot = self.slots[code]
+                self.units[slot] -= qty
+                self.squares[slot] += (before - qty) ** 2 - before * before
+
+    def _new_slot(self, code):
+        if self.size == len(self.codes): # Grow by half so appends stay amortized O(1)
+            capacity = max(16, self.size + self.size // 2)
+            for name in ("codes", "units", "squares"):
+                column = getattr(self, name)
+                grown = np.zeros(capacity, np.int64)
+                grown[:self.size] = column[:self.size]
+                setattr(self, name, grown)
+        self.codes[self.size] = code
+        self.size += 1
+        return self.size - 1
+
+    def suggestions(self, limit=None, lead_days=LEAD_TIME_DAYS, review_days=REVIEW_DAYS,
+                    service_factor=SERVICE_FACTOR, today=None):
+        """Returns (item, units a day, days of stock left, reorder point, order qty) for every item at or
+        below its reorder point, the soonest to run out first (at most limit of them)."""
+        self.prepare(today)
+        self.store.sync() # Other terminals' sales count too
+        with self.store.lock:
+            _, _, qty, live = self.analytics._columns()
+            with self.lock:
+                size = self.size
+                codes = self.codes[:size].copy()
+                units = self.units[:size].copy()
+                squares = self.squares[:size].copy()
+            # The analytics row of each sold item; -1 for items removed since
+            rows = np.fromiter(map(self.analytics.rows.get, codes.tolist(), repeat(-1)), np.int64, size)
+            sold = (units > 0) & (rows >= 0)
+            codes, units, squares, rows = codes[sold], units[sold], squares[sold], rows[sold]
+            on_hand = qty[rows]
+            velocity = units / self.window_days
+            spread = np.sqrt(np.maximum(squares / self.window_days - velocity * velocity, 0))
+            safety = service_factor * spread * np.sqrt(lead_days)
+            reorder_point = np.ceil(velocity * lead_days + safety)
+            due = np.flatnonzero(live[rows] & (on_hand <= reorder_point))
+            days_left = on_hand[due] / velocity[due]
+            if limit is not None and limit < len(due):
+                keep = np.argpartition(days_left, limit)[:limit]
+                due, days_left = due[keep], days_left[keep]
+            order = np.lexsort((codes[due], days_left))
+            due, days_left = due[order], days_left[order]
+            order_qty = np.maximum(np.ceil(velocity[due] * (lead_days + review_days) + safety[due]) - on_hand[due], 1)
+            return [(self.store.items[code], speed, left, int(point), int(units))
+                    for code, speed, left, point, units in zip(codes[due].tolist(), velocity[due].tolist(),
+                                                               days_left.tolist(), reorder_point[due].tolist(),
+                                                               order_qty.tolist())]
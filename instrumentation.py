@@ -0,0 +1,221 @@
+"""Low-overhead timers and counters for the storage paths and GUI handlers.
+
+Everything records into METRICS, one registry per process. Timers keep a
+count, a total, the slowest call and a ring of recent samples for
+percentiles; counters are plain running totals (bytes read and written,
+rows parsed, ...). Recording is a perf_counter call and a few additions
+under a lock, so it stays on in production.
+"""
+import json
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+RECENT_SAMPLES = 256 # per timer, for the p50/p95 figures
+
+
+class TimerStats:
+    """Call count, total and slowest time of one timed operation, plus its recent samples."""
+
+    __slots__ = ("count", "total", "slowest", "recent", "next_slot")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.slowest = 0.0
+        self.recent = []
+        self.next_slot = 0
+
+    def add(self, elapsed):
+        self.count += 1
+        self.total += elapsed
+        self.slowest = max(self.slowest, elapsed)
+        if len(self.recent) < RECENT_SAMPLES:
+            self.recent.append(elapsed)
+        else:
+            self.recent[self.next_slot] = elapsed
+            self.next_slot = (self.next_slot + 1) % RECENT_SAMPLES
+
+    def percentile(self, fraction):
+        if not self.recent:
+            return 0.0
+        ordered = sorted(self.recent)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+    def summary(self):
+        return {"count": self.count, "total_s": self.total, "mean_ms": self.total / self.count * 1000 if self.count else 0.0,
+                "p50_ms": self.percentile(0.5) * 1000, "p95_ms": self.percentile(0.95) * 1000,
+                "max_ms": self.slowest * 1000}
+
+
+class Metrics:
+    """Named timers and counters, safe to record into from any thread."""
+
+    def __init__(self):
+        self.timers = {} # name -> TimerStats
+        self.counters = {} # name -> running total
+        self.started = time.time()
+        self.lock = threading.Lock()
+
+    def record(self, name, elapsed):
+        """Adds one timing, in seconds, to the named timer."""
+        with self.lock:
+            stats = self.timers.get(name)
+            if stats is None:
+                stats = self.timers[name] = TimerStats()
+            stats.add(elapsed)
+
+    def add(self, name, amount=1):
+        """Adds to the named counter."""
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    @contextmanager
+    def timer(self, name):
+        """Times the with block into the named timer (failed calls included)."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    def timer_summary(self, name):
+        with self.lock:
+            stats = self.timers.get(name)
+            return stats.summary() if stats else None
+
+    def snapshot(self):
+        """Returns every figure as plain data: {"uptime_s", "counters", "timers"}."""
+        with self.lock:
+            return {"uptime_s": time.time() - self.started, "counters": dict(self.counters),
+                    "timers": {name: stats.summary() for name, stats in self.timers.items()}}
+
+    def reset(self):
+        with self.lock:
+            self.timers = {}
+            self.counters = {}
+            self.started = time.time()
+
+
+METRICS = Metrics()
+
+
+def timed(name):
+    """Decorator that times every call of a function into METRICS."""
+    def decorate(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                METRICS.record(name, time.perf_counter() - start)
+        return wrapper
+    return decorate
+
+
+def instrument(obj, method_names, prefix):
+    """Times the named methods of obj (an instance) as prefix + method name. Missing methods are skipped."""
+    for method_name in method_names:
+        method = getattr(obj, method_name, None)
+        if method is not None and not hasattr(method, "__wrapped__"):
+            setattr(obj, method_name, timed(prefix + method_name)(method))
+    return obj
+
+
+class ProfileCapture:
+    """On-demand cProfile capture across the Tk thread and the tasks run while it is on.
+
+    cProfile only sees the thread that enabled it, so start() profiles the
+    calling thread and wrap() gives each background task its own profiler;
+    stop() merges them all into one report.
+    """
+
+    def __init__(self):
+        self.profiles = []
+        self.main_profile = None
+        self.lock = threading.Lock()
+
+    @property
+    def active(self):
+        return self.main_profile is not None
+
+    def start(self):
+        import cProfile # Imported on first use; pstats alone adds noticeably to startup
+        with self.lock:
+            self.profiles = []
+            self.main_profile = cProfile.Profile()
+        self.main_profile.enable()
+
+    def wrap(self, task):
+        """Returns task, profiled if a capture is running when it starts."""
+        def profiled():
+            if not self.active:
+                return task()
+            import cProfile
+            profile = cProfile.Profile()
+            try:
+                profile.enable()
+            except ValueError: # Newer Pythons allow one profiler per process, and it sees every thread
+                return task()
+            try:
+                return task()
+            finally:
+                profile.disable()
+                with self.lock:
+                    self.profiles.append(profile)
+        return profiled
+
+    def stop(self, path=None, limit=30):
+        """Stops the capture and returns the top functions by cumulative time. Saves raw stats to path if given."""
+        import io
+        import pstats
+        profile = self.main_profile
+        profile.disable()
+        self.main_profile = None
+        with self.lock:
+            profiles = [profile] + self.profiles
+            self.profiles = []
+        out = io.StringIO()
+        stats = pstats.Stats(*profiles, stream=out)
+        if path:
+            stats.dump_stats(path)
+        stats.sort_stats("cumulative").print_stats(limit)
+        return out.getvalue()
+
+
+def prometheus_name(name):
+    return "inventory_" + re.sub(r"[^a-zA-Z0-9_]", "_", name).strip("_").lower()
+
+
+def to_prometheus(snapshot):
+    """Formats a METRICS snapshot in the Prometheus text exposition format."""
+    lines = []
+    for name, value in sorted(snapshot["counters"].items()):
+        metric = prometheus_name(name) + "_total"
+        lines += [f"# TYPE {metric} counter", f"{metric} {value}"]
+    for name, stats in sorted(snapshot["timers"].items()):
+        metric = prometheus_name(name) + "_seconds"
+        lines += [f"# TYPE {metric} summary",
+                  f'{metric}{{quantile="0.5"}} {stats["p50_ms"] / 1000:.6f}',
+                  f'{metric}{{quantile="0.95"}} {stats["p95_ms"] / 1000:.6f}',
+                  f"{metric}_sum {stats['total_s']:.6f}",
+                  f"{metric}_count {stats['count']}"]
+    lines.append(f"inventory_uptime_seconds {snapshot['uptime_s']:.1f}")
+    return "\n".join(lines) + "\n"
+
+
+def export_metrics(path, metrics=METRICS):
+    """Writes a snapshot to path: Prometheus text for .prom/.txt files, JSON otherwise. Returns the path."""
+    snapshot = metrics.snapshot()
+    if os.path.splitext(path)[1].lower() in (".prom", ".txt"):
+        text = to_prometheus(snapshot)
+    else:
+        text = json.dumps(snapshot, indent=1, sort_keys=True) + "\n"
+    with open(path + ".tmp", "w") as f:
+        f.write(text)
+    os.replace(path + ".tmp", path)
+    return path
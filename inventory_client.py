@@ -0,0 +1,370 @@
+import json
+import os
+import queue
+import socket
+import threading
+from contextlib import contextmanager
+from decimal import Decimal
+
+from bill_store import Bill
+from customer_registry import Customer
+from inventory_store import ConflictError, Item, StockError
+from stock_ledger import timestamp
+
+DEFAULT_ADDRESS = "127.0.0.1:8765"
+SERVER_ADDRESS = os.environ.get("INVENTORY_SERVER", "")
+
+ERRORS = {"KeyError": KeyError, "ValueError": ValueError, "TypeError": TypeError, "ConflictError": ConflictError}
+
+
+class ServerError(Exception):
+    """An unexpected error inside the inventory server."""
+
+
+def parse_address(text):
+    """Returns (host, port) for "host:port", or the socket path for anything else."""
+    host, _, port = text.rpartition(":")
+    if host and port.isdigit() and os.sep not in text:
+        return host, int(port)
+    return text
+
+
+class Connection:
+    """One socket to the inventory server, speaking the line-per-request JSON protocol."""
+
+    def __init__(self, address, timeout=30):
+        if isinstance(address, tuple):
+            self.sock = socket.create_connection(address, timeout=timeout)
+            self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        else:
+            self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self.sock.settimeout(timeout)
+            self.sock.connect(address)
+        self.reader = self.sock.makefile("rb")
+        self.next_id = 1
+
+    def request(self, calls):
+        """Sends all (op, args) calls at once and returns their responses, in order."""
+        messages = []
+        for op, args in calls:
+            messages.append(json.dumps({"id": self.next_id, "op": op, "args": args}) + "\n")
+            self.next_id += 1
+        self.sock.sendall("".join(messages).encode("utf-8"))
+        responses = []
+        for _ in calls:
+            line = self.reader.readline()
+            if not line:
+                raise ConnectionError("The inventory server closed the connection.")
+            responses.append(json.loads(line))
+        return responses
+
+    def close(self):
+        self.reader.close()
+        self.sock.close()
+
+
+class ConnectionPool:
+    """Hands out connections to the server, opening at most size of them."""
+
+    def __init__(self, address, size=4):
+        self.address = parse_address(address) if isinstance(address, str) else address
+        self.idle = queue.LifoQueue()
+        self.slots = threading.BoundedSemaphore(size)
+
+    @contextmanager
+    def connection(self):
+        self.slots.acquire()
+        try:
+            try:
+                conn = self.idle.get_nowait()
+            except queue.Empty:
+                conn = Connection(self.address)
+            try:
+                yield conn
+            except (OSError, ValueError):
+                conn.close() # Broken or out of step, don't reuse it
+                raise
+            self.idle.put(conn)
+        finally:
+            self.slots.release()
+
+    def close(self):
+        while not self.idle.empty():
+            self.idle.get_nowait().close()
+
+
+class InventoryClient:
+    """Calls operations on the inventory server through a connection pool."""
+
+    def __init__(self, address, pool_size=4):
+        self.pool = ConnectionPool(address, pool_size)
+
+    def call(self, op, **args):
+        """Runs one operation and returns its result, raising the server's error if it failed."""
+        return self.call_many([(op, args)])[0]
+
+    def call_many(self, calls):
+        """Pipelines several (op, args) calls over one connection. Raises the first error."""
+        with self.pool.connection() as conn:
+            responses = conn.request(calls)
+        results = []
+        for response in responses:
+            if not response["ok"]:
+                raise self._error(response)
+            results.append(response["result"])
+        return results
+
+    @staticmethod
+    def _error(response):
+        if response["error"] == "StockError":
+            shortages = [tuple(shortage) for shortage in response["shortages"]]
+            return StockError(shortages, dict((code, name) for code, name in response["names"]))
+        return ERRORS.get(response["error"], ServerError)(response["message"])
+
+    def close(self):
+        self.pool.close()
+
+
+def item_from_wire(row):
+    return None if row is None else Item(*row)
+
+
+def customer_from_wire(row):
+    return None if row is None else Customer(*row)
+
+
+def money_from_wire(value):
+    return Decimal(str(value)).quantize(Decimal("0.01"))
+
+
+class RemoteStore:
+    """Stands in for InventoryStore when the GUI runs against an inventory server."""
+
+    FETCH_SIZE = 500 # items per round trip when listing
+
+    def __init__(self, client):
+        self.client = client
+
+    def load(self):
+        self.client.call("ping") # The server owns the data; just check it is there
+        return self
+
+    def sync(self):
+        pass # Every read goes to the server
+
+    def prepare_search(self):
+        pass # The server prepares its own indexes
+
+    def close(self):
+        self.client.close()
+
+    def __len__(self):
+        return self.client.call("stats")["items"]
+
+    def __contains__(self, code):
+        return self.get(code) is not None
+
+    def get(self, code):
+        return item_from_wire(self.client.call("get", code=code))
+
+    def find_by_name(self, name):
+        return [item_from_wire(row) for row in self.client.call("find_by_name", name=name)]
+
+    def search_by_name(self, query, mode="contains", limit=None):
+        return [item_from_wire(row) for row in self.client.call("search_by_name", query=query, mode=mode, limit=limit)]
+
+    def search_by_price(self, start_price, end_price, min_qty=None, max_qty=None):
+        return [item_from_wire(row) for row in self.client.call(
+            "search_by_price", start_price=start_price, end_price=end_price, min_qty=min_qty, max_qty=max_qty)]
+
+    def iter_price_range(self, start_price, end_price, min_qty=None, max_qty=None, descending=False):
+        cursor = self.client.call("open_price_range", start_price=start_price, end_price=end_price,
+                                  min_qty=min_qty, max_qty=max_qty, descending=descending)
+        return self._fetch_all(cursor)
+
+    def iter_items(self, sort_by=None, descending=False):
+        return self._fetch_all(self.client.call("open_items", sort_by=sort_by, descending=descending))
+
+    def _fetch_all(self, cursor):
+        """Lazily yields a server-side listing, FETCH_SIZE items per request."""
+        done = False
+        try:
+            while not done:
+                rows = self.client.call("fetch", cursor=cursor, count=self.FETCH_SIZE)
+                done = len(rows) < self.FETCH_SIZE
+                for row in rows:
+                    yield item_from_wire(row)
+        finally:
+            if not done: # Abandoned part way through
+                self.client.call("close_cursor", cursor=cursor)
+
+    def add(self, code, name, price, qty):
+        return item_from_wire(self.client.call("add", code=code, name=name, price=price, qty=qty))
+
+    def add_many(self, items):
+        return self.client.call("add_many", items=[list(item) for item in items])
+
+    def remove(self, code):
+        return item_from_wire(self.client.call("remove", code=code))
+
+    def remove_many(self, codes):
+        return [item_from_wire(row) for row in self.client.call("remove_many", codes=list(codes))]
+
+    def update(self, code, name=None, price=None, qty=None, expected_version=None):
+        return item_from_wire(self.client.call("update", code=code, name=name, price=price, qty=qty,
+                                               expected_version=expected_version))
+
+    def decrement_stock(self, quantities):
+        self.client.call("decrement_stock", quantities=list(quantities.items()))
+
+    def restock(self, quantities):
+        self.client.call("restock", quantities=list(quantities.items()))
+
+
+class RemoteBillStore:
+    """Stands in for BillStore when the GUI runs against an inventory server."""
+
+    def __init__(self, client):
+        self.client = client
+
+    def load(self):
+        return self
+
+    def sync(self):
+        pass # The server holds every till's bills
+
+    def close(self):
+        pass # The connections belong to the RemoteStore
+
+    def __len__(self):
+        return self.client.call("stats")["bills"]
+
+    def add(self, customer, lines, created=None):
+        return Bill.from_record(self.client.call("add_bill", customer=customer, lines=lines, created=created))
+
+    def commit(self, store, customer, lines, created=None):
+        """Takes the lines out of the server's stock and records the bill in one request (store isn't used)."""
+        return Bill.from_record(self.client.call("commit_bill", customer=customer, lines=lines, created=created))
+
+    def remove(self, bill_id):
+        record = self.client.call("remove_bill", bill_id=bill_id)
+        return None if record is None else Bill.from_record(record)
+
+    def restore(self, bill):
+        return Bill.from_record(self.client.call("restore_bill", bill=bill.to_record()))
+
+    def get(self, bill_id):
+        record = self.client.call("get_bill", bill_id=bill_id)
+        return None if record is None else Bill.from_record(record)
+
+    def for_customer(self, name):
+        return [Bill.from_record(record) for record in self.client.call("bills_for_customer", name=name)]
+
+    def for_day(self, day):
+        return [Bill.from_record(record) for record in self.client.call("bills_for_day", day=day)]
+
+    def daily_total(self, day):
+        count, total = self.client.call("daily_total", day=day)
+        return count, money_from_wire(total)
+
+    def daily_totals(self):
+        return {day: (count, money_from_wire(total))
+                for day, (count, total) in self.client.call("daily_totals").items()}
+
+
+class RemoteAnalytics:
+    """Stands in for StockAnalytics when the GUI runs against an inventory server."""
+
+    def __init__(self, client):
+        self.client = client
+
+    def prepare(self):
+        pass # The server keeps the columns
+
+    def summary(self):
+        summary = self.client.call("stock_summary")
+        summary["value"] = money_from_wire(summary["value"])
+        return summary
+
+    def low_stock(self, threshold=None, limit=None):
+        return [item_from_wire(row) for row in self.client.call("low_stock", threshold=threshold, limit=limit)]
+
+    def top_value(self, count=20):
+        return [(item_from_wire(row), money_from_wire(value)) for row, value in self.client.call("top_value", count=count)]
+
+    def price_bands(self, bands=None):
+        return [(low, high, items, units, money_from_wire(value))
+                for low, high, items, units, value in self.client.call("price_bands", bands=bands)]
+
+
+class RemoteForecast:
+    """Stands in for ReorderForecast when the GUI runs against an inventory server."""
+
+    def __init__(self, client):
+        self.client = client
+
+    def prepare(self):
+        pass # The server keeps the sales sums
+
+    def suggestions(self, limit=None):
+        return [(item_from_wire(row), velocity, days_left, reorder_point, order_qty)
+                for row, velocity, days_left, reorder_point, order_qty
+                in self.client.call("reorder_suggestions", limit=limit)]
+
+
+class RemoteLedger:
+    """Stands in for StockLedger when the GUI runs against an inventory server."""
+
+    def __init__(self, client):
+        self.client = client
+
+    def load(self):
+        return self
+
+    def close(self):
+        pass # The connections belong to the RemoteStore
+
+    def qty_at(self, code, when):
+        return self.client.call("qty_at", code=code, when=timestamp(when))
+
+    def sold_between(self, code, start, end=None):
+        return self.client.call("sold_between", code=code, start=timestamp(start), end=timestamp(end))
+
+    def units_sold(self, days=7, until=None):
+        until = until if until is None or isinstance(until, str) else until.isoformat()
+        return dict(self.client.call("units_sold", days=days, until=until))
+
+    def totals(self, code):
+        return self.client.call("movement_totals", code=code)
+
+
+class RemoteCustomerRegistry:
+    """Stands in for CustomerRegistry when the GUI runs against an inventory server."""
+
+    def __init__(self, client):
+        self.client = client
+
+    def load(self):
+        return self
+
+    def sync(self):
+        pass
+
+    def close(self):
+        pass # The connections belong to the RemoteStore
+
+    def __len__(self):
+        return self.client.call("stats")["customers"]
+
+    def __contains__(self, name):
+        return self.get(name) is not None
+
+    def get(self, name):
+        return customer_from_wire(self.client.call("get_customer", name=name))
+
+    def register(self, name, registered=None):
+        customer, created = self.client.call("register_customer", name=name, registered=registered)
+        return customer_from_wire(customer), created
+
+    def remove(self, name):
+        return customer_from_wire(self.client.call("remove_customer", name=name))
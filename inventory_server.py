@@ -0,0 +1,320 @@
+"""Local inventory server: one process owns the stores and the GUIs talk to it.
+
+Run: python inventory_server.py [address]
+
+The address is "host:port" for TCP or a file path for a Unix socket; it
+defaults to INVENTORY_SERVER, or 127.0.0.1:8765. Point the GUIs at the same
+address through INVENTORY_SERVER to run them in client mode.
+
+The protocol is one JSON object per line. A request is
+{"id": 1, "op": "get", "args": {"code": 42}} and its response is
+{"id": 1, "ok": true, "result": ...} or {"id": 1, "ok": false, "error": ...}.
+Clients may send many requests without waiting; responses come back in order.
+"""
+import asyncio
+import json
+import sys
+from itertools import islice
+
+from analytics import StockAnalytics
+from bill_store import Bill, BillStore
+from customer_registry import CUSTOMER_JOURNAL_FILE, CustomerRegistry
+from forecast import ReorderForecast
+from inventory_client import DEFAULT_ADDRESS, SERVER_ADDRESS, parse_address
+from inventory_store import JOURNAL_FILE, InventoryStore, StockError
+from stock_ledger import StockLedger
+
+# Requests waiting when a batch starts are run together in one trip to the worker thread
+MAX_BATCH = 256
+
+# Open cursors are dropped, oldest first, past this many (a client that died never closes its own)
+MAX_CURSORS = 64
+
+
+def item_to_wire(item):
+    return None if item is None else [item.code, item.name, item.price, item.qty, item.version]
+
+
+def customer_to_wire(customer):
+    return None if customer is None else [customer.name, customer.registered]
+
+
+class InventoryServer:
+    """Serves an InventoryStore, a BillStore and a CustomerRegistry over a socket.
+
+    Requests from all connections go through one queue. A single worker takes
+    whatever has queued up (up to MAX_BATCH), runs it in one executor call and
+    writes each connection's responses back with one write, so pipelining
+    clients and busy tills pay for one thread switch per batch, not per request.
+    """
+
+    def __init__(self, store, bills, customers):
+        self.store = store
+        self.bills = bills
+        self.customers = customers
+        self.analytics = StockAnalytics(store)
+        self.forecast = ReorderForecast(self.analytics, bills)
+        self.cursors = {} # cursor id -> item generator, oldest first
+        self.next_cursor = 1
+        self.queue = None
+        self.worker = None
+        self.server = None
+        self.batches = 0 # batches run, for the load test
+        self.requests = 0
+
+    async def start(self, address):
+        """Starts listening on address ((host, port) or a socket path)."""
+        self.queue = asyncio.Queue()
+        self.worker = asyncio.create_task(self.process_batches())
+        if isinstance(address, tuple):
+            self.server = await asyncio.start_server(self.handle_connection, *address)
+        else:
+            self.server = await asyncio.start_unix_server(self.handle_connection, address)
+        return self.server
+
+    async def handle_connection(self, reader, writer):
+        """Queues every request line of one connection; the batch worker answers them."""
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                await self.queue.put((line, writer))
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            await self.queue.put((None, writer)) # Close after the responses already queued
+
+    async def process_batches(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            while len(batch) < MAX_BATCH and not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+            lines = [line for line, _ in batch if line is not None]
+            responses = iter(await loop.run_in_executor(None, self.execute_batch, lines))
+            self.batches += 1
+            self.requests += len(lines)
+            output = {} # writer -> response lines, in request order
+            for line, writer in batch:
+                if line is not None:
+                    output.setdefault(writer, []).append(next(responses))
+            for writer, chunks in output.items():
+                if not writer.is_closing():
+                    writer.write(b"".join(chunks))
+            for writer in output:
+                try:
+                    await writer.drain()
+                except ConnectionError:
+                    writer.close()
+            for line, writer in batch:
+                if line is None:
+                    writer.close()
+
+    def execute_batch(self, lines):
+        """Runs a batch of request lines in order and returns the encoded responses."""
+        return [(json.dumps(self.execute(line)) + "\n").encode("utf-8") for line in lines]
+
+    def execute(self, line):
+        try:
+            request = json.loads(line)
+        except ValueError:
+            return {"id": None, "ok": False, "error": "ValueError", "message": "Malformed request."}
+        request_id = request.get("id")
+        handler = getattr(self, "op_" + str(request.get("op")), None)
+        if handler is None:
+            return {"id": request_id, "ok": False, "error": "ValueError", "message": f"Unknown operation '{request.get('op')}'."}
+        try:
+            return {"id": request_id, "ok": True, "result": handler(**request.get("args", {}))}
+        except StockError as e:
+            return {"id": request_id, "ok": False, "error": "StockError", "message": str(e),
+                    "shortages": e.shortages, "names": [[code, self.store.get(code).name]
+                                                        for code, _, _ in e.shortages if self.store.get(code)]}
+        except Exception as e: # Reported to the client, the server keeps serving
+            message = str(e.args[0]) if isinstance(e, KeyError) and e.args else str(e)
+            return {"id": request_id, "ok": False, "error": type(e).__name__, "message": message}
+
+    # --- Items ---
+    def op_ping(self):
+        return "pong"
+
+    def op_stats(self):
+        return {"items": len(self.store), "bills": len(self.bills), "customers": len(self.customers)}
+
+    def op_get(self, code):
+        return item_to_wire(self.store.get(code))
+
+    def op_get_many(self, codes):
+        return [item_to_wire(self.store.get(code)) for code in codes]
+
+    def op_find_by_name(self, name):
+        return [item_to_wire(item) for item in self.store.find_by_name(name)]
+
+    def op_search_by_name(self, query, mode="contains", limit=None):
+        return [item_to_wire(item) for item in self.store.search_by_name(query, mode, limit)]
+
+    def op_search_by_price(self, start_price, end_price, min_qty=None, max_qty=None):
+        return [item_to_wire(item) for item in self.store.search_by_price(start_price, end_price, min_qty, max_qty)]
+
+    def op_open_items(self, sort_by=None, descending=False):
+        return self._open_cursor(self.store.iter_items(sort_by, descending))
+
+    def op_open_price_range(self, start_price, end_price, min_qty=None, max_qty=None, descending=False):
+        return self._open_cursor(self.store.iter_price_range(start_price, end_price, min_qty, max_qty, descending))
+
+    def _open_cursor(self, items):
+        cursor = self.next_cursor
+        self.next_cursor += 1
+        self.cursors[cursor] = items
+        while len(self.cursors) > MAX_CURSORS:
+            del self.cursors[next(iter(self.cursors))]
+        return cursor
+
+    def op_fetch(self, cursor, count):
+        """Returns up to count more items from a cursor; fewer means it is exhausted."""
+        items = self.cursors.get(cursor)
+        if items is None:
+            raise ValueError("The listing expired, open it again.")
+        rows = [item_to_wire(item) for item in islice(items, count)]
+        if len(rows) < count:
+            del self.cursors[cursor]
+        return rows
+
+    def op_close_cursor(self, cursor):
+        self.cursors.pop(cursor, None)
+
+    def op_add(self, code, name, price, qty):
+        return item_to_wire(self.store.add(code, name, price, qty))
+
+    def op_add_many(self, items):
+        return self.store.add_many([tuple(item) for item in items])
+
+    def op_remove(self, code):
+        return item_to_wire(self.store.remove(code))
+
+    def op_remove_many(self, codes):
+        return [item_to_wire(item) for item in self.store.remove_many(codes)]
+
+    def op_update(self, code, name=None, price=None, qty=None, expected_version=None):
+        return item_to_wire(self.store.update(code, name, price, qty, expected_version))
+
+    def op_decrement_stock(self, quantities):
+        self.store.decrement_stock({code: qty for code, qty in quantities})
+
+    def op_restock(self, quantities):
+        self.store.restock(dict(quantities))
+
+    # --- Reports ---
+    def op_stock_summary(self):
+        summary = self.analytics.summary()
+        summary["value"] = float(summary["value"])
+        return summary
+
+    def op_low_stock(self, threshold=None, limit=None):
+        return [item_to_wire(item) for item in self.analytics.low_stock(threshold, limit)]
+
+    def op_top_value(self, count=20):
+        return [[item_to_wire(item), float(value)] for item, value in self.analytics.top_value(count)]
+
+    def op_price_bands(self, bands=None):
+        return [[low, high, items, units, float(value)]
+                for low, high, items, units, value in self.analytics.price_bands(bands)]
+
+    # --- Stock movements ---
+    def op_reorder_suggestions(self, limit=None):
+        return [[item_to_wire(item), velocity, days_left, reorder_point, order_qty]
+                for item, velocity, days_left, reorder_point, order_qty in self.forecast.suggestions(limit)]
+
+    def _ledger(self):
+        if self.store.ledger is None:
+            raise ValueError("This server keeps no stock movement ledger.")
+        return self.store.ledger
+
+    def op_qty_at(self, code, when):
+        return self._ledger().qty_at(code, when)
+
+    def op_sold_between(self, code, start, end=None):
+        return self._ledger().sold_between(code, start, end)
+
+    def op_units_sold(self, days=7, until=None):
+        return list(self._ledger().units_sold(days, until).items()) # JSON object keys can't be ints
+
+    def op_movement_totals(self, code):
+        return self._ledger().totals(code)
+
+    # --- Bills ---
+    def op_add_bill(self, customer, lines, created=None):
+        return self.bills.add(customer, [tuple(line) for line in lines], created).to_record()
+
+    def op_commit_bill(self, customer, lines, created=None):
+        """Takes the lines out of stock and records the bill, in one request."""
+        return self.bills.commit(self.store, customer, [tuple(line) for line in lines], created).to_record()
+
+    def op_remove_bill(self, bill_id):
+        bill = self.bills.remove(bill_id)
+        return None if bill is None else bill.to_record()
+
+    def op_restore_bill(self, bill):
+        return self.bills.restore(Bill.from_record(bill)).to_record()
+
+    def op_get_bill(self, bill_id):
+        bill = self.bills.get(bill_id)
+        return None if bill is None else bill.to_record()
+
+    def op_bills_for_customer(self, name):
+        return [bill.to_record() for bill in self.bills.for_customer(name)]
+
+    def op_bills_for_day(self, day):
+        return [bill.to_record() for bill in self.bills.for_day(day)]
+
+    def op_daily_total(self, day):
+        count, total = self.bills.daily_total(day)
+        return [count, float(total)]
+
+    def op_daily_totals(self):
+        return {day: [count, float(total)] for day, (count, total) in self.bills.daily_totals().items()}
+
+    # --- Customers ---
+    def op_register_customer(self, name, registered=None):
+        customer, created = self.customers.register(name, registered)
+        return [customer_to_wire(customer), created]
+
+    def op_remove_customer(self, name):
+        return customer_to_wire(self.customers.remove(name))
+
+    def op_get_customer(self, name):
+        return customer_to_wire(self.customers.get(name))
+
+
+def open_stores():
+    """Loads the item store, its stock ledger, the bills and the customers the same way the GUI does."""
+    store = InventoryStore(journal_path=JOURNAL_FILE, ledger=StockLedger().load()).load()
+    store.prepare_search()
+    bills = BillStore().load()
+    customers = CustomerRegistry(journal_path=CUSTOMER_JOURNAL_FILE).load()
+    return store, bills, customers
+
+
+async def serve(address):
+    store, bills, customers = open_stores()
+    server = InventoryServer(store, bills, customers)
+    await server.start(address)
+    print(f"Serving {len(store):,} items on {address}")
+    try:
+        await server.server.serve_forever()
+    finally:
+        store.close()
+        customers.close()
+
+
+def main():
+    """Command line entry point: python inventory_server.py [host:port | socket path]"""
+    address = parse_address(sys.argv[1] if len(sys.argv) > 1 else SERVER_ADDRESS or DEFAULT_ADDRESS)
+    try:
+        asyncio.run(serve(address))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,570 @@
+import math
+import threading
+from bisect import bisect_left, bisect_right, insort
+
+from contextlib import nullcontext
+
+from journal import FileLock, Journal, JournaledStore
+from name_index import NameIndex
+from stock_ledger import ADD, ADJUST, REMOVE, SALE
+
+from storage import get_backend
+
+JOURNAL_FILE = "DATA.journal"
+
+# Fold the journal into a fresh DATA.txt once it grows past this many bytes
+JOURNAL_COMPACT_THRESHOLD = 1024 * 1024
+
+PRICE_CHUNK = 512 # price index keys read at a time by iter_price_range
+
+
+class ConflictError(Exception):
+    """Raised when an item changed on another terminal after the caller last looked at it."""
+
+
+class StockError(ValueError):
+    """Raised when bill lines ask for more stock than is left. shortages holds (code, requested, available)."""
+
+    def __init__(self, shortages, names):
+        self.shortages = shortages
+        super().__init__("; ".join(
+            f"Not enough stock for {names.get(code, f'item {code}')}. Available: {available}"
+            for code, requested, available in shortages
+        ))
+
+
+def to_cents(price):
+    """Converts a price (number, Decimal or numeric string) to a whole number of cents."""
+    cents = float(price) * 100
+    if not math.isfinite(cents):
+        raise ValueError(f"Invalid price '{price}'.")
+    return round(cents)
+
+
+def format_cents(cents):
+    """Formats cents the way DATA.txt stores prices: "12", "12.5", "12.25"."""
+    whole, part = divmod(cents, 100)
+    if not part:
+        return str(whole)
+    return f"{whole}.{part:02d}".rstrip("0")
+
+
+def cents_bound(price, upper):
+    """Converts a search bound to cents: a lower bound rounds up, an upper bound rounds down."""
+    if math.isinf(price):
+        return price
+    cents = round(price * 100, 6) # Drop float noise such as 10.3 * 100 = 1030.0000000000001
+    return math.floor(cents) if upper else math.ceil(cents)
+
+
+class Item:
+    """A single inventory item with typed fields, parsed once when it is loaded.
+
+    The price is kept as a whole number of cents, so comparisons and totals
+    are exact; item.price gives it back in currency units. __slots__ keeps the
+    per-item overhead down on large catalogs.
+    """
+
+    __slots__ = ("code", "name", "cents", "qty", "version")
+
+    def __init__(self, code, name, price, qty, version=0):
+        self.code = code
+        self.name = name
+        self.cents = to_cents(price)
+        self.qty = qty
+        self.version = version # bumped on every change, here or synced from another terminal
+
+    @property
+    def price(self):
+        return self.cents / 100
+
+    @price.setter
+    def price(self, price):
+        self.cents = to_cents(price)
+
+    @classmethod
+    def from_row(cls, row):
+        """Builds an item from a [code, name, price, qty] row of strings."""
+        return cls(int(row[0]), row[1], row[2], int(row[3]))
+
+    def to_row(self):
+        """Returns the item as a [code, name, price, qty] row of strings."""
+        return [str(self.code), self.name, format_cents(self.cents), str(self.qty)]
+
+
+def check_name(name):
+    """Raises ValueError if an item name can't be stored in a #-delimited DATA.txt row. Returns the name."""
+    if "#" in name or "\n" in name or "\r" in name:
+        raise ValueError(f"Item name {name.strip()!r} cannot contain '#' or line breaks.")
+    return name
+
+
+def parse_whole(value, field):
+    """Parses a whole number given as an int or a string of digits. Raises ValueError for anything else.
+
+    Floats and booleans (say from a JSON import) are refused rather than truncated.
+    """
+    if isinstance(value, bool) or not isinstance(value, (int, str)):
+        raise ValueError(f"{field} must be a whole number, not {value!r}.")
+    try:
+        return int(value)
+    except ValueError:
+        raise ValueError(f"{field} must be a whole number, not {value!r}.") from None
+
+
+def validate_item(code, name, price, qty):
+    """Parses and checks new item fields given as strings or numbers. Returns (code, name, price, qty).
+
+    Raises ValueError for anything the Add Item dialog would refuse.
+    """
+    code = parse_whole(code, "Item code")
+    name = check_name(str(name).strip())
+    price = to_cents(price) / 100
+    qty = parse_whole(qty, "Quantity")
+    if not name:
+        raise ValueError("Item name cannot be empty.")
+    if code <= 0 or price < 0 or qty < 0:
+        raise ValueError("Code, price, and quantity must be non-negative.")
+    return code, name, price, qty
+
+
+def sort_items(items, sort_by=None, descending=False):
+    """Sorts a list of items by "code", "name", "price" or "qty"; None keeps the given order."""
+    if sort_by is None:
+        return list(reversed(items)) if descending else items
+    if sort_by == "name":
+        return sorted(items, key=lambda item: (item.name.lower(), item.code), reverse=descending)
+    attribute = "cents" if sort_by == "price" else sort_by
+    return sorted(items, key=lambda item: getattr(item, attribute), reverse=descending)
+
+
+class InventoryStore(JournaledStore):
+    """Keeps DATA.txt in memory, indexed by item code, and writes changes back to the file.
+
+    Backends with row updates (SQLite) get just the changed rows. For the flat
+    file, a journal path makes each change an append to the journal instead of
+    a rewrite of DATA.txt, and the journal is compacted in the background.
+
+    Several terminals can share the same files. Every change first syncs the
+    changes other terminals made (their journal appends, or the SQLite change
+    log) and then checks the items it touches against that state: under the
+    journal's file lock for the flat file, with compare-and-swap statements for
+    SQLite. A change based on stale data fails instead of overwriting others.
+    """
+
+    def __init__(self, journal_path=None, compact_threshold=JOURNAL_COMPACT_THRESHOLD, backend=None, ledger=None):
+        self.backend = backend or get_backend()
+        self.ledger = ledger # StockLedger that records this terminal's stock movements, if any
+        self.items = {} # item code -> Item, in file order
+        self.name_index = {} # lower-case name -> set of item codes
+        self.price_index = [] # sorted (price in cents, code) pairs for range searches
+        self.name_search = NameIndex() # prefix/substring/fuzzy name search
+        self.watchers = [] # objects told about every change, e.g. the analytics columns
+        self.loading = False # the price and name search indexes are built once at the end of a load
+        self.invalid_rows = [] # rows that could not be parsed, kept so saving doesn't drop them
+        # Row-update backends are already durable per change, a journal would only add work
+        use_journal = journal_path and not self.backend.supports_row_updates
+        self.journal = Journal(journal_path, put_fields=4) if use_journal else None
+        # Held around every change so terminals sharing the journal take turns
+        self.shared_lock = FileLock(journal_path + ".lock") if use_journal else nullcontext()
+        self.change_seq = 0 # last SQLite change log entry applied
+        self.compact_threshold = compact_threshold
+        self.lock = threading.RLock()
+        self.compaction = None # background compaction thread, if one is running
+
+    def load(self):
+        """Loads DATA.txt once, replays the journal and rebuilds all indexes."""
+        with self.shared_lock, self.lock:
+            if self.backend.supports_row_updates:
+                self.change_seq = self.backend.item_change_seq()
+            self.items = {}
+            self.name_index = {}
+            self.price_index = []
+            self.invalid_rows = []
+            self.loading = True
+            for row in self.backend.load_items():
+                try:
+                    item = Item.from_row(row)
+                except ValueError:
+                    self.invalid_rows.append(row)
+                    continue
+                self._index(item)
+            if self.journal:
+                for op, fields in self.journal.replay():
+                    self._apply_record(op, fields)
+            self.loading = False
+            self.price_index = sorted((item.cents, item.code) for item in self.items.values())
+            self.name_search.build((item.code, item.name) for item in self.items.values())
+            self._notify_reset()
+        return self
+
+    def _apply_record(self, op, fields):
+        """Applies one journal record: ("P", [code, name, price, qty]) or ("D", [code])."""
+        try:
+            code = int(fields[0])
+            existing = self.items.get(code)
+            if op == "D":
+                if existing is not None:
+                    self._unindex(existing)
+            elif existing is None:
+                self._index(Item.from_row(fields))
+            else:
+                replacement = Item.from_row(fields)
+                name_changed = replacement.name != existing.name
+                price_changed = replacement.cents != existing.cents
+                if name_changed or price_changed or replacement.qty != existing.qty:
+                    self._unindex_fields(existing, name_changed, price_changed)
+                    existing.name, existing.cents, existing.qty = replacement.name, replacement.cents, replacement.qty
+                    existing.version += 1
+                    self._index_fields(existing, name_changed, price_changed)
+                    self._notify_put(existing)
+        except ValueError:
+            pass # Skip records with invalid data
+
+    def sync(self):
+        """Applies the changes other terminals made since we last looked."""
+        if not self.backend.supports_row_updates:
+            super().sync()
+            return
+        with self.lock:
+            seq, codes = self.backend.item_changes_since(self.change_seq)
+            if codes is None or len(codes) > max(1000, len(self.items) // 10):
+                self.load() # The log was reset by a full save, or a bulk change makes reloading cheaper
+                return
+            self._refresh(codes)
+            self.change_seq = seq
+
+    def _refresh(self, codes):
+        """Re-reads the given items from a row-update backend."""
+        for code in codes:
+            row = self.backend.find_item(code)
+            if row is None:
+                self._apply_record("D", [str(code)])
+            else:
+                self._apply_record("P", row)
+
+    def save(self):
+        """Writes the whole store back to DATA.txt."""
+        with self.shared_lock, self.lock:
+            self.backend.save_items(self._snapshot_rows())
+
+    def _snapshot_rows(self):
+        return [item.to_row() for item in self.items.values()] + self.invalid_rows
+
+    def _persist(self, changed=(), removed=()):
+        """Makes changes durable: row updates, a journal append, or failing both a full save."""
+        if self.backend.supports_row_updates:
+            self.backend.apply_item_changes([item.to_row() for item in changed], removed)
+            return
+        if not self.journal:
+            self.save()
+            return
+        records = [["P"] + item.to_row() for item in changed] + [["D", str(code)] for code in removed]
+        self._append_journal(records)
+
+    def _record_movements(self, changes):
+        """Adds this terminal's (code, kind, delta, balance) stock changes to the ledger, if there is one."""
+        if self.ledger is not None:
+            self.ledger.record(changes)
+
+    def _write_snapshot(self, rows):
+        self.backend.save_items(rows)
+
+    def _index(self, item):
+        self.items[item.code] = item
+        self._index_fields(item)
+        self._notify_put(item)
+
+    def _unindex(self, item):
+        del self.items[item.code]
+        self._unindex_fields(item)
+        if not self.loading:
+            for watcher in self.watchers:
+                watcher.delete(item.code)
+
+    def _notify_put(self, item):
+        """Tells the watchers an item was added or changed. Loads tell them once at the end."""
+        if not self.loading:
+            for watcher in self.watchers:
+                watcher.put(item)
+
+    def _notify_reset(self):
+        """Tells the watchers every item may have changed (after a load or a bulk add)."""
+        for watcher in self.watchers:
+            watcher.reset()
+
+    def _index_fields(self, item, name=True, price=True):
+        """Adds the item to the secondary indexes for the given fields."""
+        if name:
+            self.name_index.setdefault(item.name.lower(), set()).add(item.code)
+            if not self.loading:
+                self.name_search.add(item.code, item.name)
+        if price and not self.loading:
+            insort(self.price_index, (item.cents, item.code))
+
+    def _unindex_fields(self, item, name=True, price=True):
+        """Removes the item from the secondary indexes for the given fields. Call before changing them."""
+        if name:
+            codes = self.name_index.get(item.name.lower())
+            if codes is not None:
+                codes.discard(item.code)
+                if not codes:
+                    del self.name_index[item.name.lower()]
+            if not self.loading:
+                self.name_search.remove(item.code)
+        if price and not self.loading:
+            position = bisect_left(self.price_index, (item.cents, item.code))
+            if position < len(self.price_index) and self.price_index[position] == (item.cents, item.code):
+                del self.price_index[position]
+
+    def __len__(self):
+        return len(self.items)
+
+    def __contains__(self, code):
+        return code in self.items
+
+    def __iter__(self):
+        return iter(self.items.values())
+
+    def get(self, code):
+        """Returns the item with the given code, or None."""
+        return self.items.get(code)
+
+    def find_by_name(self, name):
+        """Returns the items whose name matches exactly (case-insensitive)."""
+        return [self.items[code] for code in sorted(self.name_index.get(name.strip().lower(), ()))]
+
+    def prepare_search(self):
+        """Builds the substring/fuzzy name search index ahead of the first search that needs it."""
+        with self.lock:
+            self.name_search.prepare()
+
+    def search_by_name(self, query, mode="contains", limit=None):
+        """Finds items by name. mode is "prefix", "contains" or "fuzzy" (tolerates typos)."""
+        with self.lock:
+            if mode == "prefix":
+                codes = self.name_search.prefix(query, limit)
+            elif mode == "contains":
+                codes = self.name_search.substring(query, limit)
+            elif mode == "fuzzy":
+                codes = self.name_search.fuzzy(query, limit or 20)
+            else:
+                raise ValueError(f"Unknown name search mode '{mode}'.")
+            return [self.items[code] for code in codes]
+
+    def add(self, code, name, price, qty):
+        """Adds a new item. Raises KeyError if the code already exists, here or on another terminal."""
+        with self.shared_lock, self.lock:
+            self.sync()
+            if code in self.items:
+                raise KeyError(code)
+            item = Item(code, check_name(name), price, qty)
+            if self.backend.supports_row_updates and not self.backend.insert_item(item.to_row()):
+                self._refresh([code])
+                raise KeyError(code)
+            self._index(item)
+            if not self.backend.supports_row_updates:
+                self._persist(changed=[item])
+            self._record_movements([(code, ADD, item.qty, item.qty)])
+        return item
+
+    def add_many(self, items):
+        """Adds (code, name, price, qty) items in one batch write. Returns the codes skipped as duplicates.
+
+        Large batches rebuild the search indexes once instead of inserting item by item.
+        """
+        items = list(items)
+        with self.shared_lock, self.lock:
+            self.sync()
+            added = []
+            duplicates = []
+            for code, name, price, qty in items:
+                if code in self.items:
+                    duplicates.append(code)
+                    continue
+                added.append(Item(code, name, price, qty))
+            if self.backend.supports_row_updates:
+                taken = set(self.backend.insert_items([item.to_row() for item in added]))
+                if taken: # Added on another terminal since our last sync
+                    self._refresh(taken)
+                    duplicates.extend(taken)
+                    added = [item for item in added if item.code not in taken]
+            rebuild = len(added) > len(self.items) // 10
+            self.loading = rebuild
+            try:
+                for item in added:
+                    self._index(item)
+            finally:
+                self.loading = False
+            if rebuild:
+                self.price_index = sorted((item.cents, item.code) for item in self.items.values())
+                self.name_search.build((item.code, item.name) for item in self.items.values())
+                self._notify_reset()
+            if added and not self.backend.supports_row_updates:
+                if self.journal:
+                    self.compact() # One snapshot write instead of a journal record per item
+                else:
+                    self.save()
+            self._record_movements([(item.code, ADD, item.qty, item.qty) for item in added])
+        return duplicates
+
+    def remove(self, code):
+        """Removes and returns the item with the given code, or None if it doesn't exist."""
+        with self.shared_lock, self.lock:
+            self.sync()
+            item = self.items.get(code)
+            if item is None:
+                return None
+            self._unindex(item)
+            self._persist(removed=[code])
+            self._record_movements([(code, REMOVE, -item.qty, 0)])
+        return item
+
+    def remove_many(self, codes):
+        """Removes the items with the given codes in one write. Returns the items removed."""
+        with self.shared_lock, self.lock:
+            self.sync()
+            removed = [self.items[code] for code in dict.fromkeys(codes) if code in self.items]
+            for item in removed:
+                self._unindex(item)
+            if removed:
+                self._persist(removed=[item.code for item in removed])
+            self._record_movements([(item.code, REMOVE, -item.qty, 0) for item in removed])
+        return removed
+
+    def update(self, code, name=None, price=None, qty=None, expected_version=None):
+        """Updates the given fields of an existing item. Raises KeyError if it doesn't exist.
+
+        With expected_version, raises ConflictError instead if the item changed
+        since the caller read that version.
+        """
+        with self.shared_lock, self.lock:
+            self.sync()
+            item = self.items[code]
+            if expected_version is not None and item.version != expected_version:
+                raise ConflictError(f"{item.name} was changed on another terminal. Check its details and try again.")
+            new_name = item.name if name is None else check_name(name)
+            new_cents = item.cents if price is None else to_cents(price)
+            new_qty = item.qty if qty is None else qty
+            if self.backend.supports_row_updates:
+                new_row = Item(code, new_name, new_cents / 100, new_qty).to_row()
+                if not self.backend.replace_item(item.to_row(), new_row):
+                    self._refresh([code])
+                    raise ConflictError(f"{item.name} was changed on another terminal. Check its details and try again.")
+            # Only re-index the fields that actually change
+            name_changed = new_name != item.name
+            price_changed = new_cents != item.cents
+            self._unindex_fields(item, name_changed, price_changed)
+            old_qty = item.qty
+            item.name, item.cents, item.qty = new_name, new_cents, new_qty
+            item.version += 1
+            self._index_fields(item, name_changed, price_changed)
+            self._notify_put(item)
+            if not self.backend.supports_row_updates:
+                self._persist(changed=[item])
+            if new_qty != old_qty:
+                self._record_movements([(code, ADJUST, new_qty - old_qty, new_qty)])
+        return item
+
+    def decrement_stock(self, quantities):
+        """Takes {code: qty} out of stock in a single write, all lines or none.
+
+        Only the lines asked for are checked, against the latest stock of every
+        terminal. Raises StockError listing the lines that are short.
+        """
+        with self.shared_lock, self.lock:
+            self.sync()
+            shortages = [(code, qty, self.items[code].qty if code in self.items else 0)
+                         for code, qty in quantities.items()
+                         if code not in self.items or qty > self.items[code].qty]
+            if not shortages and self.backend.supports_row_updates:
+                short = self.backend.decrement_stock(quantities)
+                if short: # Another terminal sold them after our last sync
+                    self._refresh(short)
+                    shortages = [(code, quantities[code], self.items[code].qty if code in self.items else 0)
+                                 for code in short]
+            if shortages:
+                raise StockError(shortages, {code: self.items[code].name for code in quantities if code in self.items})
+            for code, qty in quantities.items():
+                self.items[code].qty -= qty
+                self.items[code].version += 1
+                self._notify_put(self.items[code])
+            if not self.backend.supports_row_updates:
+                self._persist(changed=[self.items[code] for code in quantities])
+            self._record_movements([(code, SALE, -qty, self.items[code].qty) for code, qty in quantities.items()])
+
+    def restock(self, quantities):
+        """Puts {code: qty} back into stock in a single write, e.g. the lines of a voided bill.
+
+        Recorded as negative sales. Raises StockError if any of the items is gone.
+        """
+        self.decrement_stock({code: -qty for code, qty in quantities.items()})
+
+    def search_by_price(self, start_price, end_price, min_qty=None, max_qty=None):
+        """Returns the items priced within [start_price, end_price], cheapest first.
+
+        Uses the sorted price index, so the cost is O(log n + k) for k matches.
+        min_qty and max_qty optionally restrict the stock level as well.
+        """
+        with self.lock:
+            return list(self.iter_price_range(start_price, end_price, min_qty, max_qty))
+
+    def iter_price_range(self, start_price, end_price, min_qty=None, max_qty=None, descending=False):
+        """Lazily yields the items priced within [start_price, end_price] in price order.
+
+        The index is read PRICE_CHUNK keys at a time under the lock, each chunk
+        resuming past the last key taken, so writes made between chunks can't
+        shift the listing into repeating or skipping items.
+        """
+        low = (cents_bound(start_price, upper=False), float("-inf"))
+        high = (cents_bound(end_price, upper=True), float("inf"))
+        last = None
+        while True:
+            with self.lock:
+                index = self.price_index
+                if descending:
+                    end = bisect_left(index, last) if last else bisect_right(index, high)
+                    keys = index[max(end - PRICE_CHUNK, bisect_left(index, low)):end][::-1]
+                else:
+                    start = bisect_right(index, last) if last else bisect_left(index, low)
+                    keys = index[start:min(start + PRICE_CHUNK, bisect_right(index, high))]
+            if not keys:
+                return
+            last = keys[-1]
+            for cents, code in keys:
+                item = self.items.get(code)
+                if item is None or item.cents != cents:
+                    continue # Removed or repriced since; a new price is listed at its own place
+                if min_qty is not None and item.qty < min_qty:
+                    continue
+                if max_qty is not None and item.qty > max_qty:
+                    continue
+                yield item
+
+    def iter_items(self, sort_by=None, descending=False):
+        """Lazily yields all items, in file order or sorted by "code", "name", "price" or "qty".
+
+        Price and name order come straight from their indexes, so the first
+        items are available without sorting the whole catalog.
+        """
+        if sort_by == "price":
+            yield from self.iter_price_range(float("-inf"), float("inf"), descending=descending)
+            return
+        with self.lock: # Snapshot the order so writers on other threads can't disturb it
+            if sort_by == "name":
+                # Just the codes, copied: the sorted names list changes in place with every write
+                codes = [code for _, code in self.name_search.sorted_names]
+            elif sort_by == "code":
+                codes = sorted(self.items)
+            elif sort_by == "qty":
+                codes = sorted(self.items, key=lambda code: self.items[code].qty)
+            elif sort_by is None:
+                codes = list(self.items)
+            else:
+                raise ValueError(f"Unknown sort column '{sort_by}'.")
+        if descending:
+            codes.reverse()
+        for code in codes:
+            item = self.items.get(code)
+            if item is not None: # Skip items removed while we were iterating
+                yield item
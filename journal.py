@@ -0,0 +1,252 @@
+import os
+import threading
+
+try:
+    import fcntl
+except ImportError: # Windows
+    fcntl = None
+    import msvcrt
+
+from instrumentation import METRICS
+
+
+class FileLock:
+    """Advisory lock on a file, shared by every terminal that uses the same data files.
+
+    Re-entrant within a process: nested acquisitions by the owning thread only
+    count, and other threads of the same process wait on a normal lock first.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.thread_lock = threading.RLock()
+        self.depth = 0
+        self.file = None
+
+    def __enter__(self):
+        self.thread_lock.acquire()
+        if self.depth == 0:
+            try:
+                self.file = open(self.path, "a+b")
+                if fcntl is not None:
+                    fcntl.flock(self.file.fileno(), fcntl.LOCK_EX)
+                else:
+                    self.file.seek(0)
+                    while True:
+                        try:
+                            msvcrt.locking(self.file.fileno(), msvcrt.LK_LOCK, 1)
+                            break
+                        except OSError:
+                            continue # LK_LOCK gives up after 10 seconds, keep waiting
+            except BaseException:
+                if self.file is not None:
+                    self.file.close()
+                    self.file = None
+                self.thread_lock.release()
+                raise
+        self.depth += 1
+        return self
+
+    def __exit__(self, *exc_info):
+        self.depth -= 1
+        if self.depth == 0:
+            if fcntl is not None:
+                fcntl.flock(self.file.fileno(), fcntl.LOCK_UN)
+            else:
+                self.file.seek(0)
+                msvcrt.locking(self.file.fileno(), msvcrt.LK_UNLCK, 1)
+            self.file.close()
+            self.file = None
+        self.thread_lock.release()
+        return False
+
+
+class Journal:
+    """Append-only log of changes that is replayed on top of a snapshot file.
+
+    Each line is either "P#field#field..." (the record now has these values) or
+    "D#key" (the record was removed). Records hold absolute values, so replaying
+    a record that is already part of the snapshot is harmless. put_fields is the
+    number of fields in a P record; the last one may itself contain '#'.
+
+    Several terminals may append to the same journal while holding its FileLock.
+    The journal remembers how far it has read the active file, so read_new()
+    returns only what the other terminals appended since.
+    """
+
+    def __init__(self, path, put_fields):
+        self.path = path
+        self.old_path = path + ".old" # journal being folded into the snapshot by a compaction
+        self.put_fields = put_fields
+        self.file = None
+        self.identity = None # (device, inode) of the active journal when it was last read
+        self.offset = 0 # bytes of the active journal read so far
+
+    def _identity(self):
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return stat.st_dev, stat.st_ino
+
+    def _read(self, path, offset=0):
+        """Yields (op, fields) for the complete records in path from a byte offset on."""
+        read_bytes = records = 0
+        try:
+            with open(path, "rb") as f:
+                f.seek(offset)
+                for raw in f:
+                    if not raw.endswith(b"\n"):
+                        break # Torn write from a crash, or another terminal still writing
+                    if path == self.path:
+                        self.offset += len(raw)
+                    read_bytes += len(raw)
+                    records += 1
+                    op, _, rest = raw.decode("utf-8", "replace").rstrip("\r\n").partition("#")
+                    if op == "P":
+                        fields = rest.split("#", self.put_fields - 1)
+                        if len(fields) == self.put_fields:
+                            yield "P", fields
+                    elif op == "D":
+                        yield "D", [rest]
+        finally:
+            METRICS.add("journal.bytes_read", read_bytes)
+            METRICS.add("journal.records_read", records)
+
+    def replay(self):
+        """Yields (op, fields) for every complete record, oldest first."""
+        self.close() # The file we were appending to may have been rotated by another terminal
+        self.identity = self._identity()
+        self.offset = 0
+        for path in (self.old_path, self.path):
+            if os.path.exists(path):
+                yield from self._read(path)
+
+    def read_new(self):
+        """Returns the records appended by other terminals since the last replay() or read_new().
+
+        Returns None if the journal was rotated or recreated meanwhile; the
+        caller must then reload the snapshot and replay().
+        """
+        identity = self._identity()
+        if identity != self.identity:
+            return None
+        if identity is None:
+            return []
+        return list(self._read(self.path, self.offset))
+
+    def append(self, records):
+        """Appends records and fsyncs so they survive a crash."""
+        if self.file is None:
+            self._drop_torn_tail()
+            self.file = open(self.path, "ab")
+            if self.identity is None: # We just created it
+                self.identity = self._identity()
+                self.offset = 0
+        data = "".join("#".join(record) + "\n" for record in records).encode("utf-8")
+        self.file.write(data)
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.offset = self.file.tell() # Appends happen under the FileLock, so everything up to here has been read
+        METRICS.add("journal.bytes_written", len(data))
+
+    def _drop_torn_tail(self):
+        """Cuts off a half-written last record so new records start on a fresh line."""
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, "rb+") as f:
+            data = f.read()
+            if data and not data.endswith(b"\n"):
+                f.truncate(data.rfind(b"\n") + 1)
+                self.offset = min(self.offset, data.rfind(b"\n") + 1)
+
+    def size(self):
+        """Size of the active journal in bytes."""
+        if self.file is not None:
+            return self.file.tell()
+        return os.path.getsize(self.path) if os.path.exists(self.path) else 0
+
+    def rotate(self):
+        """Moves the active journal aside so a compaction can fold it into the snapshot."""
+        self.close()
+        self.identity = None
+        self.offset = 0
+        if not os.path.exists(self.path):
+            return
+        if not os.path.exists(self.old_path):
+            os.replace(self.path, self.old_path)
+            return
+        # A previous compaction never finished, keep its records ahead of ours
+        with open(self.path, "rb") as src, open(self.old_path, "ab") as dst:
+            dst.write(src.read())
+            dst.flush()
+            os.fsync(dst.fileno())
+        os.remove(self.path)
+
+    def discard_old(self):
+        """Deletes the rotated journal once the snapshot containing it is on disk."""
+        if os.path.exists(self.old_path):
+            os.remove(self.old_path)
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+
+class JournaledStore:
+    """Shared journal handling for the in-memory stores.
+
+    Subclasses set self.journal, self.lock, self.shared_lock, self.compact_threshold
+    and self.compaction, and implement load(), _apply_record(op, fields),
+    _snapshot_rows() and _write_snapshot(rows). Changes are made holding
+    self.shared_lock (the FileLock every terminal shares) and then self.lock,
+    always in that order.
+    """
+
+    def sync(self):
+        """Applies the changes other terminals appended to the journal since we last looked."""
+        if not self.journal:
+            return
+        with self.shared_lock, self.lock:
+            records = self.journal.read_new()
+            if records is None:
+                self.load() # Another terminal compacted the journal into a new snapshot
+                return
+            for op, fields in records:
+                self._apply_record(op, fields)
+
+    def _append_journal(self, records):
+        """Appends records to the journal, starting a background compaction once it is big enough."""
+        self.journal.append(records)
+        if self.journal.size() >= self.compact_threshold and self.compaction is None:
+            self.compaction = threading.Thread(target=self.compact, daemon=True)
+            self.compaction.start()
+
+    def compact(self):
+        """Folds the journal into a fresh snapshot.
+
+        Other terminals are kept out until the snapshot is on disk, so none of
+        them can read the old snapshot after its journal is gone.
+        """
+        try:
+            with self.shared_lock:
+                with self.lock:
+                    self.sync()
+                    self.journal.rotate()
+                    rows = self._snapshot_rows()
+                self._write_snapshot(rows)
+                self.journal.discard_old()
+        finally:
+            self.compaction = None
+
+    def close(self):
+        """Waits for a running compaction, then compacts whatever is left in the journal."""
+        if not self.journal:
+            return
+        compaction = self.compaction
+        if compaction is not None:
+            compaction.join()
+        if self.journal.size() or os.path.exists(self.journal.old_path):
+            self.compact()
+        self.journal.close()
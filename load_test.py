@@ -0,0 +1,115 @@
+"""Load test: simulated tills billing against a localhost inventory server.
+
+Run: python load_test.py [tills] [bills per till] [items]
+"""
+import asyncio
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+from benchmark import generate_rows
+from bill_store import BillStore
+from customer_registry import CustomerRegistry
+from inventory_client import InventoryClient
+from inventory_server import InventoryServer
+from inventory_store import InventoryStore, StockError
+from stock_ledger import StockLedger
+from storage import FlatFileBackend
+
+
+def start_server(directory, rows):
+    """Starts an InventoryServer on a free localhost port in a background thread. Returns (server, address)."""
+    backend = FlatFileBackend(os.path.join(directory, "DATA.txt"), os.path.join(directory, "customerData.txt"),
+                              os.path.join(directory, "bills.jsonl"), os.path.join(directory, "stock_movements.jsonl"))
+    backend.save_items(rows)
+    store = InventoryStore(journal_path=os.path.join(directory, "DATA.journal"), backend=backend,
+                           ledger=StockLedger(backend).load()).load()
+    customers = CustomerRegistry(os.path.join(directory, "customerData.journal"), backend=backend).load()
+    server = InventoryServer(store, BillStore(backend).load(), customers)
+    started = threading.Event()
+    state = {}
+
+    def run():
+        async def serve():
+            await server.start(("127.0.0.1", 0))
+            state["address"] = server.server.sockets[0].getsockname()[:2]
+            started.set()
+            await server.server.serve_forever()
+        asyncio.run(serve())
+
+    threading.Thread(target=run, daemon=True).start()
+    started.wait()
+    return server, state["address"]
+
+
+def till(address, till_number, bills, item_count, results):
+    """One cashier: looks up a few items, then commits a bill with them, bills times."""
+    rng = random.Random(till_number)
+    client = InventoryClient(address, pool_size=1)
+    latencies = []
+    sold = {}
+    short = 0
+    for _ in range(bills):
+        codes = rng.sample(range(1, item_count + 1), 3)
+        start = time.perf_counter()
+        items = client.call_many([("get", {"code": code}) for code in codes]) # Scans, pipelined
+        lines = [(code, name, price, 1) for code, name, price, _, _ in items]
+        try:
+            client.call("commit_bill", customer=f"Till {till_number}", lines=lines)
+            for code in codes:
+                sold[code] = sold.get(code, 0) + 1
+        except StockError:
+            short += 1
+        latencies.append(time.perf_counter() - start)
+    client.close()
+    results.put((latencies, sold, short))
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def main():
+    tills = int(sys.argv[1]) if len(sys.argv) > 1 else 8
+    bills = int(sys.argv[2]) if len(sys.argv) > 2 else 500
+    item_count = int(sys.argv[3]) if len(sys.argv) > 3 else 200
+    rows = generate_rows(item_count)
+    with tempfile.TemporaryDirectory() as directory:
+        server, address = start_server(directory, rows)
+        results = multiprocessing.Queue()
+        processes = [multiprocessing.Process(target=till, args=(address, number, bills, item_count, results))
+                     for number in range(tills)]
+        start = time.perf_counter()
+        for process in processes:
+            process.start()
+        outcomes = [results.get() for _ in processes]
+        elapsed = time.perf_counter() - start
+        for process in processes:
+            process.join()
+
+        latencies = [latency for outcome in outcomes for latency in outcome[0]]
+        short = sum(outcome[2] for outcome in outcomes)
+        sold = {}
+        for outcome in outcomes:
+            for code, qty in outcome[1].items():
+                sold[code] = sold.get(code, 0) + qty
+        # Every committed sale must show up in the stock: nothing lost, nothing doubled
+        lost = [code for code, _, _, qty in rows
+                if server.store.get(int(code)).qty != int(qty) - sold.get(int(code), 0)]
+        print(f"{tills} tills x {bills} bills over {item_count} items: {len(latencies) / elapsed:,.0f} bills/s, "
+              f"p50={percentile(latencies, 0.5) * 1000:.2f} ms  p95={percentile(latencies, 0.95) * 1000:.2f} ms  "
+              f"p99={percentile(latencies, 0.99) * 1000:.2f} ms")
+        print(f"{short} bills refused for lack of stock, {len(server.bills)} bills recorded, "
+              f"{server.requests / max(server.batches, 1):.1f} requests per batch, "
+              f"stock {'consistent' if not lost else f'WRONG for {len(lost)} items'}")
+        server.store.close()
+        server.customers.close()
+    return 1 if lost else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,120 @@
+"""Memory-mapped, lazily decoded view of a DATA.txt file.
+
+Opening one maps the file and makes a single pass over it to find where every
+line starts; nothing else is read or decoded until a row is asked for. That
+offset index is the only thing kept in memory (4 bytes a line for files under
+4 GB, 8 above), so a catalog of several gigabytes opens in seconds and the
+rest of the file stays in the OS page cache. Rows decode the way
+FlatFileBackend.load_items reads them: stripped, split on "#", with legacy
+3-field rows padded with a quantity of '0'. InventoryStore.load still turns
+every row into an Item; the map only spares it the list of rows.
+"""
+import locale
+import mmap
+import os
+
+import numpy as np
+
+from instrumentation import METRICS
+
+INDEX_CHUNK_BYTES = 64 * 2 ** 20 # bytes scanned for line ends at a time while indexing
+ITER_ROWS = 65536 # lines decoded at a time when iterating
+
+ENCODING = locale.getpreferredencoding(False) # what open(path, "r") reads DATA.txt with
+NEWLINE = ord("\n")
+
+
+def decode_row(data):
+    """Decodes one line to a [code, name, price, qty] row of strings, or None if it isn't one."""
+    fields = data.decode(ENCODING).strip().split("#")
+    if len(fields) == 4:
+        return fields
+    if len(fields) == 3:
+        return fields + ["0"] # Old format without quantity
+    return None
+
+
+class MappedItemFile:
+    """The rows of a DATA.txt file, read through a memory map and decoded on access.
+
+    Indexing gives the row of a line (None for lines that aren't valid rows);
+    iterating yields the valid rows in file order, like load_items. Close it,
+    or let it go, before the file is replaced: Windows can't replace a mapped
+    file.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            self.size = os.fstat(f.fileno()).st_size
+            # An empty file can't be mapped, and has nothing to index
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if self.size else None
+        with METRICS.timer("storage.map_items"):
+            self.offsets = self._index()
+        self.lines = None # line number of each non-empty line, if the file has empty ones
+        lengths = np.diff(self.offsets)
+        if len(lengths) and lengths.min() == 1:
+            self.lines = np.flatnonzero(lengths > 1)
+        METRICS.add("file.bytes_read", self.size)
+
+    def _index(self):
+        """Finds the start of every line in one pass. Returns them with the end of the file (plus one) last."""
+        dtype = np.uint32 if self.size < 2 ** 32 - 1 else np.int64
+        starts = [np.zeros(1, dtype)]
+        for offset in range(0, self.size, INDEX_CHUNK_BYTES):
+            # A view of the mapped pages, not a copy; only the newline positions are kept
+            chunk = np.frombuffer(self.map, np.uint8, min(INDEX_CHUNK_BYTES, self.size - offset), offset)
+            starts.append((np.flatnonzero(chunk == NEWLINE) + (offset + 1)).astype(dtype))
+            del chunk # The map can't be closed while a view of it is alive
+        if self.size and self.map[self.size - 1] != NEWLINE:
+            starts.append(np.array([self.size + 1], dtype)) # Last line without a newline
+        return np.concatenate(starts)
+
+    def __len__(self):
+        """The number of non-empty lines."""
+        return len(self.offsets) - 1 if self.lines is None else len(self.lines)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("row index out of range")
+        line = index if self.lines is None else int(self.lines[index])
+        return decode_row(self.map[int(self.offsets[line]):int(self.offsets[line + 1]) - 1])
+
+    def __iter__(self):
+        """Yields the valid rows, decoding ITER_ROWS lines at a time."""
+        count = len(self.offsets) - 1
+        rows = 0
+        for first in range(0, count, ITER_ROWS):
+            last = min(first + ITER_ROWS, count)
+            block = self.map[int(self.offsets[first]):int(self.offsets[last]) - 1].decode(ENCODING)
+            for line in block.split("\n"):
+                line = line.strip()
+                if line:
+                    fields = line.split("#")
+                    if len(fields) == 4:
+                        rows += 1
+                        yield fields
+                    elif len(fields) == 3:
+                        rows += 1
+                        yield fields + ["0"]
+        METRICS.add("file.rows_parsed", rows)
+
+    @property
+    def index_bytes(self):
+        """Memory held by the offset index."""
+        return self.offsets.nbytes + (0 if self.lines is None else self.lines.nbytes)
+
+    def close(self):
+        if self.map is not None:
+            self.map.close()
+            self.map = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -1,61 +1,298 @@
 import customtkinter as ctk
-from tkinter import messagebox, simpledialog
+from tkinter import filedialog, messagebox, ttk
+from itertools import islice
 import os
-from datetime import datetime
-from PIL import Image, ImageTk # Keep this if you plan to add images later, otherwise it can be removed
-import threading # Keep this if you plan to use threading later, otherwise it can be removed
+import time
+from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
 
 # Set appearance mode and color theme
 ctk.set_appearance_mode("dark")  # Modes: "System" (standard), "Dark", "Light"
 ctk.set_default_color_theme("blue")  # Themes: "blue" (standard), "green", "dark-blue"
 
-# --- File Paths ---
-ITEMS_FILE = "DATA.txt"
-CUSTOMERS_FILE = "customerData.txt"
-
-# --- Helper Functions for Data Handling ---
-def load_items():
-    """Loads items from DATA.txt. Format: code#name#price#quantity"""
-    if not os.path.exists(ITEMS_FILE):
-        return []
-    items = []
-    with open(ITEMS_FILE, "r") as f:
-        for line in f:
-            line = line.strip()
-            if line:
-                data = line.split("#")
-                if len(data) == 4:
-                    items.append(data)
-                elif len(data) == 3:
-                    # Old format without quantity, add a default quantity '0'
-                    items.append(data + ['0'])
-    return items
-
-def save_items(items):
-    """Saves items back to DATA.txt."""
-    with open(ITEMS_FILE, "w") as f:
-        for item in items:
-            f.write("#".join(map(str, item)) + "\n")
-
-def load_customers():
-    """Loads customer data from customerData.txt. Format: Name ---- reg on: Date"""
-    if not os.path.exists(CUSTOMERS_FILE):
-        return []
-    customers = []
-    with open(CUSTOMERS_FILE, "r") as f:
-        for line in f:
-            line = line.strip()
-            if line:
-                customers.append(line)
-    return customers
-
-def save_customers(customers):
-    """Saves customer data back to customerData.txt."""
-    with open(CUSTOMERS_FILE, "w") as f:
-        for customer_line in customers:
-            f.write(customer_line + "\n")
+# --- Data Handling ---
+from inventory_store import JOURNAL_FILE, InventoryStore, StockError, cents_bound, sort_items, validate_item
+from storage import format_price
+from bill_store import BillStore, line_total
+from bulk_io import export_items
+from customer_registry import CUSTOMER_JOURNAL_FILE, CustomerRegistry
+from stock_ledger import StockLedger
+from instrumentation import METRICS, ProfileCapture, export_metrics, instrument
+from query_cache import FETCH_SIZE, QueryCache, ResultPages
+from receipts import bills_between, export_receipts, parse_days, render_receipt
+from undo_log import UNDO_IMPORT_LIMIT, UndoLog
+from inventory_client import (
+    SERVER_ADDRESS, InventoryClient, RemoteAnalytics, RemoteBillStore, RemoteCustomerRegistry, RemoteForecast,
+    RemoteLedger, RemoteStore
+)
+# NumPy (analytics.py) is only imported on the loading worker, after the window is up
+
+def configure_table_style(master):
+    """Sets up the "Inventory.Treeview" style so ttk tables match the dark CustomTkinter theme."""
+    style = ttk.Style(master)
+    style.theme_use("default")
+    style.configure("Inventory.Treeview", background="#2b2b2b", fieldbackground="#2b2b2b",
+                    foreground="white", rowheight=24, borderwidth=0)
+    style.configure("Inventory.Treeview.Heading", background="#1f538d", foreground="white", relief="flat")
+    style.map("Inventory.Treeview", background=[("selected", "#2e6db0")])
+
+
+class VirtualTable(ctk.CTkFrame):
+    """Item table that only renders the visible rows and pulls more from a generator as the user scrolls.
+
+    show() takes a source callable (sort_by, descending) -> iterator of items. Rows
+    are fetched in chunks only when scrolling or paging needs them, so the first
+    page appears immediately however many items match. Queries shown with a
+    cache key keep their rendered rows in the QueryCache, so showing them again
+    reuses them until the items behind them change. Given background (a
+    run_in_background), sources are started and read on the worker pool
+    instead: in client mode each chunk is a request to the server, and locally
+    reading waits for the store's lock, which writers hold while they fsync.
+    """
+
+    COLUMNS = [("code", "Code", 80), ("name", "Name", 240), ("price", "Price", 100), ("qty", "Qty", 80)]
+    FETCH_SIZE = FETCH_SIZE # Items pulled from the source at a time
+
+    def __init__(self, parent, visible_rows=15, cache=None, background=None, **kwargs):
+        super().__init__(parent, **kwargs)
+        self.visible_rows = visible_rows
+        self.cache = cache
+        self.background = background
+        self.loading = False # A background fetch is running
+        self.next_start = None # Source to restart from once it finishes
+        self.next_offset = None # Offset to show once it finishes
+        self.source = None
+        self.cache_key = None
+        self.matches = None
+        self.pages = None # ResultPages of the query shown
+        self.offset = 0 # Index of the first visible row
+        self.sort_by = None
+        self.descending = False
+        self.empty_message = ""
+
+        self.grid_columnconfigure(0, weight=1)
+        self.grid_rowconfigure(0, weight=1)
+
+        configure_table_style(self)
+        self.tree = ttk.Treeview(
+            self, columns=[key for key, _, _ in self.COLUMNS], show="headings",
+            height=visible_rows, selectmode="browse", style="Inventory.Treeview"
+        )
+        for key, title, width in self.COLUMNS:
+            self.tree.heading(key, text=title, command=lambda key=key: self.sort(key))
+            self.tree.column(key, width=width, anchor="w" if key == "name" else "e")
+        self.tree.grid(row=0, column=0, sticky="nsew")
+
+        self.scrollbar = ctk.CTkScrollbar(self, command=self.on_scrollbar)
+        self.scrollbar.grid(row=0, column=1, sticky="ns")
+
+        # Scroll by our own offset; the tree only ever holds the visible rows
+        self.tree.bind("<MouseWheel>", lambda event: self.scroll_to(self.offset - (event.delta // 120) * 3))
+        self.tree.bind("<Button-4>", lambda event: self.scroll_to(self.offset - 3)) # Linux wheel up
+        self.tree.bind("<Button-5>", lambda event: self.scroll_to(self.offset + 3)) # Linux wheel down
+
+        nav_frame = ctk.CTkFrame(self, fg_color="transparent")
+        nav_frame.grid(row=1, column=0, columnspan=2, sticky="ew", pady=(5, 0))
+        nav_frame.grid_columnconfigure(1, weight=1)
+        ctk.CTkButton(nav_frame, text="◀ Prev", width=80,
+                      command=lambda: self.scroll_to(self.offset - self.visible_rows)).grid(row=0, column=0)
+        self.position_label = ctk.CTkLabel(nav_frame, text="", font=ctk.CTkFont(size=12))
+        self.position_label.grid(row=0, column=1)
+        ctk.CTkButton(nav_frame, text="Next ▶", width=80,
+                      command=lambda: self.scroll_to(self.offset + self.visible_rows)).grid(row=0, column=2)
+
+    def show(self, source, empty_message="No items found.", cache_key=None, matches=None):
+        """Displays the items produced by source(sort_by, descending).
+
+        With a cache key, matches(item) must say whether an item belongs to the
+        query, so changes to it can drop the cached rows.
+        """
+        self.source = source
+        self.empty_message = empty_message
+        self.cache_key = cache_key if self.cache is not None else None
+        self.matches = matches
+        self.reload()
+
+    def clear(self, message=""):
+        """Empties the table and shows message in the position label."""
+        self.source = None
+        self.pages = None
+        self.next_start = self.next_offset = None
+        self.offset = 0
+        self.tree.delete(*self.tree.get_children())
+        self.scrollbar.set(0, 1)
+        self.position_label.configure(text=message)
+
+    def reload(self):
+        """Restarts the source with the current sort order."""
+        if self.source is None:
+            return
+        source, sort_by, descending, key, matches = self.source, self.sort_by, self.descending, self.cache_key, self.matches
+        
+        def start():
+            if key is None:
+                return ResultPages(None, iter(source(sort_by, descending)))
+            return self.cache.open(key + (sort_by, descending), lambda: source(sort_by, descending), matches)
+        
+        if self.background is not None:
+            self.fetch_in_background(0, start)
+            return
+        self.pages = start()
+        self.offset = 0
+        self.scroll_to(0)
+
+    def sort(self, key):
+        """Sorts by the clicked column; clicking the same column again reverses the order."""
+        self.descending = not self.descending if self.sort_by == key else False
+        self.sort_by = key
+        for column, title, _ in self.COLUMNS:
+            arrow = (" ▼" if self.descending else " ▲") if column == key else ""
+            self.tree.heading(column, text=title + arrow)
+        self.reload()
+
+    def fetch_until(self, pages, count):
+        """Renders items from the source of pages until count rows are buffered or it runs out."""
+        if pages is None:
+            return
+        if pages.key is None:
+            pages.fetch_until(count)
+        else:
+            self.cache.fetch(pages, count)
+
+    def known_total(self):
+        """Row count used for the scrollbar; grows while the source still has rows."""
+        rows = len(self.pages.rows) if self.pages else 0
+        return rows if self.pages is None or self.pages.exhausted else rows + self.FETCH_SIZE
+
+    def on_scrollbar(self, action, amount, unit=None):
+        if action == "moveto":
+            self.scroll_to(int(float(amount) * self.known_total()))
+        elif action == "scroll":
+            step = self.visible_rows if unit == "pages" else 1
+            self.scroll_to(self.offset + int(amount) * step)
+
+    def fetch_in_background(self, offset, start=None):
+        """Reads the rows up to offset on a worker, then renders them; start() makes new pages first.
+
+        One fetch runs at a time, so the iterator is never read from two
+        threads; whatever was asked for meanwhile runs when it finishes, a
+        restart taking precedence over scrolling the old pages.
+        """
+        if start is not None:
+            self.next_start = start
+        self.next_offset = offset
+        if self.loading:
+            return
+        start, offset, pages = self.next_start, self.next_offset, self.pages
+        self.next_start = self.next_offset = None
+        self.loading = True
+        count = max(offset, 0) + self.visible_rows
+        
+        def fetch():
+            fetched = start() if start is not None else pages
+            self.fetch_until(fetched, count)
+            return fetched
+        
+        def fetched(pages):
+            self.loading = False
+            if self.source is None or not self.winfo_exists(): # Cleared or closed meanwhile
+                return
+            self.pages = pages
+            if self.next_start is not None:
+                self.fetch_in_background(self.next_offset)
+            elif self.next_offset is not None:
+                scrolled_to, self.next_offset = self.next_offset, None
+                self.scroll_to(scrolled_to)
+            else:
+                self.render(offset)
+        
+        def failed(error):
+            self.loading = False
+            self.next_start = self.next_offset = None
+            if self.winfo_exists():
+                self.position_label.configure(text=f"❌ Could not load items: {error}")
+        
+        self.background(fetch, fetched, "Loading items...", failed)
+
+    def scroll_to(self, offset):
+        """Renders the visible window starting at offset."""
+        if self.background is not None:
+            if self.loading or (self.pages is not None and not self.pages.exhausted
+                                and len(self.pages.rows) < max(offset, 0) + self.visible_rows):
+                self.fetch_in_background(offset)
+                return
+        else:
+            self.fetch_until(self.pages, max(offset, 0) + self.visible_rows)
+        self.render(offset)
+
+    def render(self, offset):
+        """Shows the buffered rows starting at offset."""
+        rows = self.pages.rows if self.pages else []
+        self.offset = max(0, min(offset, len(rows) - self.visible_rows))
+
+        self.tree.delete(*self.tree.get_children())
+        for row in rows[self.offset:self.offset + self.visible_rows]:
+            self.tree.insert("", "end", values=row)
+
+        if not rows:
+            self.scrollbar.set(0, 1)
+            self.position_label.configure(text=self.empty_message)
+            return
+        total = self.known_total()
+        last = min(self.offset + self.visible_rows, len(rows))
+        self.scrollbar.set(self.offset / total, last / total)
+        more = "" if self.pages.exhausted else "+"
+        self.position_label.configure(text=f"Rows {self.offset + 1:,}–{last:,} of {len(rows):,}{more}")
+
+
+class ScanBuffer:
+    """Collects keystrokes from a keyboard-wedge barcode scanner and recognises complete scans.
+    
+    A scanner types the whole code within a few milliseconds and finishes with
+    Enter; a person types far slower. Keys that arrive more than max_gap seconds
+    apart start a new buffer, so only fast bursts of at least min_length
+    characters followed by Enter count as a scan.
+    """
+
+    def __init__(self, max_gap=0.05, min_length=1):
+        self.max_gap = max_gap
+        self.min_length = min_length
+        self.chars = []
+        self.last_time = None
+
+    def feed(self, char, timestamp):
+        """Adds one character typed at timestamp (seconds)."""
+        if self.last_time is not None and timestamp - self.last_time > self.max_gap:
+            self.chars = [] # Too slow to belong to the same scan
+        self.chars.append(char)
+        self.last_time = timestamp
+
+    def finish(self, timestamp):
+        """Handles Enter; returns the scanned code, or None if the buffer wasn't a scanner burst."""
+        code = "".join(self.chars)
+        in_burst = self.last_time is not None and timestamp - self.last_time <= self.max_gap
+        self.chars = []
+        self.last_time = None
+        if in_burst and len(code) >= self.min_length:
+            return code
+        return None
+
 
 class ModernInventoryApp:
+    SPINNER_FRAMES = "◐◓◑◒"
+    SYNC_INTERVAL_MS = 5000 # How often to pick up changes made on other terminals
+    METRICS_INTERVAL_MS = 2000 # How often the status bar figures refresh
+    
+    # Timed into METRICS as "ui.<name>", "store.<name>" and "storage.<name>"
+    UI_HANDLERS = ("add_item_gui", "remove_item_gui", "update_item_gui", "search_items_gui", "create_bill_gui",
+                   "remove_customer_gui", "sales_history_gui", "reports_gui", "import_items_gui", "export_items_gui",
+                   "undo_last", "redo_last")
+    STORE_METHODS = ("load", "sync", "get", "find_by_name", "search_by_name", "search_by_price",
+                     "add", "add_many", "update", "remove", "remove_many", "decrement_stock", "restock", "save",
+                     "compact")
+    STORAGE_METHODS = ("load_items", "save_items", "apply_item_changes", "load_customers", "save_customers",
+                       "load_bills", "append_bill", "load_movements", "append_movements")
+
     def __init__(self):
         self.root = ctk.CTk()
         self.root.geometry("1000x700")
@@ -66,8 +303,49 @@ class ModernInventoryApp:
         self.root.grid_columnconfigure(0, weight=1)
         self.root.grid_rowconfigure(0, weight=1)
         
+        # Storage I/O runs on worker threads; results come back to Tk through root.after
+        self.executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="storage")
+        self.busy_messages = [] # Messages of the background tasks still running
+        self.spinner_frame = 0
+        
+        if SERVER_ADDRESS:
+            # Client mode: an inventory_server.py process owns the data and every till shares it
+            client = InventoryClient(SERVER_ADDRESS)
+            self.store = RemoteStore(client)
+            self.bills = RemoteBillStore(client)
+            self.customers = RemoteCustomerRegistry(client)
+            self.ledger = RemoteLedger(client)
+            self.analytics = RemoteAnalytics(client)
+            self.forecast = RemoteForecast(client)
+            self.query_cache = None # Other tills change the server's items without telling us
+            self.remote = True # Every store call is a round trip, so dialogs make them on the worker pool
+        else:
+            # All item handlers work against this in-memory store. Changes are appended
+            # to the journal and folded back into DATA.txt in the background.
+            self.ledger = StockLedger() # Every sale, adjustment, addition and removal, with timestamps
+            self.store = InventoryStore(journal_path=JOURNAL_FILE, ledger=self.ledger)
+            self.bills = BillStore() # Structured bill records, indexed by customer and day
+            self.customers = CustomerRegistry(journal_path=CUSTOMER_JOURNAL_FILE) # One record per normalized name
+            self.analytics = None # NumPy columns for the stock reports, set up by load_stores
+            self.forecast = None # Rolling sales sums behind the reorder suggestions, likewise
+            self.query_cache = QueryCache(self.store) # Rendered listings and price searches, until their items change
+            self.remote = False
+            instrument(self.store.backend, self.STORAGE_METHODS, "storage.")
+        # Every change this till makes goes through the undo log, so it can be undone and redone
+        self.undo_log = UndoLog(self.store, self.bills, self.customers)
+        self.store_ready = False
+        
+        # Low-overhead timers on the hot paths, shown in the status bar and the diagnostics panel
+        instrument(self.store, self.STORE_METHODS, "store.")
+        instrument(self, self.UI_HANDLERS, "ui.") # Before setup_ui binds the buttons to them
+        self.profiler = ProfileCapture()
+        
         self.setup_ui()
         
+        # Load DATA.txt, the bills and the customers once, off the Tk thread, so the window stays responsive
+        self.load_started = time.perf_counter()
+        self.run_in_background(self.load_stores, self.on_store_loaded, "Loading inventory...")
+        
     def setup_ui(self):
         """Setup the main user interface"""
         # Main container frame
@@ -124,7 +402,9 @@ class ModernInventoryApp:
             ("🔍 Search Items", self.search_items_gui, 1, 0, "#388e3c"), # Green
             ("🧾 Create Bill", self.create_bill_gui, 1, 1, "#7b1fa2"), # Purple
             ("👤 Remove Customer", self.remove_customer_gui, 1, 2, "#c2185b"), # Pink/Red
-            ("🚪 Exit Application", self.exit_application, 2, 1, "#424242") # Dark Gray
+            ("📊 Sales History", self.sales_history_gui, 2, 0, "#00796b"), # Teal
+            ("🚪 Exit Application", self.exit_application, 2, 1, "#424242"), # Dark Gray
+            ("📈 Reports", self.reports_gui, 2, 2, "#5d4037") # Brown
         ]
         
         for text, command, row, col, color in buttons:
@@ -153,6 +433,40 @@ class ModernInventoryApp:
             font=ctk.CTkFont(size=12)
         )
         status_label.grid(row=0, column=0, padx=10, pady=10)
+        
+        # Live figures from the instrumentation, refreshed every METRICS_INTERVAL_MS
+        self.metrics_var = ctk.StringVar(value="")
+        metrics_label = ctk.CTkLabel(status_frame, textvariable=self.metrics_var, font=ctk.CTkFont(size=11),
+                                     text_color="gray70")
+        metrics_label.grid(row=0, column=1, padx=10, pady=10)
+        diagnostics_btn = ctk.CTkButton(status_frame, text="Diagnostics", command=self.diagnostics_gui, width=100,
+                                        height=28, fg_color="#424242", hover_color="#616161")
+        diagnostics_btn.grid(row=0, column=2, padx=10, pady=6)
+        ctk.CTkButton(status_frame, text="↶ Undo", command=self.undo_last, width=70, height=28,
+                      fg_color="#5d4037", hover_color="#795548").grid(row=0, column=3, padx=(0, 6), pady=6)
+        ctk.CTkButton(status_frame, text="↷ Redo", command=self.redo_last, width=70, height=28,
+                      fg_color="#5d4037", hover_color="#795548").grid(row=0, column=4, padx=(0, 10), pady=6)
+        self.root.bind("<Control-z>", lambda _: self.undo_last())
+        self.root.bind("<Control-y>", lambda _: self.redo_last())
+        self.root.after(self.METRICS_INTERVAL_MS, self.refresh_metrics)
+    
+    def undo_last(self):
+        """Undoes the latest change made on this till, in the background."""
+        if self.undo_log.undo_label is None:
+            self.update_status("Nothing to undo.")
+            return
+        self.run_in_background(self.undo_log.undo, lambda command: command and self.update_status(
+            f"↶ Undid the {command.label}."), "Undoing...",
+            lambda error: self.show_error_message("Undo", str(error)))
+    
+    def redo_last(self):
+        """Redoes the latest undone change, in the background."""
+        if self.undo_log.redo_label is None:
+            self.update_status("Nothing to redo.")
+            return
+        self.run_in_background(self.undo_log.redo, lambda command: command and self.update_status(
+            f"↷ Redid the {command.label}."), "Redoing...",
+            lambda error: self.show_error_message("Redo", str(error)))
     
     def lighten_color(self, color):
         """Helper function to create a slightly lighter version of a given hex color for hover effects."""
@@ -165,14 +479,122 @@ class ModernInventoryApp:
             "#388e3c": "#4caf50",
             "#7b1fa2": "#9c27b0",
             "#c2185b": "#e91e63",
-            "#424242": "#616161"
+            "#00796b": "#009688",
+            "#424242": "#616161",
+            "#5d4037": "#795548"
         }
         return color_map.get(color, color) # Return lighter color if mapped, else original
 
     def update_status(self, message):
         """Updates the status bar message and clears it after 3 seconds."""
         self.status_var.set(message)
-        self.root.after(3000, lambda: self.status_var.set("Ready")) # Clear after 3 seconds
+        self.root.after(3000, self.reset_status) # Clear after 3 seconds
+    
+    def reset_status(self):
+        """Puts the status bar back to "Ready", unless background work is still running."""
+        if not self.busy_messages:
+            self.status_var.set("Ready")
+    
+    def run_in_background(self, task, on_done=None, busy_message="Working...", on_error=None):
+        """Runs task() on the storage worker pool and calls on_done(result) back on the Tk thread.
+        
+        Tk widgets may only be touched from the main thread, so the future is
+        polled with root.after instead of calling back from the worker.
+        """
+        future = self.executor.submit(self.profiler.wrap(task))
+        self.busy_messages.append(busy_message)
+        if len(self.busy_messages) == 1:
+            self.spin()
+        
+        def check_done():
+            if not future.done():
+                self.root.after(50, check_done)
+                return
+            self.busy_messages.remove(busy_message)
+            self.reset_status()
+            error = future.exception()
+            with METRICS.timer("ui.callback"):
+                if error is not None:
+                    if on_error:
+                        on_error(error)
+                    else:
+                        self.show_error_message("Error", f"An unexpected error occurred: {error}")
+                elif on_done:
+                    on_done(future.result())
+        
+        self.root.after(50, check_done)
+        return future
+    
+    def spin(self):
+        """Animates the status bar while background tasks are running."""
+        if not self.busy_messages:
+            return
+        frame = self.SPINNER_FRAMES[self.spinner_frame % len(self.SPINNER_FRAMES)]
+        self.spinner_frame += 1
+        self.status_var.set(f"{frame} {self.busy_messages[-1]}")
+        self.root.after(120, self.spin)
+    
+    def load_stores(self):
+        """Runs on a worker: loads the stores and imports the heavier modules the window didn't need.
+
+        Returns the item and bill counts; in client mode even those are server requests.
+        """
+        self.ledger.load()
+        store, bills, _ = self.store.load(), self.bills.load(), self.customers.load()
+        counts = (len(store), len(bills))
+        self.undo_log.load()
+        if self.analytics is None:
+            from analytics import StockAnalytics
+            self.analytics = StockAnalytics(self.store)
+            from forecast import ReorderForecast
+            self.forecast = ReorderForecast(self.analytics, self.bills)
+        return counts
+    
+    def on_store_loaded(self, counts):
+        """Called on the Tk thread once DATA.txt, the bills and the customers are in memory."""
+        item_count, bill_count = counts
+        self.store_ready = True
+        self.update_status(f"✅ Loaded {item_count:,} items and {bill_count:,} bills "
+                           f"in {time.perf_counter() - self.load_started:.1f}s")
+        self.executor.submit(self.store.prepare_search) # Ready before the first name search
+        self.executor.submit(self.analytics.prepare) # And the report columns before the first report
+        self.executor.submit(self.forecast.prepare)
+        self.root.after(self.SYNC_INTERVAL_MS, self.sync_with_other_terminals)
+    
+    def sync_with_other_terminals(self):
+        """Pulls in the stock, customer and bill changes other terminals made, quietly and off the Tk thread."""
+        if not self.store_ready:
+            return
+        self.executor.submit(lambda: (self.store.sync(), self.customers.sync(), self.bills.sync()))
+        self.root.after(self.SYNC_INTERVAL_MS, self.sync_with_other_terminals)
+    
+    def refresh_metrics(self):
+        """Shows lookup latency, the slowest UI handler and the file traffic so far in the status bar."""
+        snapshot = METRICS.snapshot()
+        figures = []
+        lookup = snapshot["timers"].get("store.get")
+        if lookup:
+            figures.append(f"lookup p95 {lookup['p95_ms']:.3f} ms")
+        ui_times = [stats["max_ms"] for name, stats in snapshot["timers"].items() if name.startswith("ui.")]
+        if ui_times:
+            figures.append(f"UI max {max(ui_times):.0f} ms")
+        counters = snapshot["counters"]
+        lookups = counters.get("query_cache.hits", 0) + counters.get("query_cache.misses", 0)
+        if lookups:
+            figures.append(f"cache hits {counters.get('query_cache.hits', 0) / lookups:.0%}")
+        read = counters.get("file.bytes_read", 0) + counters.get("journal.bytes_read", 0)
+        written = counters.get("file.bytes_written", 0) + counters.get("journal.bytes_written", 0)
+        figures.append(f"read {read / 2 ** 20:.1f} MB, wrote {written / 2 ** 20:.1f} MB")
+        if self.profiler.active:
+            figures.append("● profiling")
+        self.metrics_var.set("  |  ".join(figures))
+        self.root.after(self.METRICS_INTERVAL_MS, self.refresh_metrics)
+    
+    def check_store_ready(self):
+        """Returns True if the store has loaded, otherwise tells the user to wait."""
+        if not self.store_ready:
+            self.show_error_message("Please Wait", "The inventory is still loading.")
+        return self.store_ready
     
     def show_success_message(self, title, message):
         """Displays a success message box and updates the status bar."""
@@ -186,8 +608,10 @@ class ModernInventoryApp:
 
     def add_item_gui(self):
         """Handles adding a new item through a custom dialog."""
+        if not self.check_store_ready():
+            return
         dialog = ctk.CTkToplevel(self.root)
-        dialog.geometry("400x500")
+        dialog.geometry("400x560")
         dialog.title("Add New Item")
         dialog.transient(self.root) # Make dialog dependent on root window
         dialog.grab_set() # Make dialog modal
@@ -230,30 +654,26 @@ class ModernInventoryApp:
         def submit_item():
             """Submits the new item data after validation."""
             try:
-                item_code = int(entries["item_code"].get())
-                item_name = entries["item_name"].get().strip()
-                item_price = float(entries["item_price"].get())
-                item_quantity = int(entries["quantity"].get())
+                item_code, item_name, item_price, item_quantity = validate_item(
+                    entries["item_code"].get(), entries["item_name"].get(),
+                    entries["item_price"].get(), entries["quantity"].get()
+                )
                 
-                if not item_name:
-                    raise ValueError("Item name cannot be empty.")
-                if item_code <= 0 or item_price < 0 or item_quantity < 0:
-                    raise ValueError("Code, price, and quantity must be non-negative.")
+                def item_added(_):
+                    self.show_success_message("Success", f"Item '{item_name}' (Code: {item_code}) added successfully.")
+                    dialog.destroy() # Close dialog on success
                 
-                items = load_items()
-                
-                # Check for existing item code
-                for item in items:
-                    if int(item[0]) == item_code:
+                def add_failed(error):
+                    if isinstance(error, KeyError): # The store refuses codes that exist, here or on another till
                         self.show_error_message("Error", f"Item Code {item_code} already exists.")
-                        return
+                    else:
+                        self.show_error_message("Error", f"An unexpected error occurred: {error}")
                 
-                # Add new item to list and save
-                items.append([str(item_code), item_name, str(item_price), str(item_quantity)])
-                save_items(items)
-                
-                self.show_success_message("Success", f"Item '{item_name}' (Code: {item_code}) added successfully.")
-                dialog.destroy() # Close dialog on success
+                # Add new item to the store (which saves it)
+                self.run_in_background(
+                    lambda: self.undo_log.add_item(item_code, item_name, item_price, item_quantity),
+                    item_added, "Saving item...", add_failed
+                )
                 
             except ValueError as e:
                 self.show_error_message("Input Error", f"Invalid input: {str(e)}")
@@ -281,9 +701,65 @@ class ModernInventoryApp:
         )
         # Use grid for button placement, sticky="ew" to expand horizontally
         submit_btn.grid(row=0, column=1, sticky="ew") 
+        
+        def import_from_file():
+            dialog.destroy()
+            self.import_items_gui()
+        
+        import_btn = ctk.CTkButton(
+            button_frame, text="Import from File...",
+            command=import_from_file,
+            fg_color="#00796b", hover_color="#009688"
+        )
+        import_btn.grid(row=1, column=0, columnspan=2, pady=(10, 0), sticky="ew")
+
+    def import_items_gui(self):
+        """Adds every item in a CSV or JSONL file, checked like the Add Item dialog, in one batch."""
+        if not self.check_store_ready():
+            return
+        path = filedialog.askopenfilename(
+            title="Import Items",
+            filetypes=[("Item files", "*.csv *.jsonl *.ndjson"), ("All files", "*.*")]
+        )
+        if not path:
+            return
+        
+        def items_imported(report):
+            self.executor.submit(self.store.prepare_search)
+            if report.imported:
+                summary = report.summary()
+                if not report.undoable:
+                    summary += f"\n\nImports of more than {UNDO_IMPORT_LIMIT:,} items can't be undone."
+                self.show_success_message("Import Complete", summary)
+            else:
+                self.show_error_message("Nothing Imported", report.summary())
+        
+        self.run_in_background(
+            lambda: self.undo_log.import_items(path), items_imported, f"Importing {os.path.basename(path)}...",
+            lambda error: self.show_error_message("Import Error", f"Could not import {os.path.basename(path)}: {error}")
+        )
+
+    def export_items_gui(self):
+        """Writes every item to a CSV or JSONL file."""
+        if not self.check_store_ready():
+            return
+        path = filedialog.asksaveasfilename(
+            title="Export Items", defaultextension=".csv",
+            filetypes=[("CSV", "*.csv"), ("JSON Lines", "*.jsonl")]
+        )
+        if not path:
+            return
+        self.run_in_background(
+            lambda: export_items(self.store, path),
+            lambda count: self.show_success_message("Export Complete", f"Exported {count:,} items to {path}."),
+            f"Exporting to {os.path.basename(path)}...",
+            lambda error: self.show_error_message("Export Error", f"Could not export items: {error}")
+        )
 
     def remove_item_gui(self):
         """Handles removing an item by its code."""
+        if not self.check_store_ready():
+            return
         dialog = ctk.CTkInputDialog(text="Enter item code to remove:", title="Remove Item")
         item_code_str = dialog.get_input()
         
@@ -296,31 +772,22 @@ class ModernInventoryApp:
             self.show_error_message("Input Error", "Item code must be an integer.")
             return
         
-        items = load_items()
-        removed_item_details = None
-        updated_items = []
+        def item_removed(removed_item):
+            if removed_item:
+                self.show_success_message(
+                    "Success",
+                    f"Item: '{removed_item.name}' (Code: {removed_item.code}) has been successfully removed."
+                )
+            else:
+                self.show_error_message("Error", f"Item with code {item_code_to_remove} not found.")
         
-        for item in items:
-            try:
-                if int(item[0]) == item_code_to_remove:
-                    removed_item_details = item
-                else:
-                    updated_items.append(item)
-            except ValueError:
-                # If an item in the file has an invalid code, keep it in the list
-                updated_items.append(item)
-        
-        if removed_item_details:
-            save_items(updated_items)
-            self.show_success_message(
-                "Success",
-                f"Item: '{removed_item_details[1]}' (Code: {removed_item_details[0]}) has been successfully removed."
-            )
-        else:
-            self.show_error_message("Error", f"Item with code {item_code_to_remove} not found.")
+        self.run_in_background(lambda: self.undo_log.remove_item(item_code_to_remove), item_removed, "Removing item...")
 
     def update_item_gui(self):
         """Handles updating details of an existing item."""
+        if not self.check_store_ready():
+            return
+        
         def submit_update_dialog(item_code_str):
             try:
                 item_code_to_update = int(item_code_str)
@@ -328,24 +795,19 @@ class ModernInventoryApp:
                 self.show_error_message("Input Error", "Item Code must be an integer.")
                 return
 
-            items = load_items()
-            item_found = False
-            target_item_index = -1
+            self.run_in_background(lambda: self.store.get(item_code_to_update),
+                                   lambda item: open_update_dialog(item_code_to_update, item),
+                                   "Looking up item...")
 
-            for i, item in enumerate(items):
-                if int(item[0]) == item_code_to_update:
-                    item_found = True
-                    target_item_index = i
-                    break
-            
-            if not item_found:
+        def open_update_dialog(item_code_to_update, item):
+            if item is None:
                 self.show_error_message("Error", f"Item with code {item_code_to_update} not found.")
                 return
 
             # Found item, now open a new dialog for specific updates
             update_dialog = ctk.CTkToplevel(self.root)
             update_dialog.geometry("400x550")
-            update_dialog.title(f"Update Item: {items[target_item_index][1]}")
+            update_dialog.title(f"Update Item: {item.name}")
             update_dialog.transient(self.root)
             update_dialog.grab_set()
 
@@ -362,13 +824,14 @@ class ModernInventoryApp:
             update_frame = ctk.CTkFrame(update_dialog, corner_radius=15)
             update_frame.pack(fill="both", expand=True, padx=20, pady=20)
 
-            ctk.CTkLabel(update_frame, text=f"Updating Item: {items[target_item_index][1]} (Code: {items[target_item_index][0]})",
+            ctk.CTkLabel(update_frame, text=f"Updating Item: {item.name} (Code: {item.code})",
                          font=ctk.CTkFont(size=18, weight="bold")).pack(pady=(10, 20))
 
             # Current values
-            current_name = items[target_item_index][1]
-            current_price = items[target_item_index][2]
-            current_qty = items[target_item_index][3]
+            current_name = item.name
+            current_price = format_price(item.price)
+            current_qty = item.qty
+            item_version = item.version
 
             ctk.CTkLabel(update_frame, text=f"Current Name: {current_name}", font=ctk.CTkFont(size=12)).pack(anchor="w", padx=10, pady=2)
             name_entry = ctk.CTkEntry(update_frame, placeholder_text="New Name (leave blank to keep current)", height=35, font=ctk.CTkFont(size=14))
@@ -387,11 +850,10 @@ class ModernInventoryApp:
                 updated_price_str = price_entry.get().strip()
                 updated_qty_str = qty_entry.get().strip()
 
-                changes_made = False
+                changes = {}
 
                 if updated_name:
-                    items[target_item_index][1] = updated_name
-                    changes_made = True
+                    changes["name"] = updated_name
                 
                 if updated_price_str:
                     try:
@@ -399,8 +861,7 @@ class ModernInventoryApp:
                         if updated_price < 0:
                             self.show_error_message("Input Error", "Price cannot be negative.")
                             return
-                        items[target_item_index][2] = str(updated_price)
-                        changes_made = True
+                        changes["price"] = updated_price
                     except ValueError:
                         self.show_error_message("Input Error", "New Price must be a number.")
                         return
@@ -411,15 +872,19 @@ class ModernInventoryApp:
                         if updated_qty < 0:
                             self.show_error_message("Input Error", "Quantity cannot be negative.")
                             return
-                        items[target_item_index][3] = str(updated_qty)
-                        changes_made = True
+                        changes["qty"] = updated_qty
                     except ValueError:
                         self.show_error_message("Input Error", "New Quantity must be an integer.")
                         return
                 
-                if changes_made:
-                    save_items(items)
-                    self.show_success_message("Success", f"Item '{current_name}' details updated successfully.")
+                if changes:
+                    # Fails with a ConflictError if another terminal changed the item since this dialog opened
+                    self.run_in_background(
+                        lambda: self.undo_log.update_item(item.code, expected_version=item_version, **changes),
+                        lambda _: self.show_success_message("Success", f"Item '{current_name}' details updated successfully."),
+                        "Saving changes...",
+                        lambda error: self.show_error_message("Update Error", str(error))
+                    )
                 else:
                     self.show_error_message("No Changes", "No changes were made to the item.")
                 
@@ -440,8 +905,10 @@ class ModernInventoryApp:
 
     def search_items_gui(self):
         """Opens a dialog for searching and viewing items."""
+        if not self.check_store_ready():
+            return
         dialog = ctk.CTkToplevel(self.root)
-        dialog.geometry("600x500")
+        dialog.geometry("600x600")
         dialog.title("Search & View Items")
         dialog.transient(self.root)
         dialog.grab_set()
@@ -462,27 +929,52 @@ class ModernInventoryApp:
         title_label = ctk.CTkLabel(main_frame, text="Search & View Items", font=ctk.CTkFont(size=24, weight="bold"))
         title_label.pack(pady=(20, 30))
         
+        # Name search: results update as the user types
+        name_frame = ctk.CTkFrame(main_frame, fg_color="transparent")
+        name_frame.pack(fill="x", padx=20, pady=(0, 10))
+        
+        name_entry = ctk.CTkEntry(name_frame, placeholder_text="Search by name...", height=35, font=ctk.CTkFont(size=14))
+        name_entry.pack(side="left", fill="x", expand=True, padx=(0, 10))
+        
+        name_mode = ctk.CTkSegmentedButton(name_frame, values=["Prefix", "Contains", "Fuzzy"])
+        name_mode.set("Contains")
+        name_mode.pack(side="right")
+        
+        def run_name_search(*_):
+            self.search_by_name(results_table, name_entry.get(), name_mode.get().lower())
+        
+        name_entry.bind("<KeyRelease>", run_name_search)
+        name_mode.configure(command=run_name_search)
+        
         # Search options buttons
         option_frame = ctk.CTkFrame(main_frame, fg_color="transparent")
         option_frame.pack(fill="x", padx=20, pady=10)
         
         price_range_btn = ctk.CTkButton(
             option_frame, text="Search by Price Range",
-            command=lambda: self.search_by_price_range(results_text),
+            command=lambda: self.search_by_price_range(results_table),
             fg_color="#1f538d", hover_color="#2e6db0"
         )
         price_range_btn.pack(side="left", expand=True, padx=(0, 10))
         
         view_all_btn = ctk.CTkButton(
             option_frame, text="View All Items",
-            command=lambda: self.view_all_items(results_text),
+            command=lambda: self.view_all_items(results_table),
             fg_color="#388e3c", hover_color="#4caf50"
         )
-        view_all_btn.pack(side="right", expand=True)
+        view_all_btn.pack(side="left", expand=True, padx=(0, 10))
+        
+        export_btn = ctk.CTkButton(
+            option_frame, text="Export...",
+            command=self.export_items_gui,
+            fg_color="#00796b", hover_color="#009688"
+        )
+        export_btn.pack(side="right", expand=True)
         
-        # Textbox to display results
-        results_text = ctk.CTkTextbox(main_frame, height=300, font=ctk.CTkFont(size=12))
-        results_text.pack(fill="both", expand=True, padx=20, pady=20)
+        # Table to display results; only the visible rows are rendered
+        results_table = VirtualTable(main_frame, cache=self.query_cache, background=self.run_in_background,
+                                     fg_color="transparent")
+        results_table.pack(fill="both", expand=True, padx=20, pady=20)
         
         close_btn = ctk.CTkButton(main_frame, text="Close", command=dialog.destroy,
                                   fg_color="gray", hover_color="darkgray")
@@ -501,166 +993,729 @@ class ModernInventoryApp:
             if end_price_str is None: return # User cancelled
             end_price = float(end_price_str)
             
-            items = load_items()
-            results = []
+            def price_range_results(sort_by, descending):
+                # The price index already yields matches in price order, other columns need a sort
+                if sort_by in (None, "price"):
+                    return self.store.iter_price_range(start_price, end_price, descending=descending)
+                return sort_items(self.store.search_by_price(start_price, end_price), sort_by, descending)
             
-            for item in items:
-                try:
-                    item_price = float(item[2])
-                    if start_price <= item_price <= end_price:
-                        results.append(f"Code: {item[0]} | Name: {item[1]} | Price: ${item[2]} | Qty: {item[3]}")
-                except ValueError:
-                    continue # Skip items with invalid price data
-            
-            results_widget.delete("0.0", "end") # Clear previous results
-            if results:
-                results_widget.insert("0.0", "\n".join(results))
-            else:
-                results_widget.insert("0.0", "No items found in the specified price range.")
+            low, high = cents_bound(start_price, upper=False), cents_bound(end_price, upper=True)
+            results_widget.show(price_range_results, "No items found in the specified price range.",
+                                ("price", low, high), lambda item: low <= item.cents <= high)
                 
         except (ValueError, TypeError):
             self.show_error_message("Input Error", "Please enter valid numeric prices.")
 
-    def view_all_items(self, results_widget):
-        """Displays all items in the provided widget."""
-        items = load_items()
-        results_widget.delete("0.0", "end") # Clear previous results
-        
-        if not items:
-            results_widget.insert("0.0", "No items found in inventory.")
+    def search_by_name(self, results_widget, query, mode="contains"):
+        """Shows items whose name matches query ("prefix", "contains" or "fuzzy") in the provided widget."""
+        query = query.strip()
+        if not query:
+            results_widget.clear()
             return
         
-        results = []
-        for item in items:
-            results.append(f"Code: {item[0]} | Name: {item[1]} | Price: ${item[2]} | Qty: {item[3]}")
-        
-        results_widget.insert("0.0", "\n".join(results))
+        # Searched when the table starts the source, which is on a worker in client mode
+        results_widget.show(lambda sort_by, descending: sort_items(self.store.search_by_name(query, mode, limit=200),
+                                                                   sort_by, descending),
+                            f"No items found matching '{query}'.")
 
-    def create_bill_gui(self):
-        """Handles the creation of a customer bill, including item selection and stock update."""
-        customer_name_dialog = ctk.CTkInputDialog(text="Enter customer name:", title="Create Bill")
-        customer_name = customer_name_dialog.get_input()
-        if not customer_name:
-            return # User cancelled
+    def view_all_items(self, results_widget):
+        """Displays all items in the provided widget, streamed from the store as the user scrolls."""
+        results_widget.show(self.store.iter_items, "No items found in inventory.", ("all",), lambda item: True)
 
-        # Ask to register customer
-        register_status = messagebox.askyesno("Customer Registration", f"Do you want to register '{customer_name}' as a customer?")
-        if register_status:
-            customers = load_customers()
+    def create_bill_gui(self):
+        """Opens the billing screen: scan or type item codes, then commit the whole bill at once."""
+        if not self.check_store_ready():
+            return
+        dialog = ctk.CTkToplevel(self.root)
+        dialog.geometry("700x650")
+        dialog.title("Create Bill")
+        dialog.transient(self.root)
+        dialog.grab_set()
+        
+        # Center the dialog relative to the screen
+        dialog.update_idletasks()
+        screen_width = dialog.winfo_screenwidth()
+        screen_height = dialog.winfo_screenheight()
+        window_width = dialog.winfo_width()
+        window_height = dialog.winfo_height()
+        x = (screen_width // 2) - (window_width // 2)
+        y = (screen_height // 2) - (window_height // 2)
+        dialog.geometry(f"+{x}+{y}")
+        
+        main_frame = ctk.CTkFrame(dialog, corner_radius=15)
+        main_frame.pack(fill="both", expand=True, padx=20, pady=20)
+        
+        title_label = ctk.CTkLabel(main_frame, text="Create Bill", font=ctk.CTkFont(size=24, weight="bold"))
+        title_label.pack(pady=(15, 15))
+        
+        # Customer details
+        customer_frame = ctk.CTkFrame(main_frame, fg_color="transparent")
+        customer_frame.pack(fill="x", padx=20, pady=(0, 10))
+        customer_entry = ctk.CTkEntry(customer_frame, placeholder_text="Customer name", height=35, font=ctk.CTkFont(size=14))
+        customer_entry.pack(side="left", fill="x", expand=True, padx=(0, 10))
+        register_var = ctk.BooleanVar(value=False)
+        ctk.CTkCheckBox(customer_frame, text="Register customer", variable=register_var).pack(side="right", padx=(0, 10))
+        scanner_var = ctk.BooleanVar(value=False)
+        scanner_switch = ctk.CTkSwitch(customer_frame, text="Scanner mode", variable=scanner_var)
+        scanner_switch.pack(side="right", padx=(0, 10))
+        
+        # Item entry: type or scan a code and press Enter
+        entry_frame = ctk.CTkFrame(main_frame, fg_color="transparent")
+        entry_frame.pack(fill="x", padx=20, pady=(0, 5))
+        code_entry = ctk.CTkEntry(entry_frame, placeholder_text="Item code", height=35, font=ctk.CTkFont(size=14))
+        code_entry.pack(side="left", fill="x", expand=True, padx=(0, 10))
+        qty_entry = ctk.CTkEntry(entry_frame, width=80, height=35, font=ctk.CTkFont(size=14))
+        qty_entry.insert(0, "1")
+        qty_entry.pack(side="left", padx=(0, 10))
+        add_btn = ctk.CTkButton(entry_frame, text="Add", width=80, fg_color="#7b1fa2", hover_color="#9c27b0")
+        add_btn.pack(side="left")
+        
+        item_info_label = ctk.CTkLabel(main_frame, text="", font=ctk.CTkFont(size=12), anchor="w")
+        item_info_label.pack(fill="x", padx=20, pady=(0, 5))
+        
+        # Bill lines
+        configure_table_style(dialog)
+        lines_tree = ttk.Treeview(
+            main_frame, columns=("code", "name", "price", "qty", "subtotal"), show="headings",
+            height=12, selectmode="browse", style="Inventory.Treeview"
+        )
+        for key, title, width in [("code", "Code", 70), ("name", "Name", 200), ("price", "Price", 90),
+                                  ("qty", "Qty", 60), ("subtotal", "Subtotal", 110)]:
+            lines_tree.heading(key, text=title)
+            lines_tree.column(key, width=width, anchor="w" if key == "name" else "e")
+        lines_tree.pack(fill="both", expand=True, padx=20, pady=5)
+        
+        total_label = ctk.CTkLabel(main_frame, text="Total: $0.00", font=ctk.CTkFont(size=20, weight="bold"))
+        total_label.pack(anchor="e", padx=20, pady=5)
+        
+        bill_quantities = {} # item code -> quantity on this bill, in the order first added
+        line_details = {} # item code -> (name, price) looked up when the line was added
+        line_notes = {} # item code -> problem shown on its line, e.g. after another till took the stock
+        
+        def available_for(item):
+            # Stock already put on this bill is not available again
+            return item.qty - bill_quantities.get(item.code, 0)
+        
+        def lookup(item_code, on_found):
+            """Calls on_found(item or None); in client mode the server is asked on a worker."""
+            if not self.remote:
+                on_found(self.store.get(item_code))
+                return
+            def lookup_failed(error):
+                if dialog.winfo_exists():
+                    item_info_label.configure(text=f"❌ Could not look up item {item_code}: {error}")
+            self.run_in_background(lambda: self.store.get(item_code),
+                                   lambda item: dialog.winfo_exists() and on_found(item),
+                                   "Looking up item...", lookup_failed)
+        
+        def show_item_info(*_):
+            """Validates the typed code against the store as the cashier types."""
+            code_str = code_entry.get().strip()
+            if not code_str:
+                item_info_label.configure(text="")
+                return
+            try:
+                item_code = int(code_str)
+            except ValueError:
+                item_info_label.configure(text="❌ Item code must be an integer.")
+                return
+            
+            def show(item):
+                if code_entry.get().strip() != code_str: # The cashier has typed on since
+                    return
+                if item is None:
+                    item_info_label.configure(text="❌ Item not found in stock.")
+                else:
+                    item_info_label.configure(text=f"{item.name} — ${format_price(item.price)} — {available_for(item)} available")
+            lookup(item_code, show)
+        
+        def line_values(code):
+            name, price = line_details[code]
+            qty = bill_quantities[code]
+            if code in line_notes:
+                name = f"{name} ({line_notes[code]})"
+            return (code, name, f"${format_price(price)}", qty, f"${line_total(price, qty)}")
+        
+        def update_total():
+            total_bill = sum(line_total(line_details[code][1], qty) for code, qty in bill_quantities.items())
+            total_label.configure(text=f"Total: ${total_bill:.2f}")
+        
+        def refresh_lines():
+            lines_tree.delete(*lines_tree.get_children())
+            for code in bill_quantities:
+                lines_tree.insert("", "end", iid=str(code), values=line_values(code))
+            update_total()
+        
+        def bill_item(item_code, qty, on_added=None):
+            """Puts qty of an item on the bill, updating only its own line, then calls on_added()."""
+            lookup(item_code, lambda item: put_on_bill(item_code, item, qty, on_added))
+        
+        def put_on_bill(item_code, item, qty, on_added):
+            if item is None:
+                item_info_label.configure(text=f"❌ Item {item_code} not found in stock.")
+                return
+            if qty > available_for(item):
+                item_info_label.configure(text=f"❌ Not enough stock for {item.name}. Available: {available_for(item)}")
+                return
+            
+            bill_quantities[item_code] = bill_quantities.get(item_code, 0) + qty
+            line_details[item_code] = (item.name, item.price)
+            line_notes.pop(item_code, None)
+            if lines_tree.exists(str(item_code)):
+                lines_tree.item(str(item_code), values=line_values(item_code))
+            else:
+                lines_tree.insert("", "end", iid=str(item_code), values=line_values(item_code))
+            lines_tree.see(str(item_code))
+            update_total()
+            item_info_label.configure(text=f"✅ {item.name} x{qty} added to bill.")
+            if on_added:
+                on_added()
+        
+        def add_line(*_):
+            """Adds the typed code and quantity to the bill without any popups."""
+            try:
+                item_code = int(code_entry.get().strip())
+            except ValueError:
+                item_info_label.configure(text="❌ Item code must be an integer.")
+                return
+            try:
+                qty = int(qty_entry.get().strip() or "1")
+                if qty <= 0:
+                    raise ValueError
+            except ValueError:
+                item_info_label.configure(text="❌ Quantity must be a positive integer.")
+                return
+            
+            code_str, qty_str = code_entry.get(), qty_entry.get()
+            def line_added():
+                # Leave the fields alone if the cashier already typed the next code
+                if code_entry.get() == code_str and qty_entry.get() == qty_str:
+                    code_entry.delete(0, "end")
+                    qty_entry.delete(0, "end")
+                    qty_entry.insert(0, "1")
+                    code_entry.focus_set()
+            bill_item(item_code, qty, line_added)
+        
+        def remove_line():
+            selected = lines_tree.selection()
+            if selected:
+                code = int(selected[0])
+                del bill_quantities[code]
+                del line_details[code]
+                line_notes.pop(code, None)
+                refresh_lines()
+        
+        def complete_bill():
+            """Commits the whole bill in one transaction: stock decrement, then the bill file."""
+            customer_name = customer_entry.get().strip()
+            if not customer_name:
+                self.show_error_message("Input Error", "Please enter the customer name.")
+                return
+            if not bill_quantities:
+                self.show_error_message("Input Error", "The bill has no items.")
+                return
+            
             now = datetime.now()
             date_time = now.strftime("%m/%d/%Y, %H:%M:%S")
-            customers.append(f"{customer_name} ---- reg on: {date_time}")
-            save_customers(customers)
-            self.show_success_message("Customer Registered", f"Customer '{customer_name}' registered successfully.")
+            quantities = dict(bill_quantities)
+            # Record each line with the name and price it was sold at
+            bill_lines = [(code, *line_details[code], qty) for code, qty in quantities.items()]
+            
+            if register_var.get():
+                def customer_registered(result):
+                    customer, created = result
+                    if created:
+                        self.update_status(f"✅ Customer '{customer.name}' registered successfully.")
+                    else:
+                        self.update_status(f"Customer '{customer.name}' was already registered on {customer.registered}.")
+                
+                self.run_in_background(
+                    lambda: self.undo_log.register_customer(customer_name, date_time),
+                    customer_registered, "Registering customer..."
+                )
+            
+            def commit_bill():
+                # Fails without changing anything if another terminal took the stock meanwhile
+                return self.undo_log.commit_bill(customer_name, bill_lines, now.isoformat(timespec="seconds"))
+            
+            def bill_committed(bill):
+                self.show_success_message("Bill Created", f"Bill #{bill.bill_id} for {customer_name} saved. Total: ${bill.total:.2f}")
+                dialog.destroy()
+            
+            complete_btn.configure(state="disabled")
+            
+            def bill_failed(error):
+                complete_btn.configure(state="normal")
+                if isinstance(error, StockError):
+                    # Only the short lines need the cashier's attention; they say what is left
+                    for code, _, available in error.shortages:
+                        if code in bill_quantities:
+                            line_notes[code] = f"only {available} left" if available else "no longer in stock"
+                    refresh_lines()
+                    short = [str(code) for code in line_notes]
+                    if short:
+                        lines_tree.selection_set(short)
+                        lines_tree.see(short[0])
+                    self.show_error_message("Stock Changed", f"Another terminal sold some of these items. {error}")
+                else:
+                    self.show_error_message("Billing Error", f"An error occurred during billing: {error}")
+            
+            self.run_in_background(commit_bill, bill_committed, "Saving bill...", bill_failed)
+        
+        scan_buffer = ScanBuffer()
+        
+        def on_scanner_key(event):
+            """In scanner mode, keys typed anywhere but a text field feed the scan buffer.
+            
+            Each recognised scan adds one unit, so scanning the same code again
+            increments its quantity.
+            """
+            if not scanner_var.get() or event.widget.winfo_class() == "Entry":
+                return None
+            timestamp = event.time / 1000 # Tk event times are in milliseconds
+            if event.keysym in ("Return", "KP_Enter"):
+                code_str = scan_buffer.finish(timestamp)
+                if code_str is None:
+                    return "break"
+                try:
+                    bill_item(int(code_str), 1)
+                except ValueError:
+                    item_info_label.configure(text=f"❌ Scanned code '{code_str}' is not an item code.")
+                return "break"
+            if event.char and event.char.isprintable():
+                scan_buffer.feed(event.char, timestamp)
+                return "break"
+            return None
+        
+        def scanner_mode_changed():
+            # Take focus away from the text fields so scans reach the dialog binding
+            if scanner_var.get():
+                dialog.focus_set()
+                item_info_label.configure(text="🔦 Scanner mode: scan items, each scan adds one unit.")
+            else:
+                code_entry.focus_set()
+                item_info_label.configure(text="")
+        
+        scanner_switch.configure(command=scanner_mode_changed)
+        dialog.bind("<Key>", on_scanner_key)
+        customer_entry.bind("<Return>", lambda _: dialog.focus_set() if scanner_var.get() else code_entry.focus_set())
+        code_entry.bind("<KeyRelease>", show_item_info)
+        code_entry.bind("<Return>", add_line)
+        qty_entry.bind("<Return>", add_line)
+        add_btn.configure(command=add_line)
+        
+        button_frame = ctk.CTkFrame(main_frame, fg_color="transparent")
+        button_frame.pack(fill="x", padx=20, pady=(5, 15))
+        button_frame.grid_columnconfigure((0, 1, 2), weight=1)
+        
+        ctk.CTkButton(button_frame, text="Remove Line", command=remove_line,
+                      fg_color="#d32f2f", hover_color="#e57373").grid(row=0, column=0, padx=(0, 10), sticky="ew")
+        ctk.CTkButton(button_frame, text="Cancel", command=dialog.destroy,
+                      fg_color="gray", hover_color="darkgray").grid(row=0, column=1, padx=(0, 10), sticky="ew")
+        complete_btn = ctk.CTkButton(button_frame, text="Complete Bill", command=complete_bill,
+                                     fg_color="#388e3c", hover_color="#4caf50")
+        complete_btn.grid(row=0, column=2, sticky="ew")
+        
+        code_entry.focus_set()
 
-        bill_file_name = f"BILL-{customer_name.replace(' ', '_')}.txt"
-        bill_items_list = []
-        total_bill = 0.0
+    def sales_history_gui(self):
+        """Opens a dialog with today's sales, per-customer bill history and receipts."""
+        if not self.check_store_ready():
+            return
+        dialog = ctk.CTkToplevel(self.root)
+        dialog.geometry("600x600")
+        dialog.title("Sales History")
+        dialog.transient(self.root)
+        dialog.grab_set()
+        
+        # Center the dialog relative to the screen
+        dialog.update_idletasks()
+        screen_width = dialog.winfo_screenwidth()
+        screen_height = dialog.winfo_screenheight()
+        window_width = dialog.winfo_width()
+        window_height = dialog.winfo_height()
+        x = (screen_width // 2) - (window_width // 2)
+        y = (screen_height // 2) - (window_height // 2)
+        dialog.geometry(f"+{x}+{y}")
+        
+        main_frame = ctk.CTkFrame(dialog, corner_radius=15)
+        main_frame.pack(fill="both", expand=True, padx=20, pady=20)
+        
+        title_label = ctk.CTkLabel(main_frame, text="Sales History", font=ctk.CTkFont(size=24, weight="bold"))
+        title_label.pack(pady=(20, 10))
+        
+        today_label = ctk.CTkLabel(main_frame, text="Today: ...", font=ctk.CTkFont(size=16))
+        today_label.pack(pady=(0, 10))
+        
+        def show_today(totals):
+            today_count, today_total = totals
+            if dialog.winfo_exists():
+                today_label.configure(text=f"Today: {today_count} bills, ${today_total:.2f}")
+        
+        def today_total():
+            self.bills.sync() # Reports cover every till's sales, not just this one's
+            return self.bills.daily_total(datetime.now().strftime("%Y-%m-%d"))
+        
+        self.run_in_background(today_total, show_today, "Totalling today's sales...")
+        
+        query_frame = ctk.CTkFrame(main_frame, fg_color="transparent")
+        query_frame.pack(fill="x", padx=20, pady=5)
+        query_entry = ctk.CTkEntry(query_frame, placeholder_text="Customer name or bill number", height=35,
+                                   font=ctk.CTkFont(size=14))
+        query_entry.pack(fill="x")
+        
+        option_frame = ctk.CTkFrame(main_frame, fg_color="transparent")
+        option_frame.pack(fill="x", padx=20, pady=10)
+        option_frame.grid_columnconfigure((0, 1, 2), weight=1)
+        
+        results_text = ctk.CTkTextbox(main_frame, height=300, font=ctk.CTkFont(family="Courier", size=12))
+        results_text.pack(fill="both", expand=True, padx=20, pady=10)
+        
+        def show_text(text):
+            if dialog.winfo_exists():
+                results_text.delete("0.0", "end")
+                results_text.insert("0.0", text)
+        
+        def show_customer_history():
+            customer_name = query_entry.get().strip()
+            if not customer_name:
+                self.show_error_message("Input Error", "Please enter a customer name.")
+                return
+            def customer_history_text():
+                self.bills.sync()
+                bills = self.bills.for_customer(customer_name)
+                if not bills:
+                    return f"No bills found for '{customer_name}'."
+                lines = [f"Bill #{bill.bill_id} | {bill.created.replace('T', ' ')} | "
+                         f"{sum(qty for _, _, _, qty in bill.lines)} items | ${bill.total:.2f}" for bill in bills]
+                lines.append(f"\n{len(bills)} bills, ${sum(bill.total for bill in bills):.2f} in total")
+                return "\n".join(lines)
+            self.run_in_background(customer_history_text, show_text, "Reading bills...")
+        
+        def show_daily_totals():
+            def daily_totals_text():
+                self.bills.sync()
+                totals = self.bills.daily_totals()
+                if not totals:
+                    return "No bills recorded yet."
+                return "\n".join(f"{day} | {count} bills | ${total:.2f}" for day, (count, total) in reversed(totals.items()))
+            self.run_in_background(daily_totals_text, show_text, "Totalling sales...")
+        
+        def show_receipt():
+            try:
+                bill_id = int(query_entry.get().strip().lstrip("#"))
+            except ValueError:
+                self.show_error_message("Input Error", "Bill number must be an integer.")
+                return
+            def receipt_text():
+                self.bills.sync()
+                bill = self.bills.get(bill_id)
+                return render_receipt(bill) if bill else "Bill not found."
+            self.run_in_background(receipt_text, show_text, "Reading bill...")
+        
+        ctk.CTkButton(option_frame, text="Customer History", command=show_customer_history,
+                      fg_color="#1f538d", hover_color="#2e6db0").grid(row=0, column=0, padx=(0, 10), sticky="ew")
+        ctk.CTkButton(option_frame, text="Show Receipt", command=show_receipt,
+                      fg_color="#7b1fa2", hover_color="#9c27b0").grid(row=0, column=1, padx=(0, 10), sticky="ew")
+        ctk.CTkButton(option_frame, text="Daily Totals", command=show_daily_totals,
+                      fg_color="#388e3c", hover_color="#4caf50").grid(row=0, column=2, sticky="ew")
+        
+        def export_receipt_archive():
+            """Writes the receipts of a day, a month or a range of days to one zip archive."""
+            days = ctk.CTkInputDialog(text="Days to export (2025-07-14, a month as 2025-07, or FROM..TO):",
+                                      title="Export Receipts").get_input()
+            if not days:
+                return
+            try:
+                first, last = parse_days(days)
+            except ValueError:
+                self.show_error_message("Input Error", f"'{days}' is not a day, a month or a range of days.")
+                return
+            kind = format_var.get().lower()
+            path = filedialog.asksaveasfilename(
+                title="Export Receipts", defaultextension=".zip", initialfile=f"receipts-{days.strip()}-{kind}.zip",
+                filetypes=[("Zip archive", "*.zip")]
+            )
+            if not path:
+                return
+            self.run_in_background(
+                lambda: export_receipts(bills_between(self.bills, first, last), path, kind),
+                lambda count: self.show_success_message("Export Complete",
+                                                        f"Exported {count:,} receipts to {path}."),
+                f"Exporting receipts to {os.path.basename(path)}...",
+                lambda error: self.show_error_message("Export Error", f"Could not export receipts: {error}")
+            )
+        
+        format_var = ctk.StringVar(value="Text")
+        ctk.CTkOptionMenu(option_frame, variable=format_var, values=["Text", "HTML", "PDF"]).grid(
+            row=1, column=0, padx=(0, 10), pady=(10, 0), sticky="ew")
+        ctk.CTkButton(option_frame, text="Export Receipts...", command=export_receipt_archive,
+                      fg_color="#00796b", hover_color="#009688").grid(row=1, column=1, columnspan=2, pady=(10, 0),
+                                                                      sticky="ew")
+        
+        close_btn = ctk.CTkButton(main_frame, text="Close", command=dialog.destroy,
+                                  fg_color="gray", hover_color="darkgray")
+        close_btn.pack(pady=(0, 20))
 
-        try:
-            # Open bill file in append mode, create if not exists
-            with open(bill_file_name, "a+") as bill_file:
+    def reports_gui(self):
+        """Opens a dialog with stock valuation, low-stock, price-band and reorder reports."""
+        if not self.check_store_ready():
+            return
+        dialog = ctk.CTkToplevel(self.root)
+        dialog.geometry("650x600")
+        dialog.title("Stock Reports")
+        dialog.transient(self.root)
+        dialog.grab_set()
+        
+        # Center the dialog relative to the screen
+        dialog.update_idletasks()
+        screen_width = dialog.winfo_screenwidth()
+        screen_height = dialog.winfo_screenheight()
+        window_width = dialog.winfo_width()
+        window_height = dialog.winfo_height()
+        x = (screen_width // 2) - (window_width // 2)
+        y = (screen_height // 2) - (window_height // 2)
+        dialog.geometry(f"+{x}+{y}")
+        
+        main_frame = ctk.CTkFrame(dialog, corner_radius=15)
+        main_frame.pack(fill="both", expand=True, padx=20, pady=20)
+        
+        title_label = ctk.CTkLabel(main_frame, text="Stock Reports", font=ctk.CTkFont(size=24, weight="bold"))
+        title_label.pack(pady=(20, 10))
+        
+        threshold_frame = ctk.CTkFrame(main_frame, fg_color="transparent")
+        threshold_frame.pack(fill="x", padx=20, pady=5)
+        ctk.CTkLabel(threshold_frame, text="Low stock at or below:", font=ctk.CTkFont(size=14)).pack(side="left")
+        threshold_entry = ctk.CTkEntry(threshold_frame, width=80, height=35, placeholder_text="default",
+                                       font=ctk.CTkFont(size=14))
+        threshold_entry.pack(side="left", padx=10)
+        code_entry = ctk.CTkEntry(threshold_frame, width=120, height=35, placeholder_text="Item code",
+                                  font=ctk.CTkFont(size=14))
+        code_entry.pack(side="right")
+        
+        option_frame = ctk.CTkFrame(main_frame, fg_color="transparent")
+        option_frame.pack(fill="x", padx=20, pady=10)
+        option_frame.grid_columnconfigure((0, 1, 2, 3), weight=1)
+        
+        results_text = ctk.CTkTextbox(main_frame, height=300, font=ctk.CTkFont(family="Courier", size=12))
+        results_text.pack(fill="both", expand=True, padx=20, pady=10)
+        
+        def show_text(text):
+            if dialog.winfo_exists():
+                results_text.delete("0.0", "end")
+                results_text.insert("0.0", text)
+        
+        def show_summary():
+            def summary_text():
+                summary = self.analytics.summary()
+                return (f"Items:          {summary['items']:,}\n"
+                        f"Units in stock: {summary['units']:,}\n"
+                        f"Stock value:    ${summary['value']:,.2f}\n"
+                        f"Out of stock:   {summary['out_of_stock']:,}")
+            self.run_in_background(summary_text, show_text, "Valuing stock...")
+        
+        def show_low_stock():
+            level = threshold_entry.get().strip()
+            try:
+                threshold = int(level) if level else None # Empty uses the default level
+            except ValueError:
+                self.show_error_message("Input Error", "The low-stock level must be an integer.")
+                return
+            def low_stock_text():
+                items = self.analytics.low_stock(threshold)
+                level = "the low-stock level" if threshold is None else threshold
+                if not items:
+                    return f"No items at or below {level}."
+                lines = [f"{item.code} | {item.name} | {item.qty} left" for item in islice(items, 500)]
+                if len(items) > 500:
+                    lines.append(f"... and {len(items) - 500:,} more")
+                lines.append(f"\n{len(items):,} items at or below {level}")
+                return "\n".join(lines)
+            self.run_in_background(low_stock_text, show_text, "Finding low stock...")
+        
+        def show_top_value():
+            def top_value_text():
+                rows = self.analytics.top_value(20)
+                if not rows:
+                    return "No items in stock."
+                return "\n".join(f"{item.code} | {item.name} | {item.qty} x ${format_price(item.price)} | ${value:,.2f}"
+                                 for item, value in rows)
+            self.run_in_background(top_value_text, show_text, "Ranking items...")
+        
+        def show_price_bands():
+            def price_bands_text():
+                lines = [f"{'Price band':<16}{'Items':>10}{'Units':>12}{'Value':>18}"]
+                for low, high, items, units, value in self.analytics.price_bands():
+                    band = f"${low:,}+" if high is None else f"${low:,}-{high:,}"
+                    lines.append(f"{band:<16}{items:>10,}{units:>12,}{'$' + format(value, ',.2f'):>18}")
+                return "\n".join(lines)
+            self.run_in_background(price_bands_text, show_text, "Grouping by price...")
+        
+        def show_item_history():
+            try:
+                code = int(code_entry.get().strip())
+            except ValueError:
+                self.show_error_message("Input Error", "Item code must be an integer.")
+                return
+            def item_history_text():
+                item = self.store.get(code)
                 now = datetime.now()
-                date_time = now.strftime("%m/%d/%Y, %H:%M:%S")
-                bill_file.write(f"--- Bill for {customer_name} ---\n")
-                bill_file.write(f"Date: {date_time}\n\n")
-
-                items_in_stock = load_items() # Load current stock
-
-                while True:
-                    item_code_str_dialog = ctk.CTkInputDialog(text="Enter item code (or leave empty to finish billing):", title="Billing - Add Item")
-                    item_code_str = item_code_str_dialog.get_input()
-                    if not item_code_str: # User finished adding items
-                        break
-
-                    try:
-                        item_code = int(item_code_str)
-                    except ValueError:
-                        self.show_error_message("Input Error", "Item code must be an integer.")
-                        continue
-
-                    found_item = None
-                    item_index = -1
-                    for i, item in enumerate(items_in_stock):
-                        try:
-                            if int(item[0]) == item_code:
-                                found_item = item
-                                item_index = i
-                                break
-                        except ValueError:
-                            continue # Skip invalid item codes in file
-
-                    if not found_item:
-                        self.show_error_message("Error", "Item not found in stock.")
-                        continue
-
-                    try:
-                        qty_str_dialog = ctk.CTkInputDialog(text=f"Enter quantity for {found_item[1]} (Available: {found_item[3]}):", title="Billing - Quantity")
-                        qty_str = qty_str_dialog.get_input()
-                        if qty_str is None: continue # User cancelled quantity input
-                        qty = int(qty_str)
-                        if qty <= 0:
-                            self.show_error_message("Input Error", "Quantity must be a positive integer.")
-                            continue
-                    except ValueError:
-                        self.show_error_message("Input Error", "Invalid quantity.")
-                        continue
-
-                    available_qty = int(found_item[3])
-                    if qty > available_qty:
-                        self.show_error_message("Stock Error", f"Not enough stock for {found_item[1]}. Available: {available_qty}")
-                        continue
-                    
-                    item_price = float(found_item[2])
-                    item_subtotal = item_price * qty
-                    total_bill += item_subtotal
-                    
-                    bill_line = f"{found_item[1]} ({found_item[0]}) - ${found_item[2]} x {qty} = ${item_subtotal:.2f}"
-                    bill_items_list.append(bill_line)
-                    bill_file.write(bill_line + "\n")
-                    
-                    # Update stock in memory
-                    items_in_stock[item_index][3] = str(available_qty - qty) 
-                    
-                    self.show_success_message("Item Added to Bill", f"{found_item[1]} x{qty} added to bill.")
-                
-                bill_file.write(f"\nTotal Bill: ${total_bill:.2f}\n")
-            
-            self.show_success_message("Bill Created", f"Your Total bill has successfully printed to {bill_file_name}")
-            save_items(items_in_stock) # Save updated stock quantities back to DATA.txt
+                lines = [f"{code} | {item.name if item else '(removed)'} | {item.qty if item else 0} in stock now", ""]
+                for days in (1, 7, 30):
+                    then = now - timedelta(days=days)
+                    qty = self.ledger.qty_at(code, then)
+                    lines.append(f"{days:>2} days ago: {'-' if qty is None else qty} in stock, "
+                                 f"{self.ledger.sold_between(code, then, now)} sold since")
+                lines.append("")
+                lines.extend(f"{kind:<8} {units:+,}" for kind, units in self.ledger.totals(code).items())
+                return "\n".join(lines)
+            self.run_in_background(item_history_text, show_text, "Reading stock movements...")
+        
+        def show_reorder():
+            def reorder_text():
+                self.bills.sync() # The forecast follows the bills, so other tills' sales count too
+                rows = self.forecast.suggestions(200)
+                if not rows:
+                    return "Nothing needs reordering at the current rate of sale."
+                lines = [f"{'Code':>8} {'Item':<18}{'Stock':>7}{'Per day':>9}{'Days left':>11}{'Reorder at':>12}{'Order':>8}"]
+                for item, velocity, days_left, reorder_point, order_qty in rows:
+                    lines.append(f"{item.code:>8} {item.name[:17]:<18}{item.qty:>7,}{velocity:>9.1f}{days_left:>11.1f}"
+                                 f"{reorder_point:>12,}{order_qty:>8,}")
+                return "\n".join(lines)
+            self.run_in_background(reorder_text, show_text, "Forecasting reorders...")
+        
+        ctk.CTkButton(option_frame, text="Stock Value", command=show_summary,
+                      fg_color="#1f538d", hover_color="#2e6db0").grid(row=0, column=0, padx=(0, 10), sticky="ew")
+        ctk.CTkButton(option_frame, text="Low Stock", command=show_low_stock,
+                      fg_color="#d32f2f", hover_color="#e57373").grid(row=0, column=1, padx=(0, 10), sticky="ew")
+        ctk.CTkButton(option_frame, text="Top 20 by Value", command=show_top_value,
+                      fg_color="#7b1fa2", hover_color="#9c27b0").grid(row=0, column=2, padx=(0, 10), sticky="ew")
+        ctk.CTkButton(option_frame, text="Price Bands", command=show_price_bands,
+                      fg_color="#388e3c", hover_color="#4caf50").grid(row=0, column=3, sticky="ew")
+        ctk.CTkButton(option_frame, text="Item History", command=show_item_history,
+                      fg_color="#f57c00", hover_color="#ff9800").grid(row=1, column=0, columnspan=2, padx=(0, 10),
+                                                                      pady=(10, 0), sticky="ew")
+        ctk.CTkButton(option_frame, text="Reorder Suggestions", command=show_reorder,
+                      fg_color="#00796b", hover_color="#009688").grid(row=1, column=2, columnspan=2, pady=(10, 0), sticky="ew")
+        
+        close_btn = ctk.CTkButton(main_frame, text="Close", command=dialog.destroy,
+                                  fg_color="gray", hover_color="darkgray")
+        close_btn.pack(pady=(0, 20))
+        show_summary()
 
-        except Exception as e:
-            self.show_error_message("Billing Error", f"An error occurred during billing: {e}")
+    def diagnostics_gui(self):
+        """Opens the diagnostics panel: every timer and counter, a cProfile capture and metric export."""
+        dialog = ctk.CTkToplevel(self.root)
+        dialog.geometry("760x600")
+        dialog.title("Diagnostics")
+        dialog.transient(self.root)
+        
+        main_frame = ctk.CTkFrame(dialog, corner_radius=15)
+        main_frame.pack(fill="both", expand=True, padx=20, pady=20)
+        
+        title_label = ctk.CTkLabel(main_frame, text="Diagnostics", font=ctk.CTkFont(size=24, weight="bold"))
+        title_label.pack(pady=(20, 10))
+        
+        option_frame = ctk.CTkFrame(main_frame, fg_color="transparent")
+        option_frame.pack(fill="x", padx=20, pady=10)
+        option_frame.grid_columnconfigure((0, 1, 2, 3), weight=1)
+        
+        results_text = ctk.CTkTextbox(main_frame, height=350, font=ctk.CTkFont(family="Courier", size=12))
+        results_text.pack(fill="both", expand=True, padx=20, pady=10)
+        
+        def show_text(text):
+            results_text.delete("0.0", "end")
+            results_text.insert("0.0", text)
+        
+        def show_metrics():
+            snapshot = METRICS.snapshot()
+            lines = [f"Uptime {snapshot['uptime_s']:,.0f}s", "",
+                     f"{'Timer':<28}{'calls':>9}{'mean ms':>11}{'p50 ms':>11}{'p95 ms':>11}{'max ms':>11}"]
+            for name, stats in sorted(snapshot["timers"].items()):
+                lines.append(f"{name:<28}{stats['count']:>9,}{stats['mean_ms']:>11.3f}{stats['p50_ms']:>11.3f}"
+                             f"{stats['p95_ms']:>11.3f}{stats['max_ms']:>11.3f}")
+            lines += ["", f"{'Counter':<28}{'total':>15}"]
+            lines += [f"{name:<28}{value:>15,}" for name, value in sorted(snapshot["counters"].items())]
+            show_text("\n".join(lines))
+        
+        def toggle_profile():
+            if self.profiler.active:
+                profile_btn.configure(text="Start Profiling")
+                show_text(self.profiler.stop())
+            else:
+                self.profiler.start()
+                profile_btn.configure(text="Stop Profiling")
+                show_text("Profiling the window and the background tasks... use the till, then press Stop Profiling.")
+        
+        def export():
+            path = filedialog.asksaveasfilename(
+                title="Export Metrics", defaultextension=".json",
+                filetypes=[("JSON", "*.json"), ("Prometheus text", "*.prom")]
+            )
+            if path:
+                try:
+                    export_metrics(path)
+                    self.update_status(f"✅ Metrics written to {os.path.basename(path)}")
+                except OSError as e:
+                    self.show_error_message("Export Error", f"Could not write the metrics: {e}")
+        
+        def reset():
+            METRICS.reset()
+            show_metrics()
+        
+        ctk.CTkButton(option_frame, text="Refresh", command=show_metrics,
+                      fg_color="#1f538d", hover_color="#2e6db0").grid(row=0, column=0, padx=(0, 10), sticky="ew")
+        profile_btn = ctk.CTkButton(option_frame, text="Stop Profiling" if self.profiler.active else "Start Profiling",
+                                    command=toggle_profile, fg_color="#7b1fa2", hover_color="#9c27b0")
+        profile_btn.grid(row=0, column=1, padx=(0, 10), sticky="ew")
+        ctk.CTkButton(option_frame, text="Export...", command=export,
+                      fg_color="#388e3c", hover_color="#4caf50").grid(row=0, column=2, padx=(0, 10), sticky="ew")
+        ctk.CTkButton(option_frame, text="Reset", command=reset,
+                      fg_color="#d32f2f", hover_color="#e57373").grid(row=0, column=3, sticky="ew")
+        
+        close_btn = ctk.CTkButton(main_frame, text="Close", command=dialog.destroy,
+                                  fg_color="gray", hover_color="darkgray")
+        close_btn.pack(pady=(0, 20))
+        show_metrics()
 
     def remove_customer_gui(self):
-        """Handles removing a customer from the customer data file."""
+        """Handles removing a customer from the customer registry."""
+        if not self.check_store_ready():
+            return
         customer_name_to_remove_dialog = ctk.CTkInputDialog(text="Enter the customer name you want to remove:", title="Remove Customer")
         customer_name_to_remove = customer_name_to_remove_dialog.get_input()
         if not customer_name_to_remove:
             return # User cancelled
 
-        customers = load_customers()
-        updated_customers = []
-        removed_status = False
-        
-        for line in customers:
-            data = line.strip().split("---- reg on:")
-            # Check if the name part of the line matches the customer to remove
-            if data and data[0].strip().lower() == customer_name_to_remove.strip().lower():
-                removed_status = True
+        def customer_removed(removed_customer):
+            if removed_customer:
+                self.show_success_message("Success", f"Customer: '{customer_name_to_remove}' has been successfully removed from the customer data list.")
             else:
-                updated_customers.append(line)
-
-        if removed_status:
-            save_customers(updated_customers)
-            self.show_success_message("Success", f"Customer: '{customer_name_to_remove}' has been successfully removed from the customer data list.")
-        else:
-            self.show_error_message("Error", f"Customer '{customer_name_to_remove}' not found.")
+                self.show_error_message("Error", f"Customer '{customer_name_to_remove}' not found.")
+        
+        self.run_in_background(lambda: self.undo_log.remove_customer(customer_name_to_remove), customer_removed,
+                               "Removing customer...")
 
     def exit_application(self):
         """Exits the application after confirmation."""
         if messagebox.askyesno("Exit Application", "Are you sure you want to exit?"):
-            self.root.quit()
+            self.store_ready = False # Stops the periodic sync and further changes
+            
+            def closed(_):
+                self.executor.shutdown(wait=True) # Let queued saves finish
+                self.root.quit()
+            
+            def close_stores():
+                # In reverse order of opening; the backend they share goes last
+                self.customers.close()
+                self.bills.close()
+                self.store.close()
+                self.ledger.close()
+                if not self.remote:
+                    self.store.backend.close() # SQLite prunes its change logs here
+            
+            # Fold the journals into DATA.txt and customerData.txt before leaving
+            self.run_in_background(close_stores, closed, "Saving inventory...", lambda error: closed(None))
 
     def run(self):
         """Starts the main application loop."""
@@ -0,0 +1,136 @@
+import heapq
+from bisect import bisect_left, insort
+from difflib import SequenceMatcher
+
+
+def trigrams(text, padded=False):
+    """Returns the set of 3-character substrings of text.
+
+    Padded trigrams also cover the start and end of the text, which gives
+    misspelled queries something to match on.
+    """
+    if padded:
+        text = f"  {text} "
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class NameIndex:
+    """Case-insensitive prefix, substring and fuzzy search over item names.
+
+    Prefix searches bisect a sorted list of (name, code) pairs. Substring and
+    fuzzy searches use a trigram -> codes map to find candidates, so only
+    names sharing trigrams with the query are ever compared. The trigram map
+    is the expensive part, so it is only built when first needed (or by
+    prepare()), not on every load or bulk import.
+    """
+
+    def __init__(self):
+        self.names = {} # item code -> lower-case name
+        self.sorted_names = [] # sorted (lower-case name, code) pairs
+        self.trigram_index = None # trigram -> set of item codes, None until first needed
+
+    def build(self, pairs):
+        """Rebuilds the index from (code, name) pairs in one pass."""
+        self.names = {code: name.lower() for code, name in pairs}
+        self.sorted_names = sorted((name, code) for code, name in self.names.items())
+        self.trigram_index = None
+
+    def prepare(self):
+        """Builds the trigram map now if it isn't built yet. Returns it."""
+        if self.trigram_index is None:
+            trigram_index = {}
+            for code, name in self.names.items():
+                for gram in trigrams(name, padded=True):
+                    trigram_index.setdefault(gram, set()).add(code)
+            self.trigram_index = trigram_index
+        return self.trigram_index
+
+    def add(self, code, name):
+        name = name.lower()
+        self.names[code] = name
+        insort(self.sorted_names, (name, code))
+        if self.trigram_index is not None:
+            for gram in trigrams(name, padded=True):
+                self.trigram_index.setdefault(gram, set()).add(code)
+
+    def remove(self, code):
+        name = self.names.pop(code, None)
+        if name is None:
+            return
+        position = bisect_left(self.sorted_names, (name, code))
+        if position < len(self.sorted_names) and self.sorted_names[position] == (name, code):
+            del self.sorted_names[position]
+        if self.trigram_index is None:
+            return
+        for gram in trigrams(name, padded=True):
+            codes = self.trigram_index.get(gram)
+            if codes is not None:
+                codes.discard(code)
+                if not codes:
+                    del self.trigram_index[gram]
+
+    def prefix(self, query, limit=None):
+        """Returns codes of names starting with query, in name order."""
+        query = query.lower()
+        results = []
+        position = bisect_left(self.sorted_names, (query, float("-inf")))
+        while position < len(self.sorted_names) and self.sorted_names[position][0].startswith(query):
+            results.append(self.sorted_names[position][1])
+            if limit is not None and len(results) >= limit:
+                break
+            position += 1
+        return results
+
+    def substring(self, query, limit=None):
+        """Returns codes of names containing query: names starting with it first, then the rest.
+
+        Queries shorter than three characters have no trigrams to look up and
+        fall back to a prefix search.
+        """
+        query = query.lower()
+        grams = trigrams(query)
+        starts = self.prefix(query, limit)
+        if not grams or (limit is not None and len(starts) >= limit):
+            return starts
+        # Intersect the smallest posting sets first
+        trigram_index = self.prepare()
+        postings = sorted((trigram_index.get(gram, set()) for gram in grams), key=len)
+        candidates = set(postings[0])
+        for codes in postings[1:]:
+            candidates &= codes
+            if not candidates:
+                return []
+        candidates.difference_update(starts)
+        matches = sorted((self.names[code], code) for code in candidates if query in self.names[code])
+        return starts + [code for _, code in matches[:None if limit is None else limit - len(starts)]]
+
+    def fuzzy(self, query, limit=20, cutoff=0.6):
+        """Returns codes of names similar to query (tolerates typos), best match first."""
+        query = query.lower()
+        if not trigrams(query):
+            return self.prefix(query, limit)
+        exact = self.substring(query, limit)
+        if len(exact) >= limit:
+            return exact # Names containing the query beat any near miss
+        postings = sorted((self.prepare().get(gram, set()) for gram in trigrams(query, padded=True)), key=len)
+        # Trigrams shared by a large part of the catalog say little about similarity; skip them
+        # unless the query has nothing more selective
+        common = max(1000, len(self.names) // 20)
+        selective = [codes for codes in postings if len(codes) <= common] or postings[:1]
+        shared = {} # code -> number of trigrams shared with the query
+        for codes in selective:
+            for code in codes:
+                shared[code] = shared.get(code, 0) + 1
+        # Only score the names sharing the most trigrams with the query
+        candidates = heapq.nlargest(max(limit * 10, 100), shared, key=shared.get)
+        scored = []
+        for code in candidates:
+            name = self.names[code]
+            # Compare against the start of the name as well, so "calc" still matches "calculator"
+            score = max(SequenceMatcher(None, query, name).ratio(),
+                        SequenceMatcher(None, query, name[:len(query)]).ratio())
+            if score >= cutoff:
+                scored.append((-score, name, code))
+        scored.sort()
+        fuzzy_codes = [code for _, _, code in scored if code not in exact]
+        return exact + fuzzy_codes[:limit - len(exact)]
@@ -0,0 +1,144 @@
+"""Rendered result pages for the item listings and searches, kept until a change touches them.
+
+A query (the all-items listing or a price range, in one sort order) keeps
+the table rows it has rendered so far and its source iterator, so showing it
+again, or scrolling further, carries on where it left off instead of starting
+over. The cache watches the store: a change drops only the queries that
+showed the item or that it now belongs to. That is only enough because the
+sources resume from the last key they read (see iter_price_range) instead of
+a position, so a change outside a query can't shift what it reads next; an
+item yielded twice anyway is shown once. open and fetch wait for the
+store's lock, which writers hold across fsync and full rewrites, so call them
+from a worker thread rather than the Tk one.
+"""
+import os
+import sys
+import threading
+from collections import OrderedDict
+from itertools import islice
+
+from instrumentation import METRICS
+from storage import format_price
+
+QUERY_CACHE_BYTES = int(os.environ.get("INVENTORY_QUERY_CACHE_MB", "32")) * 2 ** 20
+FETCH_SIZE = 500 # items rendered from the source at a time
+
+
+def render_item(item):
+    """The table row for an item: code, name, price and quantity as shown."""
+    return (item.code, item.name, f"${format_price(item.price)}", item.qty)
+
+
+def row_bytes(row):
+    return sys.getsizeof(row) + sum(sys.getsizeof(field) for field in row) + 64 # 64 for the code in the set
+
+
+class ResultPages:
+    """The rows of one query rendered so far, and the iterator that renders the rest."""
+
+    def __init__(self, key, iterator, matches=None):
+        self.key = key
+        self.rows = [] # rendered rows, in display order
+        self.codes = set() # item codes behind the rows
+        self.iterator = iterator
+        self.exhausted = False
+        self.matches = matches # item -> whether the query includes it; None for uncached queries
+        self.size = 0 # estimated bytes, counted while cached
+
+    def fetch_until(self, count):
+        """Renders rows from the source until count are ready or it runs out. Returns the bytes added."""
+        added = 0
+        while len(self.rows) < count and not self.exhausted:
+            chunk = list(islice(self.iterator, FETCH_SIZE))
+            if len(chunk) < FETCH_SIZE:
+                self.exhausted = True
+            if not chunk:
+                break
+            chunk = [item for item in chunk if item.code not in self.codes] # Repriced further along: listed once
+            if not chunk:
+                continue
+            rows = [render_item(item) for item in chunk]
+            self.codes.update(item.code for item in chunk)
+            self.rows.extend(rows)
+            added += row_bytes(rows[0]) * len(rows)
+        return added
+
+    def touches(self, item):
+        return item.code in self.codes or self.matches(item)
+
+
+class QueryCache:
+    """LRU cache of ResultPages keyed by query, capped at max_bytes and invalidated by store changes."""
+
+    def __init__(self, store, max_bytes=QUERY_CACHE_BYTES):
+        self.store = store
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict() # key -> ResultPages, least recently used first
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.lock = threading.Lock()
+        store.watchers.append(self)
+
+    def open(self, key, source, matches):
+        """Returns the cached pages for key, or new ones reading from source() (an iterator of items)."""
+        with self.lock:
+            pages = self.entries.get(key)
+            if pages is not None:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                METRICS.add("query_cache.hits")
+                return pages
+            self.misses += 1
+        METRICS.add("query_cache.misses")
+        with self.store.lock: # Sources may read the store; always take its lock before ours
+            pages = ResultPages(key, iter(source()), matches)
+            with self.lock:
+                self.entries[key] = pages
+        return pages
+
+    def fetch(self, pages, count):
+        """Renders pages up to count rows, then evicts the least recently used queries past the memory cap."""
+        with self.store.lock: # Changes wait, so none can slip in between reading an item and noting its code
+            added = pages.fetch_until(count)
+        with self.lock:
+            if self.entries.get(pages.key) is not pages:
+                return # Invalidated or evicted meanwhile
+            pages.size += added
+            self.size += added
+            while self.size > self.max_bytes and self.entries:
+                self._drop(next(iter(self.entries)))
+
+    def _drop(self, key):
+        self.size -= self.entries.pop(key).size
+
+    def _invalidate(self, touched):
+        with self.lock:
+            stale = [key for key, pages in self.entries.items() if touched(pages)]
+            for key in stale:
+                self._drop(key)
+            self.invalidations += len(stale)
+        if stale:
+            METRICS.add("query_cache.invalidations", len(stale))
+
+    def put(self, item):
+        """Drops the queries that showed the item or that it now belongs to."""
+        self._invalidate(lambda pages: pages.touches(item))
+
+    def delete(self, code):
+        """Drops the queries that showed the removed item, and those still reading a source that may hold it."""
+        self._invalidate(lambda pages: code in pages.codes or not pages.exhausted)
+
+    def reset(self):
+        """Drops everything after a load or a bulk change."""
+        with self.lock:
+            self.invalidations += len(self.entries)
+            self.entries = OrderedDict()
+            self.size = 0
+
+    def stats(self):
+        """Returns hits, misses, invalidations, cached queries and their estimated bytes."""
+        with self.lock:
+            return {"hits": self.hits, "misses": self.misses, "invalidations": self.invalidations,
+                    "queries": len(self.entries), "bytes": self.size}
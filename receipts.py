@@ -0,0 +1,221 @@
+"""Receipts rendered from bill records: plain text, HTML and PDF, one at a time or a batch into a zip archive.
+
+Run: python receipts.py export DAYS FILE [text|html|pdf]
+
+DAYS is a day (2025-07-14), a month (2025-07) or a range (2025-07-01..2025-07-14).
+
+Each layout is a ReceiptTemplate: format strings for the header, one bill
+line and the footer, compiled to bound str.format calls once at import.
+Amounts are formatted from whole cents, so rendering a receipt is a few
+format calls with no Decimal arithmetic. Batch exports stream: bills are
+read a day at a time and each receipt is rendered and written to the archive
+before the next, so a month of bills never sits in memory as rendered text.
+"""
+import html
+import os
+import sys
+import zipfile
+from datetime import date, datetime, timedelta
+
+from bill_store import BillStore
+from inventory_store import to_cents
+from storage import format_price
+
+# PDF receipts are laid out for 80 mm roll paper in 8 pt Courier: 42 characters a line
+PDF_PAGE_WIDTH = 226 # points
+PDF_MARGIN = 12
+PDF_FONT_SIZE = 8
+PDF_LEADING = 10
+PDF_MAX_LINES = 1000 # lines per page before a long receipt continues on the next
+PDF_COLUMNS = 42
+
+
+def format_amount(cents):
+    """Formats cents as an amount with two places, like the Decimal totals: "12.50"."""
+    return f"{cents // 100}.{cents % 100:02d}"
+
+
+class ReceiptTemplate:
+    """A receipt layout: format strings for the header, each bill line and the footer, compiled once.
+
+    The header and footer get id, customer, date and total; each line gets
+    code, name, price, qty and amount. escape is applied to the customer and
+    item names (HTML escaping for the HTML layout).
+    """
+
+    def __init__(self, kind, extension, header, line, footer, escape=str):
+        self.kind = kind
+        self.extension = extension
+        self.header = header.format
+        self.line = line.format
+        self.footer = footer.format
+        self.escape = escape
+
+    def render(self, bill):
+        """Returns the receipt of a bill as text."""
+        escape = self.escape
+        fields = {"id": bill.bill_id, "customer": escape(bill.customer), "total": f"{bill.total:.2f}",
+                  "date": datetime.fromisoformat(bill.created).strftime("%m/%d/%Y, %H:%M:%S")}
+        parts = [self.header(**fields)]
+        line = self.line
+        for code, name, price, qty in bill.lines:
+            parts.append(line(code=code, name=escape(name), price=format_price(price), qty=qty,
+                              amount=format_amount(to_cents(price) * qty)))
+        parts.append(self.footer(**fields))
+        return "".join(parts)
+
+    def to_bytes(self, bill):
+        """Returns the receipt as the contents of a file."""
+        return self.render(bill).encode("utf-8")
+
+
+class PDFReceiptTemplate(ReceiptTemplate):
+    """A fixed-width receipt layout written out as a PDF page in Courier."""
+
+    def to_bytes(self, bill):
+        return pdf_document(self.render(bill).splitlines())
+
+
+def pdf_escape(line):
+    return line.encode("cp1252", "replace").replace(b"\\", b"\\\\").replace(b"(", b"\\(").replace(b")", b"\\)")
+
+
+def pdf_document(lines):
+    """Builds a PDF of lines of monospace text, one roll-paper page per PDF_MAX_LINES lines.
+
+    Courier is one of the standard PDF fonts, so nothing is embedded and a
+    receipt comes to a couple of kilobytes.
+    """
+    pages = [lines[start:start + PDF_MAX_LINES] for start in range(0, len(lines), PDF_MAX_LINES)] or [[]]
+    objects = [b"<< /Type /Catalog /Pages 2 0 R >>",
+               b"<< /Type /Pages /Kids [%s] /Count %d >>" % (
+                   b" ".join(b"%d 0 R" % (4 + 2 * number) for number in range(len(pages))), len(pages)),
+               b"<< /Type /Font /Subtype /Type1 /BaseFont /Courier /Encoding /WinAnsiEncoding >>"]
+    for number, page in enumerate(pages):
+        height = 2 * PDF_MARGIN + max(len(page), 1) * PDF_LEADING
+        stream = b"BT /F1 %d Tf %d TL %d %d Td " % (PDF_FONT_SIZE, PDF_LEADING, PDF_MARGIN,
+                                                    height - PDF_MARGIN - PDF_FONT_SIZE)
+        stream += b"".join(b"(" + pdf_escape(line) + b") Tj T* " for line in page) + b"ET"
+        objects.append(b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 %d %d] /Resources << /Font << /F1 3 0 R >> >> "
+                       b"/Contents %d 0 R >>" % (PDF_PAGE_WIDTH, height, 5 + 2 * number))
+        objects.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream))
+    out = [b"%PDF-1.4\n"]
+    offsets = []
+    size = len(out[0])
+    for number, body in enumerate(objects, 1):
+        offsets.append(size)
+        chunk = b"%d 0 obj\n%s\nendobj\n" % (number, body)
+        out.append(chunk)
+        size += len(chunk)
+    out.append(b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1))
+    out.extend(b"%010d 00000 n \n" % offset for offset in offsets)
+    out.append(b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, size))
+    return b"".join(out)
+
+
+RULE = "-" * PDF_COLUMNS
+
+TEMPLATES = {
+    # The receipt the Sales History dialog shows
+    "text": ReceiptTemplate(
+        "text", ".txt",
+        header="--- Bill #{id} for {customer} ---\nDate: {date}\n\n",
+        line="{name} ({code}) - ${price} x {qty} = ${amount}\n",
+        footer="\nTotal Bill: ${total}\n"),
+    "html": ReceiptTemplate(
+        "html", ".html",
+        header='<!DOCTYPE html>\n<html><head><meta charset="utf-8"><title>Bill #{id}</title></head><body>\n'
+               "<h2>Bill #{id}</h2>\n<p>{customer}<br>{date}</p>\n<table>\n"
+               "<tr><th>Item</th><th>Code</th><th>Price</th><th>Qty</th><th>Amount</th></tr>\n",
+        line="<tr><td>{name}</td><td>{code}</td><td>${price}</td><td>{qty}</td><td>${amount}</td></tr>\n",
+        footer='<tr><th colspan="4">Total</th><th>${total}</th></tr>\n</table>\n</body></html>\n',
+        escape=html.escape),
+    # Two lines per item: the name, then code, quantity, unit price and amount in columns
+    "pdf": PDFReceiptTemplate(
+        "pdf", ".pdf",
+        header="Bill #{id:<15}{date:>21}\nCustomer: {customer:.32}\n" + RULE + "\n",
+        line="{name:.42}\n  #{code:<9}{qty:>5} x {price:>10}{amount:>12}\n",
+        footer=RULE + "\nTOTAL{total:>37}\n"),
+}
+
+
+def template_for(kind):
+    """Returns the ReceiptTemplate for "text", "html" or "pdf"."""
+    try:
+        return TEMPLATES[kind]
+    except KeyError:
+        raise ValueError(f"Unknown receipt format '{kind}'. Use text, html or pdf.") from None
+
+
+def render_receipt(bill, kind="text"):
+    """Builds the receipt of a bill as text in the given layout."""
+    return template_for(kind).render(bill)
+
+
+def parse_days(text):
+    """Parses a day ("2025-07-14"), a month ("2025-07") or a range ("FROM..TO") into (first day, last day).
+
+    Raises ValueError for anything else.
+    """
+    text = text.strip()
+    if ".." in text:
+        start, end = text.split("..", 1)
+        first, last = parse_days(start)[0], parse_days(end)[1]
+    elif len(text) == 7:
+        first = date.fromisoformat(text + "-01")
+        last = (first + timedelta(days=31)).replace(day=1) - timedelta(days=1)
+    else:
+        first = last = date.fromisoformat(text)
+    if last < first:
+        raise ValueError(f"'{text}' ends before it starts.")
+    return first, last
+
+
+def bills_between(bills, first, last):
+    """Yields the bills of each day from first to last (dates), a day at a time, oldest first."""
+    day = first
+    while day <= last:
+        yield from bills.for_day(day.isoformat())
+        day += timedelta(days=1)
+
+
+def iter_receipts(bills, kind="text"):
+    """Renders the receipts of bills (any iterable) one at a time. Yields (file name, bill, contents as bytes)."""
+    template = template_for(kind)
+    for bill in bills:
+        yield f"bill-{bill.bill_id:06d}{template.extension}", bill, template.to_bytes(bill)
+
+
+def export_receipts(bills, path, kind="text"):
+    """Streams the receipts of bills into one zip archive at path, written atomically. Returns the number of receipts."""
+    count = 0
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        with zipfile.ZipFile(f, "w", zipfile.ZIP_DEFLATED) as archive:
+            for name, bill, data in iter_receipts(bills, kind):
+                # Each entry is dated with its bill
+                info = zipfile.ZipInfo(name, datetime.fromisoformat(bill.created).timetuple()[:6])
+                info.compress_type = zipfile.ZIP_DEFLATED
+                archive.writestr(info, data)
+                count += 1
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    return count
+
+
+def main():
+    """Command line entry point: python receipts.py export DAYS FILE [text|html|pdf]"""
+    if len(sys.argv) not in (4, 5) or sys.argv[1] != "export":
+        print("Usage: python receipts.py export DAYS FILE [text|html|pdf]")
+        return 1
+    first, last = parse_days(sys.argv[2])
+    path = sys.argv[3]
+    kind = sys.argv[4] if len(sys.argv) == 5 else "text"
+    bills = BillStore().load()
+    count = export_receipts(bills_between(bills, first, last), path, kind)
+    print(f"Exported {count:,} {kind} receipts from {first} to {last} to {path}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,73 @@
+"""Cold-start benchmark for the GUI: import time, time to an interactive window, time to data ready.
+
+Run: python startup_benchmark.py [runs] [items]
+
+Every run is a fresh Python process started in a throwaway directory holding a
+DATA.txt of the given size, so nothing is shared between runs but the OS file
+cache. Needs a display (the window is really opened, then closed once loaded).
+"""
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmark import generate_rows
+from storage import FlatFileBackend
+
+
+def child():
+    """One cold start, run inside the benchmark's subprocess. Prints the times as JSON."""
+    times = {"start": time.time()}
+    import modern_gui
+    times["imported"] = time.time()
+    app = modern_gui.ModernInventoryApp()
+    app.root.update() # Draw the window: from here on it reacts to the user
+    times["interactive"] = time.time()
+    on_store_loaded = app.on_store_loaded
+
+    def loaded(stores):
+        on_store_loaded(stores)
+        times["loaded"] = time.time()
+        app.root.quit()
+
+    app.on_store_loaded = loaded
+    app.root.mainloop()
+    print(json.dumps(times), flush=True)
+    os._exit(0) # Skip waiting for the search indexes still warming up
+
+
+def run_once(directory):
+    """Starts one cold GUI process and returns its phase times in seconds, from process launch."""
+    launched = time.time()
+    output = subprocess.run([sys.executable, os.path.abspath(__file__), "--child"], cwd=directory,
+                            capture_output=True, text=True, check=True).stdout
+    times = json.loads(output.strip().splitlines()[-1])
+    return {
+        "interpreter": times["start"] - launched,
+        "import": times["imported"] - times["start"],
+        "first interactive": times["interactive"] - launched,
+        "data ready": times["loaded"] - launched,
+    }
+
+
+def main():
+    if sys.argv[1:] == ["--child"]:
+        child()
+        return 0
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    item_count = int(sys.argv[2]) if len(sys.argv) > 2 else 100000
+    with tempfile.TemporaryDirectory() as directory:
+        FlatFileBackend(os.path.join(directory, "DATA.txt"), os.path.join(directory, "customerData.txt"),
+                        os.path.join(directory, "bills.jsonl")).save_items(generate_rows(item_count))
+        results = [run_once(directory) for _ in range(runs)]
+    print(f"startup  n={item_count:,} items, median of {runs} cold runs")
+    for phase in results[0]:
+        values = [result[phase] for result in results]
+        print(f"  {phase:<18} {statistics.median(values) * 1000:8.1f} ms  (min {min(values) * 1000:.1f} ms)")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,181 @@
+import threading
+from bisect import bisect_right
+from datetime import date, datetime, timedelta
+
+from storage import get_backend
+
+# Movement kinds
+SALE = "sale" # sold on a bill
+ADJUST = "adjust" # quantity changed by hand (stock take, damage, delivery)
+ADD = "add" # new item, with its opening stock
+REMOVE = "remove" # item deleted, with whatever stock it still had
+
+KINDS = (SALE, ADJUST, ADD, REMOVE)
+
+
+def timestamp(when=None):
+    """Returns when (a datetime, a date meaning its end, an ISO string or None for now) as an ISO timestamp."""
+    if when is None:
+        when = datetime.now()
+    if isinstance(when, datetime):
+        return when.isoformat(timespec="seconds")
+    if isinstance(when, date):
+        return when.isoformat() + "T23:59:59" # The end of that day
+    return when
+
+
+class Movement:
+    """One stock change: when, which item, what kind, by how much, and the stock left after it."""
+
+    __slots__ = ("time", "code", "kind", "delta", "balance")
+
+    def __init__(self, time, code, kind, delta, balance):
+        self.time = time # ISO timestamp
+        self.code = code
+        self.kind = kind
+        self.delta = delta # units in (+) or out (-)
+        self.balance = balance # stock after the movement
+
+    @classmethod
+    def from_record(cls, record):
+        time, code, kind, delta, balance = record
+        if kind not in KINDS:
+            raise ValueError(f"Unknown movement kind '{kind}'.")
+        return cls(str(time), int(code), kind, int(delta), int(balance))
+
+    def to_record(self):
+        return [self.time, self.code, self.kind, self.delta, self.balance]
+
+
+class ItemHistory:
+    """The movements of one item, as parallel lists ordered by time.
+
+    Every movement keeps the stock balance after it and the units sold up to
+    it, so both are checkpoints: a point-in-time query is one bisect on the
+    times, never a replay of the deltas.
+    """
+
+    __slots__ = ("times", "balances", "sold_totals", "opening", "totals")
+
+    def __init__(self, opening):
+        self.times = []
+        self.balances = []
+        self.sold_totals = [] # units sold up to and including each movement
+        self.opening = opening # stock before the first recorded movement
+        self.totals = dict.fromkeys(KINDS, 0) # kind -> net units moved
+
+    def append(self, movement):
+        sold = self.sold_totals[-1] if self.sold_totals else 0
+        if movement.kind == SALE:
+            sold -= movement.delta
+        self.times.append(movement.time)
+        self.balances.append(movement.balance)
+        self.sold_totals.append(sold)
+        self.totals[movement.kind] += movement.delta
+
+    def balance_at(self, time):
+        position = bisect_right(self.times, time)
+        return self.balances[position - 1] if position else self.opening
+
+    def sold_by(self, time):
+        position = bisect_right(self.times, time)
+        return self.sold_totals[position - 1] if position else 0
+
+
+class StockLedger:
+    """Append-only record of every stock movement, with running per-item and per-day aggregates.
+
+    Each terminal (or the inventory server) records the movements it makes;
+    they are appended to storage as they happen and never rewritten. The
+    aggregates are updated movement by movement, so queries cost a lookup or
+    a bisect however long the history gets.
+    """
+
+    def __init__(self, backend=None):
+        self.backend = backend or get_backend()
+        self.histories = {} # item code -> ItemHistory
+        self.daily_sold = {} # "YYYY-MM-DD" -> {item code: units sold that day}
+        self.count = 0
+        self.lock = threading.RLock()
+
+    def load(self):
+        """Loads every stored movement and rebuilds the aggregates."""
+        with self.lock:
+            self.histories = {}
+            self.daily_sold = {}
+            self.count = 0
+            movements = []
+            for record in self.backend.load_movements():
+                try:
+                    movements.append(Movement.from_record(record))
+                except (ValueError, TypeError):
+                    continue # Skip damaged records
+            # Terminals append in their own order; a stable sort by time puts them in step
+            movements.sort(key=lambda movement: movement.time)
+            for movement in movements:
+                self._index(movement)
+        return self
+
+    def _index(self, movement):
+        history = self.histories.get(movement.code)
+        if history is None:
+            history = self.histories[movement.code] = ItemHistory(movement.balance - movement.delta)
+        if history.times and movement.time < history.times[-1]:
+            movement.time = history.times[-1] # A clock that went backwards; keep each history ordered
+        history.append(movement)
+        if movement.kind == SALE:
+            day = self.daily_sold.setdefault(movement.time[:10], {})
+            day[movement.code] = day.get(movement.code, 0) - movement.delta
+        self.count += 1
+
+    def __len__(self):
+        return self.count
+
+    def close(self):
+        pass # Movements are written as they happen; the backend is closed by its owner
+
+    def record(self, changes, when=None):
+        """Records (code, kind, delta, balance) changes made together, with one write. Returns the Movements."""
+        time = timestamp(when)
+        movements = [Movement(time, code, kind, delta, balance) for code, kind, delta, balance in changes]
+        if not movements:
+            return movements
+        with self.lock:
+            self.backend.append_movements([movement.to_record() for movement in movements])
+            for movement in movements:
+                self._index(movement)
+        return movements
+
+    def qty_at(self, code, when):
+        """Returns the stock of an item at a point in time, or None if no movement of it was ever recorded."""
+        with self.lock:
+            history = self.histories.get(code)
+            return None if history is None else history.balance_at(timestamp(when))
+
+    def sold_between(self, code, start, end=None):
+        """Returns the units of an item sold after start and up to end (default now)."""
+        with self.lock:
+            history = self.histories.get(code)
+            if history is None:
+                return 0
+            return history.sold_by(timestamp(end)) - history.sold_by(timestamp(start))
+
+    def units_sold(self, days=7, until=None):
+        """Returns {code: units sold} over the last days days, up to and including until (default today)."""
+        until = until or date.today()
+        if isinstance(until, str):
+            until = date.fromisoformat(until[:10])
+        elif isinstance(until, datetime):
+            until = until.date()
+        sold = {}
+        with self.lock:
+            for offset in range(days):
+                for code, units in self.daily_sold.get((until - timedelta(days=offset)).isoformat(), {}).items():
+                    sold[code] = sold.get(code, 0) + units
+        return sold
+
+    def totals(self, code):
+        """Returns {kind: net units} moved for an item; a negative ADJUST total is shrinkage."""
+        with self.lock:
+            history = self.histories.get(code)
+            return dict(history.totals) if history else dict.fromkeys(KINDS, 0)
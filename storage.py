@@ -0,0 +1,677 @@
+import json
+import os
+import sqlite3
+import sys
+import threading
+
+from instrumentation import METRICS
+from journal import FileLock
+
+# --- File Paths ---
+ITEMS_FILE = "DATA.txt"
+CUSTOMERS_FILE = "customerData.txt"
+BILLS_FILE = "bills.jsonl"
+MOVEMENTS_FILE = "stock_movements.jsonl"
+SQLITE_FILE = os.environ.get("INVENTORY_DB", "inventory.db")
+
+# --- Storage Configuration ---
+# "flat" keeps the #-delimited text files, "sqlite" uses SQLITE_FILE
+STORAGE_BACKEND = os.environ.get("INVENTORY_BACKEND", "flat")
+
+# DATA.txt files this big or bigger are memory-mapped and decoded as they are read (see mapped_items.py)
+MAPPED_LOAD_BYTES = int(os.environ.get("INVENTORY_MAPPED_LOAD_MB", "64")) * 2 ** 20
+
+CUSTOMER_SEPARATOR = " ---- reg on: "
+
+
+def format_price(price):
+    """Formats a price the way DATA.txt stores it (whole prices without a trailing '.0')."""
+    if float(price).is_integer():
+        return str(int(price))
+    return str(price)
+
+
+class FlatFileBackend:
+    """Reads and writes the #-delimited DATA.txt and customerData.txt files."""
+
+    supports_row_updates = False # Every change rewrites the whole file
+
+    def __init__(self, items_file=ITEMS_FILE, customers_file=CUSTOMERS_FILE, bills_file=BILLS_FILE,
+                 movements_file=MOVEMENTS_FILE):
+        self.items_file = items_file
+        self.customers_file = customers_file
+        self.bills_file = bills_file
+        self.movements_file = movements_file
+        # Held while a bill id is picked and the bill appended, so tills sharing bills.jsonl never pick the same id
+        self.bills_lock = FileLock(bills_file + ".lock")
+        self.last_bill_id = 0 # highest bill id in bills.jsonl, voided bills included
+        self.bills_read = 0 # bytes of bills.jsonl seen so far
+        self.new_bills = [] # records other tills appended, read but not yet taken by read_new_bills
+
+    def load_items(self):
+        """Loads items from DATA.txt. Format: code#name#price#quantity
+
+        Files of MAPPED_LOAD_BYTES or more come back as a MappedItemFile, which
+        yields the same rows without building the list of all of them first.
+        InventoryStore.load still makes an Item of every row, so the map saves
+        the row list and the read buffer, not the memory of the catalog.
+        """
+        if not os.path.exists(self.items_file):
+            return []
+        if os.path.getsize(self.items_file) >= MAPPED_LOAD_BYTES:
+            return self.map_items()
+        return self.read_items()
+
+    def read_items(self):
+        """Reads DATA.txt into a list of [code, name, price, quantity] rows, whatever its size."""
+        if not os.path.exists(self.items_file):
+            return []
+        METRICS.add("file.bytes_read", os.path.getsize(self.items_file))
+        items = []
+        with open(self.items_file, "r") as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    data = line.split("#")
+                    if len(data) == 4:
+                        items.append(data)
+                    elif len(data) == 3:
+                        # Old format without quantity, add a default quantity '0'
+                        items.append(data + ['0'])
+        METRICS.add("file.rows_parsed", len(items))
+        return items
+
+    def map_items(self):
+        """Opens DATA.txt as a MappedItemFile: an offset index now, rows decoded only when they are read."""
+        from mapped_items import MappedItemFile # NumPy is only imported when a file is mapped
+        return MappedItemFile(self.items_file)
+
+    def save_items(self, items):
+        """Saves items back to DATA.txt. Writes a temp file first so a crash can't truncate the data."""
+        temp_file = self.items_file + ".tmp"
+        with open(temp_file, "w") as f:
+            for item in items:
+                f.write("#".join(map(str, item)) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+            METRICS.add("file.bytes_written", f.tell())
+        os.replace(temp_file, self.items_file)
+
+    def load_customers(self):
+        """Loads customer data from customerData.txt. Format: Name ---- reg on: Date"""
+        if not os.path.exists(self.customers_file):
+            return []
+        METRICS.add("file.bytes_read", os.path.getsize(self.customers_file))
+        customers = []
+        with open(self.customers_file, "r") as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    customers.append(line)
+        return customers
+
+    def save_customers(self, customers):
+        """Saves customer data back to customerData.txt, through a temp file like save_items."""
+        temp_file = self.customers_file + ".tmp"
+        with open(temp_file, "w") as f:
+            for customer_line in customers:
+                f.write(customer_line + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+            METRICS.add("file.bytes_written", f.tell())
+        os.replace(temp_file, self.customers_file)
+
+    def load_bills(self):
+        """Loads bill records (dicts) from bills.jsonl, one JSON object per line, leaving out voided bills."""
+        bills = {}
+        with self.bills_lock:
+            records = self._load_jsonl(self.bills_file)
+            self.bills_read = os.path.getsize(self.bills_file) if records else 0
+            self.new_bills = []
+        for record in records:
+            if "void" in record:
+                bills.pop(record["void"], None)
+            else:
+                bills[record.get("id")] = record
+                if isinstance(record.get("id"), int):
+                    self.last_bill_id = max(self.last_bill_id, record["id"])
+        return list(bills.values())
+
+    def _read_new_bills(self):
+        """Catches up with the bills other tills appended since we last looked. Call with bills_lock held."""
+        if not os.path.exists(self.bills_file):
+            return
+        with open(self.bills_file, "rb") as f:
+            f.seek(self.bills_read)
+            data = f.read()
+        complete = data[:data.rfind(b"\n") + 1] # A torn last line is left for the next look
+        METRICS.add("file.bytes_read", len(complete))
+        for line in complete.splitlines():
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            self.new_bills.append(record)
+            if isinstance(record.get("id"), int):
+                self.last_bill_id = max(self.last_bill_id, record["id"])
+        self.bills_read += len(complete)
+
+    def read_new_bills(self):
+        """Returns the bill and {"void": id} records other tills appended since we last looked, oldest first."""
+        with self.bills_lock:
+            self._read_new_bills()
+            records, self.new_bills = self.new_bills, []
+        return records
+
+    def append_new_bill(self, bill):
+        """Gives a new bill record the next free id and appends it, under the bills lock. Returns the id."""
+        with self.bills_lock:
+            self._read_new_bills()
+            bill["id"] = self.last_bill_id + 1
+            self._append_bills([bill])
+            self.last_bill_id = bill["id"]
+        return bill["id"]
+
+    def append_bill(self, bill):
+        """Appends a bill record that already has its id (a restored bill) to bills.jsonl and fsyncs it."""
+        with self.bills_lock:
+            self._read_new_bills()
+            self._append_bills([bill])
+
+    def remove_bill(self, bill_id):
+        """Voids a bill by appending {"void": id}; appending the bill again restores it."""
+        with self.bills_lock:
+            self._read_new_bills()
+            self._append_bills([{"void": bill_id}])
+
+    def _append_bills(self, records):
+        self.bills_read += self._append_jsonl(self.bills_file, records)
+
+    def load_movements(self):
+        """Loads stock movement records ([time, code, kind, delta, balance]) from stock_movements.jsonl."""
+        return self._load_jsonl(self.movements_file)
+
+    def append_movements(self, movements):
+        """Appends stock movement records to stock_movements.jsonl with one write and fsync."""
+        self._append_jsonl(self.movements_file, movements)
+
+    @staticmethod
+    def _load_jsonl(path):
+        if not os.path.exists(path):
+            return []
+        METRICS.add("file.bytes_read", os.path.getsize(path))
+        records = []
+        with open(path, "r") as f:
+            for line in f:
+                if not line.endswith("\n"):
+                    break # Torn write from a crash, the record was never committed
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    continue # Skip damaged lines
+        METRICS.add("file.rows_parsed", len(records))
+        return records
+
+    @staticmethod
+    def _append_jsonl(path, records):
+        data = "".join(json.dumps(record, separators=(",", ":")) + "\n" for record in records).encode("utf-8")
+        METRICS.add("file.bytes_written", len(data))
+        with open(path, "ab") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        return len(data)
+
+    def close(self):
+        pass
+
+
+class SQLiteBackend:
+    """Keeps items and customers in an indexed SQLite database."""
+
+    supports_row_updates = True # Changes are single-row INSERT/UPDATE/DELETE statements
+
+    def __init__(self, db_file=SQLITE_FILE):
+        self.db_file = db_file
+        # The GUI hands storage work to worker threads, so allow use across threads
+        self.conn = sqlite3.connect(db_file, check_same_thread=False)
+        self.lock = threading.RLock() # One statement at a time on the shared connection
+        self.bill_seq = 0 # latest bill change seen by load_bills or read_new_bills
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.create_tables()
+
+    def create_tables(self):
+        with self.conn:
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS items ("
+                "code INTEGER PRIMARY KEY, name TEXT NOT NULL, price REAL NOT NULL, qty INTEGER NOT NULL)"
+            )
+            self.conn.execute("CREATE INDEX IF NOT EXISTS items_name ON items (name COLLATE NOCASE)")
+            self.conn.execute("CREATE INDEX IF NOT EXISTS items_price ON items (price)")
+            # Every item change is logged so other terminals can refresh just the changed rows
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS item_changes (seq INTEGER PRIMARY KEY AUTOINCREMENT, code INTEGER NOT NULL)"
+            )
+            for event, row in [("INSERT", "new"), ("UPDATE", "new"), ("DELETE", "old")]:
+                self.conn.execute(
+                    f"CREATE TRIGGER IF NOT EXISTS items_{event.lower()}_logged AFTER {event} ON items "
+                    f"BEGIN INSERT INTO item_changes (code) VALUES ({row}.code); END"
+                )
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS customers ("
+                "id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT NOT NULL, registered TEXT NOT NULL, "
+                "customer_key TEXT NOT NULL DEFAULT '')"
+            )
+            columns = [row[1] for row in self.conn.execute("PRAGMA table_info(customers)")]
+            if "customer_key" not in columns:
+                # Databases imported before customer keys existed
+                self.conn.execute("ALTER TABLE customers ADD COLUMN customer_key TEXT NOT NULL DEFAULT ''")
+                self.conn.executemany(
+                    "UPDATE customers SET customer_key = ? WHERE id = ?",
+                    [(normalize_name(name), customer_id)
+                     for customer_id, name in self.conn.execute("SELECT id, name FROM customers").fetchall()]
+                )
+            self.conn.execute("DROP INDEX IF EXISTS customers_name")
+            self.conn.execute("CREATE INDEX IF NOT EXISTS customers_key ON customers (customer_key)")
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS bills ("
+                "id INTEGER PRIMARY KEY, customer TEXT NOT NULL, customer_key TEXT NOT NULL, "
+                "created TEXT NOT NULL, total REAL NOT NULL)"
+            )
+            self.conn.execute("CREATE INDEX IF NOT EXISTS bills_customer ON bills (customer_key)")
+            self.conn.execute("CREATE INDEX IF NOT EXISTS bills_created ON bills (created)")
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS bill_lines ("
+                "bill_id INTEGER NOT NULL REFERENCES bills (id), code INTEGER NOT NULL, name TEXT NOT NULL, "
+                "price REAL NOT NULL, qty INTEGER NOT NULL)"
+            )
+            self.conn.execute("CREATE INDEX IF NOT EXISTS bill_lines_bill ON bill_lines (bill_id)")
+            # Ids of voided bills stay taken, so undoing the void can put the bill back under its own id
+            self.conn.execute("CREATE TABLE IF NOT EXISTS voided_bills (id INTEGER PRIMARY KEY)")
+            # Bills added and voided are logged too, so each till can pick up the others' sales
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS bill_changes (seq INTEGER PRIMARY KEY AUTOINCREMENT, bill_id INTEGER NOT NULL)"
+            )
+            for event, row in [("INSERT", "new"), ("DELETE", "old")]:
+                self.conn.execute(
+                    f"CREATE TRIGGER IF NOT EXISTS bills_{event.lower()}_logged AFTER {event} ON bills "
+                    f"BEGIN INSERT INTO bill_changes (bill_id) VALUES ({row}.id); END"
+                )
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS stock_movements ("
+                "seq INTEGER PRIMARY KEY, time TEXT NOT NULL, code INTEGER NOT NULL, kind TEXT NOT NULL, "
+                "delta INTEGER NOT NULL, balance INTEGER NOT NULL)"
+            )
+
+    @staticmethod
+    def _row(code, name, price, qty):
+        return [str(code), name, format_price(price), str(qty)]
+
+    def load_items(self):
+        """Loads all items as [code, name, price, qty] rows of strings, ordered by code."""
+        with self.lock:
+            rows = [self._row(*row) for row in self.conn.execute("SELECT code, name, price, qty FROM items ORDER BY code")]
+        METRICS.add("db.rows_read", len(rows))
+        return rows
+
+    def save_items(self, items):
+        """Replaces the whole item table in one transaction."""
+        with self.lock, self.conn:
+            self.conn.execute("DELETE FROM items")
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO items (code, name, price, qty) VALUES (?, ?, ?, ?)",
+                ((int(item[0]), item[1], float(item[2]), int(item[3])) for item in items)
+            )
+            # Terminals behind this point reload everything rather than refresh row by row
+            self.conn.execute("DELETE FROM item_changes")
+
+    def apply_item_changes(self, changed=(), removed=()):
+        """Writes changed [code, name, price, qty] rows and deletes removed codes in one transaction."""
+        with self.lock, self.conn:
+            self.conn.executemany(
+                "INSERT INTO items (code, name, price, qty) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(code) DO UPDATE SET name = excluded.name, price = excluded.price, qty = excluded.qty",
+                ((int(row[0]), row[1], float(row[2]), int(row[3])) for row in changed)
+            )
+            self.conn.executemany("DELETE FROM items WHERE code = ?", ((int(code),) for code in removed))
+
+    def insert_item(self, row):
+        """Inserts a new [code, name, price, qty] row. Returns False if the code is already taken."""
+        with self.lock, self.conn:
+            return self.conn.execute(
+                "INSERT OR IGNORE INTO items (code, name, price, qty) VALUES (?, ?, ?, ?)",
+                (int(row[0]), row[1], float(row[2]), int(row[3]))
+            ).rowcount == 1
+
+    def insert_items(self, rows):
+        """Inserts new [code, name, price, qty] rows in one transaction. Returns the codes that were already taken."""
+        with self.lock, self.conn:
+            self.conn.execute("BEGIN IMMEDIATE") # No other terminal can take a code between the check and the insert
+            codes = [int(row[0]) for row in rows]
+            taken = []
+            for start in range(0, len(codes), 500):
+                chunk = codes[start:start + 500]
+                taken.extend(code for code, in self.conn.execute(
+                    f"SELECT code FROM items WHERE code IN ({', '.join('?' * len(chunk))})", chunk
+                ))
+            taken_codes = set(taken)
+            self.conn.executemany(
+                "INSERT INTO items (code, name, price, qty) VALUES (?, ?, ?, ?)",
+                ((int(row[0]), row[1], float(row[2]), int(row[3])) for row in rows if int(row[0]) not in taken_codes)
+            )
+        return taken
+
+    def replace_item(self, old_row, new_row):
+        """Compare-and-swap: writes new_row only if the stored row still equals old_row. Returns True if written."""
+        with self.lock, self.conn:
+            return self.conn.execute(
+                "UPDATE items SET name = ?, price = ?, qty = ? WHERE code = ? AND name = ? AND price = ? AND qty = ?",
+                (new_row[1], float(new_row[2]), int(new_row[3]),
+                 int(old_row[0]), old_row[1], float(old_row[2]), int(old_row[3]))
+            ).rowcount == 1
+
+    def decrement_stock(self, quantities):
+        """Atomically takes {code: qty} out of stock if every line has enough.
+
+        Returns the codes that were short; nothing is changed then.
+        """
+        with self.lock, self.conn:
+            short = [code for code, qty in quantities.items() if self.conn.execute(
+                "UPDATE items SET qty = qty - ? WHERE code = ? AND qty >= ?", (qty, code, qty)
+            ).rowcount == 0]
+            if short:
+                self.conn.rollback() # All lines or none
+            return short
+
+    def item_change_seq(self):
+        """Returns the sequence number of the latest logged item change."""
+        with self.lock:
+            return self._latest_seq("item_changes")
+
+    def _latest_seq(self, log):
+        row = self.conn.execute("SELECT seq FROM sqlite_sequence WHERE name = ?", (log,)).fetchone()
+        return row[0] if row else 0
+
+    def item_changes_since(self, seq):
+        """Returns (latest seq, set of changed codes) for the item changes logged after seq.
+
+        Returns (latest seq, None) if the log no longer reaches back to seq and
+        the caller must reload all items.
+        """
+        with self.lock:
+            latest = self.item_change_seq()
+            if latest == seq:
+                return latest, set()
+            oldest = self.conn.execute("SELECT MIN(seq) FROM item_changes").fetchone()[0]
+            if oldest is None or oldest > seq + 1:
+                return latest, None
+            codes = {code for code, in self.conn.execute("SELECT code FROM item_changes WHERE seq > ? AND seq <= ?", (seq, latest))}
+        return latest, codes
+
+    def prune_item_changes(self, keep=100000):
+        """Drops all but the newest keep entries of the item and bill change logs."""
+        with self.lock, self.conn:
+            for log in ("item_changes", "bill_changes"):
+                self.conn.execute(f"DELETE FROM {log} WHERE seq <= (SELECT MAX(seq) FROM {log}) - ?", (keep,))
+
+    def find_item(self, code):
+        """Looks up one item by code through the primary key."""
+        with self.lock:
+            row = self.conn.execute("SELECT code, name, price, qty FROM items WHERE code = ?", (code,)).fetchone()
+        return self._row(*row) if row else None
+
+    def load_customers(self):
+        """Loads customers as "Name ---- reg on: Date" lines, in registration order."""
+        with self.lock:
+            return [f"{name}{CUSTOMER_SEPARATOR}{registered}"
+                    for name, registered in self.conn.execute("SELECT name, registered FROM customers ORDER BY id")]
+
+    def save_customers(self, customers):
+        """Replaces the whole customer table in one transaction."""
+        with self.lock, self.conn:
+            self.conn.execute("DELETE FROM customers")
+            self.conn.executemany(
+                "INSERT INTO customers (name, customer_key, registered) VALUES (?, ?, ?)",
+                ((name, normalize_name(name), registered)
+                 for name, registered in map(split_customer_line, customers))
+            )
+
+    def apply_customer_changes(self, changed=(), removed=()):
+        """Inserts changed (name, registered) customers and deletes removed keys in one transaction.
+
+        A customer whose name is already registered is left as it is. Returns the
+        (name, registered) rows that held those names, so the caller can use them.
+        """
+        taken = []
+        with self.lock, self.conn:
+            self.conn.execute("BEGIN IMMEDIATE") # No other terminal can register a name between the check and the insert
+            for name, registered in changed:
+                key = normalize_name(name)
+                if self.conn.execute(
+                    "INSERT INTO customers (name, customer_key, registered) SELECT ?, ?, ? "
+                    "WHERE NOT EXISTS (SELECT 1 FROM customers WHERE customer_key = ?)",
+                    (name, key, registered, key)
+                ).rowcount == 0:
+                    taken.append(self.conn.execute(
+                        "SELECT name, registered FROM customers WHERE customer_key = ? ORDER BY id LIMIT 1", (key,)
+                    ).fetchone())
+            self.conn.executemany("DELETE FROM customers WHERE customer_key = ?", ((key,) for key in removed))
+        return taken
+
+    def load_bills(self):
+        """Loads all bill records (dicts), oldest first."""
+        with self.lock:
+            self.bill_seq = self._latest_seq("bill_changes")
+            lines = {}
+            for bill_id, code, name, price, qty in self.conn.execute(
+                "SELECT bill_id, code, name, price, qty FROM bill_lines ORDER BY rowid"
+            ):
+                lines.setdefault(bill_id, []).append([code, name, price, qty])
+            return [
+                {"id": bill_id, "customer": customer, "created": created, "total": total,
+                 "lines": lines.get(bill_id, [])}
+                for bill_id, customer, created, total in self.conn.execute(
+                    "SELECT id, customer, created, total FROM bills ORDER BY id"
+                )
+            ]
+
+    def save_bills(self, bills):
+        """Replaces all bills in one transaction."""
+        with self.lock, self.conn:
+            self.conn.execute("DELETE FROM bill_lines")
+            self.conn.execute("DELETE FROM bills")
+            for bill in bills:
+                self._insert_bill(bill)
+
+    def read_new_bills(self):
+        """Returns the current record, or {"void": id}, of every bill added or voided since we last looked.
+
+        Our own changes come back too. Returns None if the change log no
+        longer reaches back that far; reload the bills then.
+        """
+        with self.lock:
+            latest = self._latest_seq("bill_changes")
+            oldest = self.conn.execute("SELECT MIN(seq) FROM bill_changes").fetchone()[0]
+            if latest == self.bill_seq:
+                return []
+            if oldest is None or oldest > self.bill_seq + 1:
+                self.bill_seq = latest
+                return None
+            records = []
+            for bill_id, in self.conn.execute(
+                "SELECT DISTINCT bill_id FROM bill_changes WHERE seq > ? AND seq <= ? ORDER BY bill_id",
+                (self.bill_seq, latest)
+            ).fetchall():
+                row = self.conn.execute("SELECT customer, created, total FROM bills WHERE id = ?", (bill_id,)).fetchone()
+                if row is None:
+                    records.append({"void": bill_id})
+                    continue
+                records.append({"id": bill_id, "customer": row[0], "created": row[1], "total": row[2],
+                                "lines": [list(line) for line in self.conn.execute(
+                                    "SELECT code, name, price, qty FROM bill_lines WHERE bill_id = ? ORDER BY rowid",
+                                    (bill_id,))]})
+            self.bill_seq = latest
+        return records
+
+    def append_new_bill(self, bill):
+        """Inserts a new bill record under the next free id, in one transaction. Returns the id."""
+        with self.lock, self.conn:
+            self.conn.execute("BEGIN IMMEDIATE") # Write lock first, so no other till reads the same last id
+            bill["id"] = self.conn.execute(
+                "SELECT MAX(COALESCE((SELECT MAX(id) FROM bills), 0), COALESCE((SELECT MAX(id) FROM voided_bills), 0)) + 1"
+            ).fetchone()[0]
+            self._insert_bill(bill)
+        return bill["id"]
+
+    def append_bill(self, bill):
+        """Inserts a bill record that already has its id (a restored bill). Raises KeyError if the id is taken."""
+        try:
+            with self.lock, self.conn:
+                self._insert_bill(bill)
+        except sqlite3.IntegrityError:
+            raise KeyError(bill["id"]) from None
+
+    def remove_bill(self, bill_id):
+        """Deletes one bill and its lines in a single transaction."""
+        with self.lock, self.conn:
+            self.conn.execute("DELETE FROM bill_lines WHERE bill_id = ?", (bill_id,))
+            self.conn.execute("DELETE FROM bills WHERE id = ?", (bill_id,))
+            self.conn.execute("INSERT OR IGNORE INTO voided_bills (id) VALUES (?)", (bill_id,))
+
+    def _insert_bill(self, bill):
+        self.conn.execute(
+            "INSERT INTO bills (id, customer, customer_key, created, total) VALUES (?, ?, ?, ?, ?)",
+            (bill["id"], bill["customer"], normalize_name(bill["customer"]), bill["created"], bill["total"])
+        )
+        self.conn.executemany(
+            "INSERT INTO bill_lines (bill_id, code, name, price, qty) VALUES (?, ?, ?, ?, ?)",
+            ((bill["id"], code, name, price, qty) for code, name, price, qty in bill["lines"])
+        )
+
+    def load_movements(self):
+        """Loads all stock movement records ([time, code, kind, delta, balance]), oldest first."""
+        with self.lock:
+            return [list(row) for row in self.conn.execute(
+                "SELECT time, code, kind, delta, balance FROM stock_movements ORDER BY seq"
+            )]
+
+    def save_movements(self, movements):
+        """Replaces all stock movements in one transaction."""
+        with self.lock, self.conn:
+            self.conn.execute("DELETE FROM stock_movements")
+            self._insert_movements(movements)
+
+    def append_movements(self, movements):
+        """Inserts stock movement records in a single transaction."""
+        with self.lock, self.conn:
+            self._insert_movements(movements)
+
+    def _insert_movements(self, movements):
+        self.conn.executemany(
+            "INSERT INTO stock_movements (time, code, kind, delta, balance) VALUES (?, ?, ?, ?, ?)",
+            (tuple(movement) for movement in movements)
+        )
+
+    def close(self):
+        self.prune_item_changes()
+        self.conn.close()
+
+
+def normalize_name(name):
+    """Lower-cases a customer name and collapses runs of whitespace, for lookups."""
+    return " ".join(name.split()).lower()
+
+
+def split_customer_line(line):
+    """Splits "Name ---- reg on: Date" into (name, date)."""
+    data = line.strip().split("---- reg on:")
+    return data[0].strip(), data[1].strip() if len(data) > 1 else ""
+
+
+def create_backend(kind=None):
+    """Creates the storage backend named by kind, or by STORAGE_BACKEND."""
+    kind = kind or STORAGE_BACKEND
+    if kind == "flat":
+        return FlatFileBackend()
+    if kind == "sqlite":
+        return SQLiteBackend()
+    raise ValueError(f"Unknown storage backend '{kind}'. Use 'flat' or 'sqlite'.")
+
+
+_backend = None
+
+def get_backend():
+    """Returns the configured backend, creating it on first use."""
+    global _backend
+    if _backend is None:
+        _backend = create_backend()
+    return _backend
+
+
+# --- Helper Functions for Data Handling ---
+def load_items():
+    """Loads items as [code, name, price, qty] rows from the configured backend."""
+    return get_backend().load_items()
+
+def save_items(items):
+    """Saves all items to the configured backend."""
+    get_backend().save_items(items)
+
+def load_customers():
+    """Loads customer lines from the configured backend."""
+    return get_backend().load_customers()
+
+def save_customers(customers):
+    """Saves all customer lines to the configured backend."""
+    get_backend().save_customers(customers)
+
+def load_bills():
+    """Loads all bill records from the configured backend."""
+    return get_backend().load_bills()
+
+def append_bill(bill):
+    """Saves one new bill record to the configured backend."""
+    get_backend().append_bill(bill)
+
+
+def import_flat_files(db_file=SQLITE_FILE, items_file=ITEMS_FILE, customers_file=CUSTOMERS_FILE, bills_file=BILLS_FILE,
+                      movements_file=MOVEMENTS_FILE):
+    """One-shot import of DATA.txt, customerData.txt, bills.jsonl and the stock movements into a SQLite database.
+
+    Returns (items imported, rows skipped, customers imported, bills imported).
+    """
+    flat = FlatFileBackend(items_file, customers_file, bills_file, movements_file)
+    items = []
+    skipped = 0
+    for row in flat.load_items():
+        try:
+            items.append([int(row[0]), row[1], float(row[2]), int(row[3])])
+        except ValueError:
+            skipped += 1 # Rows the GUI can't use either
+    customers = flat.load_customers()
+    bills = flat.load_bills()
+
+    db = SQLiteBackend(db_file)
+    try:
+        db.save_items(items)
+        db.save_customers(customers)
+        db.save_bills(bills)
+        db.save_movements(flat.load_movements())
+    finally:
+        db.close()
+    return len(items), skipped, len(customers), len(bills)
+
+
+def main():
+    """Command line entry point: python storage.py import [database file]"""
+    if len(sys.argv) < 2 or sys.argv[1] != "import":
+        print("Usage: python storage.py import [database file]")
+        return 1
+    db_file = sys.argv[2] if len(sys.argv) > 2 else SQLITE_FILE
+    items, skipped, customers, bills = import_flat_files(db_file)
+    print(f"Imported {items} items ({skipped} invalid rows skipped), {customers} customers "
+          f"and {bills} bills into {db_file}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,329 @@
+"""Multi-step undo and redo of this till's item, customer and bill changes.
+
+Changes made through the UndoLog are recorded as Commands holding just the
+before and after values they touched, so undoing one is a single inverse
+change through the stores (a journal append or a row update), never a
+reload or a rewrite of DATA.txt. Quantities are put back as deltas, so sales
+made since still count, and a voided bill's lines are restocked. Everything
+a command touched is checked before any of it changes, and if a later step
+still fails the steps already made are reverted, so a command is never left
+half applied.
+
+The log keeps the last UNDO_LIMIT commands. It is appended to UNDO_FILE as it
+goes, one short JSON line per command or per undo/redo, and rewritten once it
+grows to a few times that. Each till keeps its own file.
+"""
+import json
+import os
+import socket
+import threading
+
+from bill_store import Bill
+from bulk_io import import_items
+from inventory_store import ConflictError
+
+UNDO_LIMIT = 100 # commands kept for undo
+UNDO_FILE = os.environ.get("INVENTORY_UNDO_FILE", f"undo-{socket.gethostname()}.jsonl")
+# Imports of more items than this aren't recorded: the command would hold every row, in memory and in the file
+UNDO_IMPORT_LIMIT = int(os.environ.get("INVENTORY_UNDO_IMPORT_LIMIT", "10000"))
+
+# Markers in the file after the commands they act on
+UNDO, REDO, DROP_UNDO, DROP_REDO = "u", "r", "-u", "-r"
+
+# What a command that no longer applies fails with; anything else (a lost connection) leaves it in the log
+STALE_ERRORS = (KeyError, ValueError, ConflictError)
+
+
+class UndoError(Exception):
+    """A command can't be undone or redone because what it touched changed since."""
+
+
+def item_state(item):
+    return None if item is None else [item.name, item.price, item.qty]
+
+
+class Command:
+    """One undoable change: a label for the user, and the before and after values it touched."""
+
+    __slots__ = ("label", "items", "customers", "bill")
+
+    def __init__(self, label, items=(), customers=(), bill=None):
+        self.label = label
+        self.items = [list(change) for change in items] # [code, before, after], states [name, price, qty] or None
+        self.customers = [list(change) for change in customers] # [name, before, after], registration dates or None
+        self.bill = bill # record of the bill this command committed, or None
+
+    @classmethod
+    def from_record(cls, record):
+        return cls(record["l"], record.get("i", ()), record.get("c", ()), record.get("b"))
+
+    def to_record(self):
+        record = {"l": self.label}
+        if self.items:
+            record["i"] = self.items
+        if self.customers:
+            record["c"] = self.customers
+        if self.bill is not None:
+            record["b"] = self.bill
+        return record
+
+
+class UndoLog:
+    """Makes item, customer and bill changes through the stores and keeps the commands to undo and redo them."""
+
+    def __init__(self, store, bills, customers, path=UNDO_FILE, limit=UNDO_LIMIT):
+        self.store = store
+        self.bills = bills
+        self.customers = customers
+        self.path = path
+        self.limit = limit
+        self.done = [] # commands that can be undone, latest last
+        self.undone = [] # commands that can be redone, next last
+        self.lines = 0 # lines in the file, for compaction
+        self.lock = threading.RLock()
+
+    def load(self):
+        """Replays the file to rebuild the undo and redo stacks."""
+        with self.lock:
+            done, undone, lines = [], [], 0
+            try:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    for line in f:
+                        lines += 1
+                        try:
+                            record = json.loads(line)
+                        except ValueError:
+                            continue # Torn write from a crash
+                        if record == UNDO and done:
+                            undone.append(done.pop())
+                        elif record == REDO and undone:
+                            done.append(undone.pop())
+                        elif record == DROP_UNDO and done:
+                            done.pop()
+                        elif record == DROP_REDO and undone:
+                            undone.pop()
+                        elif isinstance(record, dict):
+                            done.append(Command.from_record(record))
+                            undone = []
+            except FileNotFoundError:
+                pass
+            self.done, self.undone, self.lines = done[-self.limit:], undone, lines
+        return self
+
+    def _write(self, record):
+        """Appends a command or marker. Not fsynced: a crash can only shorten the history."""
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record, separators=(",", ":")) + "\n")
+        self.lines += 1
+        if self.lines > 4 * self.limit:
+            self._compact()
+
+    def _compact(self):
+        """Rewrites the file as the commands still kept, with undo markers for the redo stack."""
+        redo = self.undone[::-1] # In the order they were done
+        records = [command.to_record() for command in self.done + redo] + [UNDO] * len(redo)
+        with open(self.path + ".tmp", "w", encoding="utf-8") as f:
+            f.writelines(json.dumps(record, separators=(",", ":")) + "\n" for record in records)
+        os.replace(self.path + ".tmp", self.path)
+        self.lines = len(records)
+
+    def _record(self, command):
+        self.done.append(command)
+        del self.done[:-self.limit]
+        self.undone = []
+        self._write(command.to_record())
+        return command
+
+    @property
+    def undo_label(self):
+        return self.done[-1].label if self.done else None
+
+    @property
+    def redo_label(self):
+        return self.undone[-1].label if self.undone else None
+
+    # Changes, made and recorded
+
+    def add_item(self, code, name, price, qty):
+        with self.lock:
+            item = self.store.add(code, name, price, qty)
+            self._record(Command(f"new item {code} ({item.name})", items=[[code, None, item_state(item)]]))
+        return item
+
+    def import_items(self, path):
+        """Imports a CSV/JSONL file (see bulk_io.import_items) as one command. Returns the ImportReport.
+
+        Imports of more than UNDO_IMPORT_LIMIT items are made but not recorded;
+        report.undoable says which it was.
+        """
+        with self.lock:
+            report = import_items(self.store, path)
+            report.undoable = len(report.added) <= UNDO_IMPORT_LIMIT
+            if report.added and report.undoable:
+                self._record(Command(f"import of {report.imported:,} items", items=[
+                    [code, None, [name, price, qty]] for code, name, price, qty in report.added]))
+        return report
+
+    def remove_item(self, code):
+        with self.lock:
+            item = self.store.remove(code)
+            if item is not None:
+                self._record(Command(f"removal of item {code} ({item.name})", items=[[code, item_state(item), None]]))
+        return item
+
+    def update_item(self, code, name=None, price=None, qty=None, expected_version=None):
+        with self.lock:
+            before = item_state(self.store.get(code))
+            item = self.store.update(code, name, price, qty, expected_version)
+            self._record(Command(f"update of item {code} ({item.name})", items=[[code, before, item_state(item)]]))
+        return item
+
+    def commit_bill(self, customer, lines, created=None):
+        """Takes the lines out of stock and records the bill. Undoing it restocks them and voids the bill."""
+        with self.lock:
+            # One request in client mode; locally the stock is put back if the bill can't be written
+            bill = self.bills.commit(self.store, customer, lines, created)
+            self._record(Command(f"bill #{bill.bill_id} for {customer}", bill=bill.to_record()))
+        return bill
+
+    def register_customer(self, name, registered=None):
+        with self.lock:
+            customer, created = self.customers.register(name, registered)
+            if created:
+                self._record(Command(f"registration of {customer.name}",
+                                     customers=[[customer.name, None, customer.registered]]))
+        return customer, created
+
+    def remove_customer(self, name):
+        with self.lock:
+            customer = self.customers.remove(name)
+            if customer is not None:
+                self._record(Command(f"removal of customer {customer.name}",
+                                     customers=[[customer.name, customer.registered, None]]))
+        return customer
+
+    # Undo and redo
+
+    def undo(self):
+        """Reverts the latest command. Returns it, or None if there is nothing to undo.
+
+        A command whose items or customers changed since can't be reverted; it
+        is dropped from the log and UndoError is raised.
+        """
+        with self.lock:
+            if not self.done:
+                return None
+            command = self.done[-1]
+            try:
+                self._apply(command, forward=False)
+            except (UndoError,) + STALE_ERRORS as error:
+                self.done.pop()
+                self._write(DROP_UNDO)
+                raise UndoError(f"Can't undo the {command.label}: {error}") from error
+            self.undone.append(self.done.pop())
+            self._write(UNDO)
+        return command
+
+    def redo(self):
+        """Makes the latest undone command again. Returns it, or None if there is nothing to redo."""
+        with self.lock:
+            if not self.undone:
+                return None
+            command = self.undone[-1]
+            try:
+                self._apply(command, forward=True)
+            except (UndoError,) + STALE_ERRORS as error:
+                self.undone.pop()
+                self._write(DROP_REDO)
+                raise UndoError(f"Can't redo the {command.label}: {error}") from error
+            self.done.append(self.undone.pop())
+            self._write(REDO)
+        return command
+
+    def _apply(self, command, forward):
+        """Makes the command's changes, or their inverse, after checking that nothing it touched has changed."""
+        if forward:
+            items, customers = command.items, command.customers
+        else:
+            items = [[code, after, before] for code, before, after in reversed(command.items)]
+            customers = [[name, after, before] for name, before, after in reversed(command.customers)]
+        current = {code: self.store.get(code) for code, _, _ in items}
+        for code, expected, _ in items:
+            state = item_state(current[code])
+            # Names and prices must be as we left them; quantities are moved by the difference
+            if (state is None) != (expected is None) or (state and state[:2] != expected[:2]):
+                raise UndoError(f"item {code} was changed or removed since.")
+        for name, expected, _ in customers:
+            customer = self.customers.get(name)
+            if (customer and customer.registered) != expected:
+                raise UndoError(f"customer {name} was changed since.")
+
+        for code, expected, target in items:
+            if expected is not None and target is not None and current[code].qty + target[2] - expected[2] < 0:
+                raise UndoError(f"item {code} has only {current[code].qty} left.")
+
+        # Each step made pushes its inverse, so a failure part way puts back what was already changed
+        applied = []
+        try:
+            if command.bill is not None:
+                bill = Bill.from_record(command.bill)
+                quantities = {}
+                for code, _, _, qty in bill.lines:
+                    quantities[code] = quantities.get(code, 0) + qty
+                # The step that can fail for a sale or a void made meanwhile goes first
+                if forward:
+                    self.store.decrement_stock(quantities)
+                    applied.append(lambda: self.store.restock(quantities))
+                    self.bills.restore(bill)
+                    applied.append(lambda: self.bills.remove(bill.bill_id))
+                else:
+                    if self.bills.remove(bill.bill_id) is None:
+                        raise UndoError(f"bill #{bill.bill_id} was voided since.")
+                    applied.append(lambda: self.bills.restore(bill))
+                    self.store.restock(quantities)
+                    applied.append(lambda: self.store.decrement_stock(quantities))
+
+            removed = [code for code, _, target in items if target is None]
+            if removed:
+                self.store.remove_many(removed)
+                applied.append(lambda: self._add_items([(code, *item_state(current[code])) for code in removed]))
+            added = [(code, *target) for code, expected, target in items if expected is None]
+            if added:
+                duplicates = self._add_items(added)
+                applied.append(lambda: self.store.remove_many(
+                    [code for code, *_ in added if code not in duplicates]))
+                if duplicates:
+                    raise UndoError("some of the items were added again on another till.")
+            for code, expected, target in items:
+                if expected is not None and target is not None:
+                    delta = target[2] - expected[2]
+                    self.store.update(code, target[0], target[1], current[code].qty + delta,
+                                      expected_version=current[code].version)
+                    applied.append(lambda code=code, expected=expected, delta=delta: self.store.update(
+                        code, expected[0], expected[1], self.store.get(code).qty - delta))
+
+            for name, expected, target in customers:
+                if target is None:
+                    self.customers.remove(name)
+                    applied.append(lambda name=name, expected=expected: self.customers.register(name, expected))
+                else:
+                    self.customers.register(name, target)
+                    applied.append(lambda name=name: self.customers.remove(name))
+        except Exception as error:
+            rollback_error = None
+            for inverse in reversed(applied):
+                try:
+                    inverse()
+                except Exception as e: # Put back as much as we can, and say what couldn't be
+                    rollback_error = rollback_error or e
+            if rollback_error is not None:
+                raise UndoError(f"{error}, and the steps already made could not all be reverted: "
+                                f"{rollback_error}") from error
+            raise
+
+    def _add_items(self, items):
+        """Adds (code, name, price, qty) items. Returns the codes skipped as duplicates."""
+        if len(items) == 1:
+            self.store.add(*items[0]) # A journal append; add_many rewrites the whole file
+            return []
+        return self.store.add_many(items)